@@ -1,66 +1,82 @@
 from __future__ import annotations
-import argparse, json, pathlib
+import argparse, json, time
 from rich.console import Console
 from agent.pipes.validator import validate_object
-from agent.pipes.redactor import apply_llm_min
-from agent.pipes.summarizer import summarize
-
-ROOT = pathlib.Path(__file__).resolve().parents[1]
-DATA = ROOT / "data"
+from agent.pipes.redactor import apply_view
+from agent.pipes.summarizer import summarize_manifest
+from agent.index import ManifestIndex, index_path, manifest_digest, parse_terms
+from bnx import tracing
+from bnx.manifest import Manifest, load as load_manifest, manifest_file
+from bnx.paths import DATA
+from bnx.redaction import profiles
 
 console = Console()
 
-def resolve_manifest(dataset: str, manifest: str | None) -> dict:
-    if manifest:
-        path = DATA / f"manifests/{dataset}/{manifest}.json"
-    else:
+def resolve_manifest(dataset: str, manifest: str | None) -> Manifest:
+    if not manifest:
         import yaml
         ch = yaml.safe_load((DATA/"channels.yaml").read_text(encoding="utf-8")) or {}
-        mid = ch.get(dataset, {}).get("prod")
-        if not mid: raise SystemExit("no prod channel set")
-        path = DATA / f"manifests/{dataset}/{mid}.json"
-    return json.loads(path.read_text(encoding="utf-8"))
+        manifest = ch.get(dataset, {}).get("prod")
+        if not manifest: raise SystemExit("no prod channel set")
+    path = manifest_file(dataset, manifest)
+    if path is None: raise SystemExit(f"manifest not found: {dataset}/{manifest}")
+    return load_manifest(path)
 
 def load_object(hash_str: str) -> dict:
     assert hash_str.startswith("sha256:")
     h = hash_str.split(":",1)[1]
     path = DATA / f"objects/{h[:2]}/{h}.json"
-    return json.loads(path.read_text(encoding="utf-8"))
+    with tracing.span("object.load", hash=hash_str):
+        return json.loads(path.read_text(encoding="utf-8"))
+
+def describe(i: int, o: dict) -> str:
+    k = o.get("envelope",{}).get("kind")
+    ident = o.get("body",{}).get("entity_id") or o.get("body",{}).get("activity_id")
+    return f"[{i}] {k} :: {ident}"
 
 def main():
     ap = argparse.ArgumentParser(description="BNX Link Agent (console)")
     ap.add_argument("--dataset", default="core")
     ap.add_argument("--manifest", default=None)
-    ap.add_argument("--view", default="llm_min", choices=["llm_min","full"])
+    ap.add_argument("--view", default="llm_min", choices=sorted(profiles()))
     ap.add_argument("--repl", action="store_true", help="enter simple REPL after summary")
+    ap.add_argument("--save-index", action="store_true", help="persist the REPL index next to the manifest")
     args = ap.parse_args()
 
-    m = resolve_manifest(args.dataset, args.manifest)
-    objs = []
-    items = []
-    if "objects" in m:
-        items = [(it["hash"]) for it in m["objects"]]
-    elif "entries" in m:
-        items = [(it["object"]) for it in m["entries"]]
-    else:
-        raise SystemExit("manifest missing 'objects' or 'entries'")
-    for h in items:
-        o = load_object(h)
-        validate_object(o)  # throws on invalid
-        if args.view == "llm_min":
-            o = apply_llm_min(o)
-        objs.append(o)
+    tracing.configure("agent")
+    with tracing.span("agent.load", dataset=args.dataset):
+        m = resolve_manifest(args.dataset, args.manifest)
+        items = m.hashes()
+        raw = {}
+        def load(h: str) -> dict:
+            if h not in raw:
+                o = raw[h] = load_object(h)
+                validate_object(o)  # throws on invalid
+            return raw[h]
 
-    summary = summarize(objs)
+        # fragments are cached per object hash, so only new objects are loaded, validated and summarized
+        summary = summarize_manifest(items, load)
     console.rule("[bold]Context summary")
     for line in summary["lines"]:
         console.print(f"- {line}")
 
+    if args.repl or args.save_index:
+        objs = [apply_view(load(h), args.view) for h in items]
+        # one index per session; reuse the persisted one when it was built for this manifest
+        digest = manifest_digest(m, args.view)
+        ipath = index_path(args.dataset, m.get("manifest_id") or args.manifest or "prod")
+        index = ManifestIndex.load(ipath, digest)
+        if index is None:
+            # over the redacted view, so find/where cannot match fields the profile hides
+            index = ManifestIndex.build(objs, digest)
+            if args.save_index:
+                index.save(ipath)
     if not args.repl:
         return
+    selection = None
 
     console.rule("[bold]REPL")
-    console.print("[dim]type 'list', 'show <n>', 'quit'[/dim]")
+    console.print("[dim]type 'list', 'show <n>', 'find field=value ...', 'where field=value ...', 'quit'[/dim]")
     while True:
         try:
             cmd = input("> ").strip()
@@ -68,10 +84,27 @@ def main():
             break
         if cmd in ("quit","exit"): break
         if cmd == "list":
-            for i, o in enumerate(objs):
-                k = o.get("envelope",{}).get("kind")
-                ident = o.get("body",{}).get("entity_id") or o.get("body",{}).get("activity_id")
-                console.print(f"[{i}] {k} :: {ident}")
+            for i in (selection if selection is not None else range(len(objs))):
+                console.print(describe(i, objs[i]))
+            continue
+        verb, *rest = cmd.split() or [""]
+        if verb in ("find", "where"):
+            try:
+                terms = parse_terms(rest)
+            except ValueError as e:
+                console.print(f"[red]bad query[/red]: {e}")
+                continue
+            t0 = time.perf_counter()
+            hits = index.lookup(terms)
+            ms = (time.perf_counter() - t0) * 1000
+            if verb == "where":
+                # narrows what `list` shows; bare `where` clears the filter
+                selection = hits if terms else None
+                console.print(f"[dim]{len(hits)} selected ({ms:.3f} ms)[/dim]")
+                continue
+            for i in hits:
+                console.print(describe(i, objs[i]))
+            console.print(f"[dim]{len(hits)} match(es) ({ms:.3f} ms)[/dim]")
             continue
         if cmd.startswith("show "):
             try:
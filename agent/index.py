@@ -0,0 +1,101 @@
+from __future__ import annotations
+import hashlib, json, os, pathlib
+from bnx.manifest import Manifest
+from bnx.paths import DERIVED
+
+INDEX_DIR = DERIVED / "manifests"
+INDEX_VERSION = 1
+
+# queryable fields; labels and relationships are addressed as labels.<key> / rel.<rel>
+FIELDS = ("id", "kind", "entity_type", "labels", "status", "activity_type", "subject_refs", "target", "rel")
+
+def index_terms(o: dict) -> list[str]:
+    env, b = o.get("envelope",{}), o.get("body",{})
+    terms = [f"kind={env.get('kind')}"]
+    ident = b.get("entity_id") or b.get("activity_id")
+    if ident:
+        terms.append(f"id={ident}")
+    for field in ("entity_type", "status", "activity_type"):
+        if b.get(field) is not None:
+            terms.append(f"{field}={b[field]}")
+    for k, v in (b.get("labels") or {}).items():
+        terms.append(f"labels.{k}={v}")
+    for ref in b.get("subject_refs") or []:
+        terms.append(f"subject_refs={ref}")
+    for rel in b.get("relationships") or []:
+        terms.append(f"target={rel.get('target_id')}")
+        terms.append(f"rel.{rel.get('rel')}={rel.get('target_id')}")
+    return terms
+
+def manifest_digest(manifest: dict | Manifest, view: str | None = None) -> str:
+    """Identifies what an index was built from: the manifest file's name, size and mtime (so
+    checking costs one stat, not a pass over the entries; in-memory manifests hash their JSON)
+    and the view its objects were indexed through."""
+    if isinstance(manifest, Manifest) and manifest.source is not None:
+        st = manifest.source.stat()
+        key = f"{manifest.source.name}:{st.st_size}:{st.st_mtime_ns}"
+    else:
+        key = manifest.digest() if isinstance(manifest, Manifest) else json.dumps(manifest, sort_keys=True)
+    return hashlib.sha256(f"{key}|{view}".encode("utf-8")).hexdigest()
+
+def index_path(dataset: str, manifest_id: str) -> pathlib.Path:
+    return INDEX_DIR / dataset / manifest_id / "index.json"
+
+class ManifestIndex:
+    """Inverted index from `field=value` terms to positions in the manifest's object list."""
+
+    def __init__(self, postings: dict[str, frozenset[int]], count: int, digest: str | None = None):
+        self.postings = postings
+        self.count = count
+        self.digest = digest
+
+    @classmethod
+    def build(cls, objs: list[dict], digest: str | None = None) -> "ManifestIndex":
+        postings: dict[str, set[int]] = {}
+        for i, o in enumerate(objs):
+            for t in index_terms(o):
+                postings.setdefault(t, set()).add(i)
+        return cls({t: frozenset(p) for t, p in postings.items()}, len(objs), digest)
+
+    def lookup(self, terms: list[str]) -> list[int]:
+        """Positions matching every term (AND), in manifest order."""
+        if not terms:
+            return list(range(self.count))
+        sets = sorted((self.postings.get(t, frozenset()) for t in terms), key=len)
+        hits = sets[0]
+        for s in sets[1:]:
+            if not hits:
+                break
+            hits = hits.intersection(s)
+        return sorted(hits)
+
+    def save(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        doc = {"version": INDEX_VERSION, "manifest_sha256": self.digest, "count": self.count,
+               "postings": {t: sorted(p) for t, p in self.postings.items()}}
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(doc, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: pathlib.Path, digest: str | None = None) -> "ManifestIndex | None":
+        """Load a persisted index; None if missing, from another version, or built for a different manifest."""
+        try:
+            doc = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if doc.get("version") != INDEX_VERSION or (digest and doc.get("manifest_sha256") != digest):
+            return None
+        return cls({t: frozenset(p) for t, p in doc["postings"].items()}, doc["count"], doc.get("manifest_sha256"))
+
+def parse_terms(args: list[str]) -> list[str]:
+    """Validate `field=value` REPL arguments; raises ValueError on unknown fields."""
+    terms = []
+    for a in args:
+        field, sep, value = a.partition("=")
+        if not sep or not value:
+            raise ValueError(f"expected field=value, got {a!r}")
+        if field.split(".", 1)[0] not in FIELDS:
+            raise ValueError(f"unknown field {field!r}; one of {', '.join(FIELDS)}")
+        terms.append(f"{field}={value}")
+    return terms
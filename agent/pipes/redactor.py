@@ -1,8 +1,10 @@
 from __future__ import annotations
+from bnx import tracing
+from bnx.redaction import get_profile
 
-def apply_llm_min(obj: dict) -> dict:
-    env = {k:v for k,v in obj.get("envelope",{}).items() if k not in ("owner",)}
-    body = {k:v for k,v in obj.get("body",{}).items() if k != "links"}
-    return {"envelope": env, "context": obj.get("context",{}), "body": body}
-
+def apply_view(obj: dict, view: str) -> dict:
+    with tracing.span("redaction", profile=view):
+        return get_profile(view).project(obj)
 
+def apply_llm_min(obj: dict) -> dict:
+    return apply_view(obj, "llm_min")
@@ -1,17 +1,92 @@
 from __future__ import annotations
+import json, os, pathlib, threading
+from collections import OrderedDict
 from datetime import datetime
+from typing import Callable, Iterable
+from bnx import tracing
+from bnx.paths import DERIVED
+
+CACHE_DIR = DERIVED / "summaries"
+
+# bump whenever summarize_one() output changes; old fragments are then ignored
+SUMMARIZER_VERSION = "1"
+
+def summarize_one(o: dict) -> str:
+    kind = o.get("envelope",{}).get("kind","Object")
+    b = o.get("body",{})
+    if kind == "EntityRecord":
+        return f"Entity '{b.get('entity_id')}' type={b.get('entity_type')} labels={list((b.get('labels') or {}).keys())}"
+    if kind == "ActivityRecord":
+        return f"Activity '{b.get('activity_id')}' status={b.get('status')} due={b.get('scheduling',{}).get('due_date')}"
+    return f"{kind}"
 
 def summarize(objs: list[dict]) -> dict:
-    lines = []
-    for o in objs:
-        kind = o.get("envelope",{}).get("kind","Object")
-        b = o.get("body",{})
-        if kind == "EntityRecord":
-            lines.append(f"Entity '{b.get('entity_id')}' type={b.get('entity_type')} labels={list((b.get('labels') or {}).keys())}")
-        elif kind == "ActivityRecord":
-            lines.append(f"Activity '{b.get('activity_id')}' status={b.get('status')} due={b.get('scheduling',{}).get('due_date')}")
-        else:
-            lines.append(f"{kind}")
+    lines = [summarize_one(o) for o in objs]
     return {"type":"bnx.summary","generated_at": datetime.utcnow().isoformat()+'Z', "lines": lines}
 
+class FragmentCache:
+    """Per-object summary fragments, persisted under data/derived and keyed by
+    (object hash, summarizer version). Objects are immutable, so a fragment never
+    goes stale; only a version bump invalidates it. Safe to share across threads."""
+
+    def __init__(self, root: pathlib.Path = CACHE_DIR, version: str = SUMMARIZER_VERSION, max_mem: int = 100_000):
+        self.dir = pathlib.Path(root) / f"v{version}"
+        self.max_mem = max_mem
+        self._mem: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, h: str) -> pathlib.Path:
+        hexh = h.split(":",1)[1]
+        return self.dir / hexh[:2] / f"{hexh}.json"
+
+    def _remember(self, h: str, frag: dict) -> None:
+        with self._lock:
+            self._mem[h] = frag
+            self._mem.move_to_end(h)
+            if len(self._mem) > self.max_mem:
+                self._mem.popitem(last=False)
+
+    def get(self, h: str) -> dict | None:
+        with self._lock:
+            frag = self._mem.get(h)
+            if frag is not None:
+                self._mem.move_to_end(h)
+                return frag
+        p = self._path(h)
+        try:
+            frag = json.loads(p.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        self._remember(h, frag)
+        return frag
+
+    def put(self, h: str, frag: dict) -> None:
+        p = self._path(h)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")  # unique per writer thread
+        tmp.write_text(json.dumps(frag), encoding="utf-8")
+        os.replace(tmp, p)
+        self._remember(h, frag)
+
+def fragment(o: dict) -> dict:
+    return {"kind": o.get("envelope",{}).get("kind","Object"), "line": summarize_one(o)}
 
+def summarize_manifest(hashes: Iterable[str], load: Callable[[str], dict], cache: FragmentCache | None = None) -> dict:
+    """Assemble a manifest summary from cached fragments; `load` is only called on misses."""
+    cache = cache if cache is not None else FragmentCache()
+    lines, counts, hits = [], {}, 0
+    with tracing.span("summarize") as span:
+        for h in hashes:
+            frag = cache.get(h)
+            if frag is None:
+                frag = fragment(load(h))
+                cache.put(h, frag)
+            else:
+                hits += 1
+            lines.append(frag["line"])
+            counts[frag["kind"]] = counts.get(frag["kind"], 0) + 1
+        if span is not None:
+            span.set(objects=len(lines), cached=hits)
+    return {"type":"bnx.summary","generated_at": datetime.utcnow().isoformat()+'Z',
+            "summarizer_version": SUMMARIZER_VERSION, "lines": lines, "counts": counts,
+            "stats": {"objects": len(lines), "cached": hits, "computed": len(lines) - hits}}
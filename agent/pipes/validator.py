@@ -1,6 +1,7 @@
 from __future__ import annotations
 import json, pathlib
 from jsonschema import Draft202012Validator
+from bnx import tracing
 
 ROOT = pathlib.Path(__file__).resolve().parents[2]
 SCHEMAS = {
@@ -11,6 +12,7 @@ SCHEMAS = {
 def validate_object(obj: dict) -> None:
     kind = obj.get("envelope",{}).get("kind")
     if kind in SCHEMAS:
-        Draft202012Validator(SCHEMAS[kind]).validate(obj.get("body",{}))
+        with tracing.span("validate", kind=kind):
+            Draft202012Validator(SCHEMAS[kind]).validate(obj.get("body",{}))
 
 
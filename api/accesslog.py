@@ -0,0 +1,46 @@
+from __future__ import annotations
+import json, os, time
+from datetime import datetime, timezone
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MAX_BODY = 64 * 1024  # request bodies larger than this are logged without the body
+
+class RequestLogMiddleware:
+    """Appends one `api.request` event per HTTP request to an NDJSON file, in the ledger's
+    line format, so real traffic can be replayed with scripts/loadtest.py --replay.
+
+    Records method, path, query, status, duration and (for small POST bodies) the body;
+    never the Authorization header. Installed only when `request_log_path` is set."""
+
+    def __init__(self, app: ASGIApp, path: str):
+        self.app = app
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in ("/health", "/metrics"):
+            await self.app(scope, receive, send)
+            return
+        start, status, body = time.perf_counter(), [0], []
+        async def recv() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and body is not None:
+                body.append(message.get("body", b""))
+            return message
+        async def send_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        try:
+            await self.app(scope, receive if scope["method"] == "GET" else recv, send_status)
+        finally:
+            event = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+                     "event": "api.request", "method": scope["method"], "path": scope["path"],
+                     "query": scope.get("query_string", b"").decode("latin-1"), "status": status[0] or 500,
+                     "ms": round((time.perf_counter() - start) * 1000, 3)}
+            raw = b"".join(body)
+            if raw and len(raw) <= MAX_BODY:
+                try:
+                    event["body"] = json.loads(raw)
+                except ValueError:
+                    pass
+            os.write(self._fd, (json.dumps(event) + "\n").encode("utf-8"))
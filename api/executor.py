@@ -0,0 +1,70 @@
+from __future__ import annotations
+import asyncio, functools, time, weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from bnx import tracing
+from . import profiling
+from .metrics import ENDPOINT_ACTIVE, ENDPOINT_QUEUE_LATENCY, ENDPOINT_SHED
+from .security import settings
+
+# Blocking file reads from async endpoints run here rather than in Starlette's shared
+# threadpool, so disk latency never eats the slots sync endpoints and dependencies need.
+io_executor = ThreadPoolExecutor(max_workers=settings.io_threads, thread_name_prefix="bnx-io")
+
+def bind(fn):
+    """`fn` carrying the request's profile and trace context over to an I/O thread."""
+    return tracing.wrap(profiling.wrap(fn))
+
+async def run_io(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, bind(functools.partial(fn, *args, **kwargs)))
+
+class EndpointLimit:
+    """Caps how many requests one endpoint serves at once.
+
+    A request that waits longer than `timeout` for a slot gets 503 with Retry-After. Once
+    the smoothed wait for a slot exceeds `target` seconds, requests that would have to
+    queue are shed right away instead; as soon as slots free up, waits drop back to zero
+    and admission resumes."""
+
+    def __init__(self, name: str, limit: int, timeout: float, target: float | None = None):
+        self.name, self.limit, self.timeout, self.target = name, limit, timeout, target
+        self.active = 0
+        self.queue_latency = 0.0
+        self._sems: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # one semaphore per event loop
+
+    def _sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            sem = self._sems[loop] = asyncio.Semaphore(self.limit)
+        return sem
+
+    def _busy(self, reason: str) -> HTTPException:
+        ENDPOINT_SHED.labels(self.name, reason).inc()
+        return HTTPException(status_code=503, headers={"Retry-After": str(max(1, round(self.timeout)))},
+                             detail={"error":{"code":"busy","message":f"too many concurrent {self.name} requests"}})
+
+    @asynccontextmanager
+    async def slot(self):
+        sem = self._sem()
+        if sem.locked() and self.target is not None and self.queue_latency > self.target:
+            raise self._busy("latency")
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._busy("timeout")
+        self.queue_latency = 0.8 * self.queue_latency + 0.2 * (time.monotonic() - start)
+        ENDPOINT_QUEUE_LATENCY.labels(self.name).set(self.queue_latency)
+        self.active += 1
+        ENDPOINT_ACTIVE.labels(self.name).inc()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            ENDPOINT_ACTIVE.labels(self.name).dec()
+            sem.release()
+
+limits = {name: EndpointLimit(name, n, settings.endpoint_queue_timeout_seconds, settings.queue_latency_target_ms / 1000)
+          for name, n in settings.endpoint_concurrency.items()}
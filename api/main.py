@@ -1,55 +1,303 @@
 from __future__ import annotations
-import json, pathlib, yaml
+import asyncio, json, logging, pathlib, threading, yaml
 from fastapi import FastAPI, Depends, HTTPException, Query, Request
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import REGISTRY
 from prometheus_fastapi_instrumentator import Instrumentator
-from .security import require_bearer, require_scope, settings
-from .policy import decide_view_by_scopes
+from .security import require_scope, settings
+from . import profiling, query
+from .prefetch import Prefetcher
+from .accesslog import RequestLogMiddleware
+from .executor import bind, io_executor, limits, run_io
+from .ratelimit import rate_limited
+from .tracing import TraceMiddleware
+from .metrics import INGEST_OBJECTS, SINGLEFLIGHT_COALESCED, CacheCollector, StorageCollector, TimedGZipMiddleware, stage
+from .policy import decide_view_by_scopes, engine as policy
+from agent.pipes.summarizer import FragmentCache, summarize_manifest
+from bnx.graph import Graph, graph_path
+from bnx.manifest import Manifest, load as read_manifest, manifest_file, manifest_files
+from bnx.paths import DATA
+from bnx.redaction import Profile, get_profile
+from bnx.shmcache import open_shared_cache
+from bnx import snapshot, tracing
+from bnx.cache import LRUCache
+from bnx.singleflight import SingleFlight
+from bnx.snapshot import channel_pointers, members_of
+from bnx.store import IngestError, ObjectStore, write_file
 from datetime import datetime
 
-ROOT = pathlib.Path(__file__).resolve().parents[1]
-DATA = ROOT / "data"
+log = logging.getLogger("bnx.api")
 
 app = FastAPI(title="BNX Link API", version="0.1.0")
 
 # Middleware
-app.add_middleware(GZipMiddleware, minimum_size=512)
+app.add_middleware(TimedGZipMiddleware, minimum_size=512)
 if settings.cors_origins:
     app.add_middleware(CORSMiddleware,
         allow_origins=[o.strip() for o in settings.cors_origins.split(",") if o.strip()],
         allow_methods=["GET","POST","OPTIONS"], allow_headers=["*"])
+if settings.profile_enabled:
+    app.add_middleware(profiling.ProfileMiddleware)
+if tracing.enabled():
+    tracing.configure("bnx-api")
+    app.add_middleware(TraceMiddleware)
+if settings.request_log_path:
+    app.add_middleware(RequestLogMiddleware, path=settings.request_log_path)
 
 # Metrics
 Instrumentator().instrument(app).expose(app, include_in_schema=False)
 
+# Derived artifacts
+summary_cache = FragmentCache()
+graph_cache: dict[tuple[str, str], tuple[float, Graph]] = {}
+member_cache: dict[tuple[str, str], tuple[float | None, dict[str, str]]] = {}
+channel_cache: dict[str, tuple[float | None, dict[str, dict[str, str]]]] = {}
+# the warm-start snapshot, open until its background refresh is done; memberships are decoded from it on demand
+warm_snapshot: snapshot.Snapshot | None = None
+warm_snapshot_lock = threading.Lock()
+object_cache = LRUCache(settings.object_cache_size)
+view_cache = LRUCache(settings.view_cache_size)
+# concurrent misses on the same object or manifest share one read + parse
+object_flight = SingleFlight(SINGLEFLIGHT_COALESCED.labels("object").inc)
+manifest_flight = SingleFlight(SINGLEFLIGHT_COALESCED.labels("manifest").inc)
+# object bytes shared by all workers on this host (content-addressed, so never stale)
+shared_cache = open_shared_cache(settings.shared_cache_path, settings.shared_cache_mb)
+REGISTRY.register(CacheCollector({"object": object_cache, "view": view_cache, "shared": shared_cache}))
+REGISTRY.register(StorageCollector(DATA))
+store = ObjectStore(DATA, fsync=settings.fsync)
+
+def load_graph(dataset: str, manifest_id: str) -> Graph:
+    path = graph_path(dataset, manifest_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail={"error":{"code":"not_found","message":f"graph not built for {dataset}/{manifest_id}"}})
+    mtime = path.stat().st_mtime
+    cached = graph_cache.get((dataset, manifest_id))
+    if cached is None or cached[0] != mtime:
+        cached = graph_cache[(dataset, manifest_id)] = (mtime, Graph.load(path))
+    return cached[1]
+
 def read_object_by_hash(h: str) -> dict:
     if not h.startswith("sha256:"):
         raise HTTPException(status_code=400, detail={"error":{"code":"bad_request","message":"hash must start with sha256:"}})
+    obj = object_cache.get(h)
+    if obj is not None:
+        return obj
+    return object_flight.do(h, lambda: _load_object(h))
+
+def _load_object(h: str) -> dict:
+    with tracing.span("object.load", hash=h):
+        return _read_object(h)
+
+def _read_object(h: str) -> dict:
     hexf = h.split(":", 1)[1]
-    path = DATA / f"objects/{hexf[:2]}/{hexf}.json"
-    if not path.exists():
-        raise HTTPException(status_code=404, detail={"error":{"code":"not_found","message":f"object not found: {h}"}})
-    return json.loads(path.read_text(encoding="utf-8"))
+    with stage("object", "read"):
+        data = shared_cache.get(hexf) if shared_cache is not None else None
+        if data is None:
+            path = DATA / f"objects/{hexf[:2]}/{hexf}.json"
+            if not path.exists():
+                raise HTTPException(status_code=404, detail={"error":{"code":"not_found","message":f"object not found: {h}"}})
+            data = path.read_bytes()
+            if shared_cache is not None:
+                shared_cache.put(hexf, data)
+    with stage("object", "parse"):
+        obj = json.loads(data)
+    object_cache.put(h, obj)
+    return obj
 
-def load_manifest(dataset: str, manifest_id: str) -> dict:
-    path = DATA / f"manifests/{dataset}/{manifest_id}.json"
-    if not path.exists():
+def load_manifest(dataset: str, manifest_id: str) -> Manifest:
+    return manifest_flight.do((dataset, manifest_id), lambda: _load_manifest(dataset, manifest_id))
+
+async def aread_object_by_hash(h: str) -> dict:
+    """read_object_by_hash for the event loop: cache hits return inline, misses load on the I/O executor."""
+    if not h.startswith("sha256:"):
+        raise HTTPException(status_code=400, detail={"error":{"code":"bad_request","message":"hash must start with sha256:"}})
+    obj = object_cache.get(h)
+    if obj is not None:
+        return obj
+    return await object_flight.do_async(h, bind(lambda: _load_object(h)), io_executor)
+
+async def aload_manifest(dataset: str, manifest_id: str) -> Manifest:
+    return await manifest_flight.do_async((dataset, manifest_id), bind(lambda: _load_manifest(dataset, manifest_id)),
+                                          io_executor)
+
+def _load_manifest(dataset: str, manifest_id: str) -> Manifest:
+    path = manifest_file(dataset, manifest_id, DATA)
+    if path is None:
         raise HTTPException(status_code=404, detail={"error":{"code":"not_found","message":f"manifest not found: {dataset}/{manifest_id}"}})
-    return json.loads(path.read_text(encoding="utf-8"))
+    with tracing.span("manifest.load", dataset=dataset, manifest_id=manifest_id), stage("manifest", "parse"):
+        try:
+            return read_manifest(path)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail={"error":{"code":"bad_manifest","message":str(e)}})
+
+def manifest_hashes(manifest: dict | Manifest) -> list[str]:
+    if isinstance(manifest, Manifest):
+        return manifest.hashes()
+    if "objects" in manifest:
+        return [it["hash"] for it in manifest["objects"]]
+    if "entries" in manifest:
+        return [it["object"] for it in manifest["entries"]]
+    raise HTTPException(status_code=422, detail={"error":{"code":"bad_manifest","message":"manifest missing 'objects' or 'entries'"}})
+
+def view_profile(view: str) -> Profile:
+    try:
+        return get_profile(view)
+    except KeyError:
+        raise HTTPException(status_code=400, detail={"error":{"code":"bad_request","message":f"unknown view: {view}"}})
+
+def apply_view(obj: dict, view: str) -> dict:
+    return view_profile(view).project(obj)
 
 def load_and_apply_view(hash_id: str, view: str) -> dict:
-    obj = read_object_by_hash(hash_id)
-    if view == "llm_min":
-        # keep envelope (without owner), context, and body minus "links"
-        obj2 = {
-            "envelope": {k: v for k, v in obj.get("envelope", {}).items() if k not in ("owner",)},
-            "context": obj.get("context", {}),
-            "body": {k: v for k, v in obj.get("body", {}).items() if k != "links"},
-        }
-        return obj2
-    return obj
+    return apply_view(read_object_by_hash(hash_id), view)
+
+def render(hash_id: str, profile: Profile, obj: dict | None = None) -> dict:
+    """`hash_id` under `profile`, cached per (hash, profile version). Pass `obj` if already loaded."""
+    if profile.name == "full":
+        return obj if obj is not None else read_object_by_hash(hash_id)
+    key = (hash_id, profile.cache_key)
+    out = view_cache.get(key)
+    if out is None:
+        obj = obj if obj is not None else read_object_by_hash(hash_id)
+        with tracing.span("redaction", profile=profile.cache_key), stage("object", "project"):
+            out = profile.project(obj)
+        view_cache.put(key, out)
+    return out
+
+def warm_object(hash_id: str) -> None:
+    read_object_by_hash(hash_id)
+    for view in settings.prefetch_views.split(","):
+        if view.strip():
+            render(hash_id, get_profile(view.strip()))
+
+prefetcher = Prefetcher(warm_object, settings.prefetch_concurrency,
+                        min(settings.object_cache_size, settings.view_cache_size))
+prefetched: set[tuple[str, str]] = set()
+
+def prefetch_manifest(dataset: str, manifest_id: str, manifest: dict | Manifest, trigger: str):
+    """Queue a background warm-up of `manifest`'s objects; returns the job (None if the manifest has no objects)."""
+    prefetched.add((dataset, manifest_id))
+    try:
+        hashes = manifest_hashes(manifest)
+    except HTTPException:
+        return None
+    return prefetcher.submit(dataset, manifest_id, hashes, trigger)
+
+def channels() -> dict[str, dict[str, str]]:
+    """{dataset: {channel: manifest_id}}, re-read only when channels.yaml changes."""
+    channels_path = DATA / "channels.yaml"
+    mtime = channels_path.stat().st_mtime if channels_path.exists() else None
+    cached = channel_cache.get("channels")
+    if cached is None or cached[0] != mtime:
+        raw = (yaml.safe_load(channels_path.read_text()) or {}) if channels_path.exists() else {}
+        cached = channel_cache["channels"] = (mtime, channel_pointers(raw))
+    return cached[1]
+
+def channel_manifest_id(dataset: str, channel: str) -> str:
+    mid = channels().get(dataset, {}).get(channel)
+    if not mid:
+        raise HTTPException(status_code=404, detail={"error":{"code":"not_found","message":f"channel not found: {dataset}/{channel}"}})
+    return mid
+
+def manifest_members(dataset: str, manifest_id: str) -> dict[str, str]:
+    """logical_id -> object hash for one manifest, cached until the manifest file changes."""
+    path = manifest_file(dataset, manifest_id, DATA)
+    mtime = path.stat().st_mtime if path is not None else None
+    cached = member_cache.get((dataset, manifest_id))
+    if cached is None or cached[0] != mtime:
+        members = snapshot_members(dataset, manifest_id, mtime)
+        if members is None:
+            members = members_of(load_manifest(dataset, manifest_id), read_object_by_hash)
+        cached = member_cache[(dataset, manifest_id)] = (mtime, members)
+    return cached[1]
+
+def snapshot_members(dataset: str, manifest_id: str, mtime: float | None) -> dict[str, str] | None:
+    """A manifest's membership from the warm-start snapshot, if it was built from the file as it is now."""
+    key = f"{dataset}/{manifest_id}"
+    with warm_snapshot_lock:
+        snap = warm_snapshot
+        if snap is None or key not in snap.manifests or snap.manifests[key]["mtime"] != mtime:
+            return None
+        return snap.members(key)
+
+def warm_start(path: str | pathlib.Path | None = None, background: bool = True) -> threading.Thread | None:
+    """Seed the indexes from a `bnx snapshot` file, then warm the hot set and every other
+    manifest's membership off the request path. Memberships are decoded from the snapshot
+    as they are first needed; entries whose source file changed since the snapshot are
+    rebuilt from the manifest instead."""
+    global warm_snapshot
+    snap = snapshot.load(pathlib.Path(path or settings.snapshot_path))
+    if snap is None:
+        return None
+    channels_path = DATA / "channels.yaml"
+    if channels_path.exists() and channels_path.stat().st_mtime == snap.channels_mtime:
+        channel_cache["channels"] = (snap.channels_mtime, snap.channels)
+    with warm_snapshot_lock:
+        warm_snapshot = snap  # a previous one still refreshing closes itself
+
+    def refresh():
+        global warm_snapshot
+        try:
+            for h in snap.hot():
+                try:
+                    read_object_by_hash(h)
+                except HTTPException:
+                    pass
+            for dataset, manifest_id, mpath in manifest_files(DATA):
+                try:
+                    manifest_members(dataset, manifest_id)
+                except (HTTPException, ValueError, KeyError):
+                    log.warning("warm start: cannot index %s", mpath)
+        finally:
+            with warm_snapshot_lock:
+                if warm_snapshot is snap:
+                    warm_snapshot = None
+                snap.close()
+    if not background:
+        refresh()
+        return None
+    t = threading.Thread(target=refresh, name="bnx-warm-start", daemon=True)
+    t.start()
+    return t
+
+@app.on_event("startup")
+def on_startup():
+    if settings.warm_start:
+        warm_start()
+
+# include name -> logical ids an object links to
+INCLUDES = {
+    "subject_refs": lambda body: body.get("subject_refs") or [],
+    "relationships": lambda body: [r.get("target_id") for r in body.get("relationships") or []],
+}
+
+def expand_object(hash_id: str, view: str, include: list[str], depth: int, members: dict[str, str], principal: dict) -> dict:
+    """The root object plus everything reachable through `include` links within `depth` hops, each once.
+
+    Linked objects the principal may not read are withheld and not traversed further."""
+    root = read_object_by_hash(hash_id)
+    policy.check(principal, root, view)
+    seen, included, unresolved, withheld = {hash_id}, [], [], 0
+    frontier = [root]
+    for _ in range(depth):
+        nxt = []
+        for obj in frontier:
+            body = obj.get("body", {})
+            for lid in (lid for inc in include for lid in INCLUDES[inc](body) if lid):
+                h = members.get(lid)
+                if h is None:
+                    if lid not in unresolved:
+                        unresolved.append(lid)
+                elif h not in seen:
+                    seen.add(h)
+                    nxt.append(read_object_by_hash(h))
+        nxt, denied = policy.filter(principal, nxt, view)
+        withheld += len(denied)
+        included += nxt
+        frontier = nxt
+    return {"object": apply_view(root, view), "included": [apply_view(o, view) for o in included],
+            "unresolved": unresolved, "withheld": withheld}
 
 def do_promote(dataset: str, channel: str, manifest_in, principal):
     """
@@ -64,21 +312,19 @@ def do_promote(dataset: str, channel: str, manifest_in, principal):
     # 1) resolve manifest id + etag
     if isinstance(manifest_in, str):
         manifest_id = manifest_in
-        manifest_path = DATA / f"manifests/{dataset}/{manifest_id}.json"
-        if not manifest_path.exists():
+        manifest_path = manifest_file(dataset, manifest_id, DATA)
+        if manifest_path is None:
             raise HTTPException(
                 status_code=404, 
                 detail={"error": {"code": "not_found", "message": f"manifest not found: {manifest_id}"}}
             )
-        manifest = json.loads(manifest_path.read_text())
+        manifest = read_manifest(manifest_path)
     elif isinstance(manifest_in, dict):
         manifest = manifest_in
         manifest_id = manifest.get("manifest_id") or manifest.get("id") or "unnamed"
         # optional snapshot if no file exists
-        manifest_path = DATA / f"manifests/{dataset}/{manifest_id}.json"
-        if not manifest_path.exists():
-            manifest_path.parent.mkdir(parents=True, exist_ok=True)
-            manifest_path.write_text(json.dumps(manifest, indent=2))
+        if manifest_file(dataset, manifest_id, DATA) is None:
+            write_file(DATA / f"manifests/{dataset}/{manifest_id}.json", json.dumps(manifest, indent=2).encode("utf-8"), settings.fsync)
     else:
         raise HTTPException(
             status_code=400, 
@@ -130,34 +376,212 @@ def do_promote(dataset: str, channel: str, manifest_in, principal):
     ch["current"] = new_cur
     
     # Write normalized structure
-    channels_path.write_text(yaml.dump(channels, default_flow_style=False))
+    write_file(channels_path, yaml.dump(channels, default_flow_style=False).encode("utf-8"), settings.fsync)
 
-def etag_json(obj: dict, request: Request) -> Response:
+    # 3) warm the new manifest's objects before clients switch over to them
+    prefetch_manifest(dataset, manifest_id, manifest, "promote")
+
+def etag_json(obj: dict, request: Request, profile: Profile | None = None) -> Response:
     etag = obj.get("envelope",{}).get("integrity",{}).get("sha256")
+    if etag and profile is not None and profile.name != "full":
+        # the same object under another view (or view version) is a different representation
+        etag = f"{etag}:{profile.cache_key}"
     if etag and request.headers.get("if-none-match") == etag:
         return Response(status_code=304)
     headers = {"ETag": etag} if etag else None
-    return JSONResponse(obj, headers=headers)
+    with stage("object", "serialize"):
+        return JSONResponse(obj, headers=headers)
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
 @app.get("/objects/{hash_id}")
-def get_object(hash_id: str, request: Request, view: str | None = Query(None, enum=["full", "llm_min"]), principal=Depends(require_bearer)):
+async def get_object(hash_id: str, request: Request, view: str | None = None,
+                     include: str | None = None, depth: int = Query(1, ge=1, le=5), dataset: str | None = None,
+                     manifest: str | None = None, channel: str | None = None, principal=Depends(rate_limited("objects:read"))):
     view_eff = decide_view_by_scopes(view, principal["scopes"])
-    obj = load_and_apply_view(hash_id, view_eff)
-    return etag_json(obj, request)
+    profile = view_profile(view_eff)
+    async with limits["objects"].slot():
+        if include:
+            wanted = [i.strip() for i in include.split(",") if i.strip()]
+            unknown = [i for i in wanted if i not in INCLUDES]
+            if unknown or not dataset or bool(manifest) == bool(channel):
+                msg = f"unknown include: {', '.join(unknown)}" if unknown else "include needs dataset and exactly one of manifest or channel"
+                raise HTTPException(status_code=400, detail={"error":{"code":"bad_request","message":msg}})
+            def expand():
+                manifest_id = manifest or channel_manifest_id(dataset, channel)
+                return expand_object(hash_id, view_eff, wanted, depth, manifest_members(dataset, manifest_id), principal)
+            return JSONResponse(await run_io(expand))
+        obj = await aread_object_by_hash(hash_id)
+        policy.check(principal, obj, view_eff)
+        return etag_json(render(hash_id, profile, obj), request, profile)
 
 @app.get("/manifests/{dataset}/{manifest_id}")
-def get_manifest(dataset: str, manifest_id: str, principal=Depends(require_bearer)):
+async def get_manifest(dataset: str, manifest_id: str, principal=Depends(rate_limited("manifests:read"))):
+    require_scope(principal, "manifests:read")
+    async with limits["manifests"].slot():
+        manifest = await aload_manifest(dataset, manifest_id)
+    if settings.prefetch_on_manifest_fetch and (dataset, manifest_id) not in prefetched:
+        prefetch_manifest(dataset, manifest_id, manifest, "manifest_fetch")
+    with stage("manifest", "serialize"):
+        # always v1 JSON: a v1 file is served as stored, a v2 one is rendered as it streams out
+        if manifest.source is not None and manifest.source.suffix == ".json":
+            return Response(await run_io(manifest.source.read_bytes), media_type="application/json")
+        return StreamingResponse(manifest.iter_v1_json(), media_type="application/json")
+
+def readable_hashes(hashes: list[str], principal, view: str) -> tuple[list[str], int]:
+    """The hashes whose objects `principal` may read in `view`, in order, and how many were withheld."""
+    objs = [read_object_by_hash(h) for h in hashes]
+    allowed, denied = policy.filter(principal, objs, view)
+    keep = {id(o) for o in allowed}
+    return [h for h, o in zip(hashes, objs) if id(o) in keep], len(denied)
+
+def hidden_nodes(dataset: str, manifest_id: str, node_ids: list[str], principal, view: str) -> set[str]:
+    """The graph nodes among `node_ids` whose manifest objects `principal` may not read in `view`."""
+    members = manifest_members(dataset, manifest_id)
+    named = [n for n in node_ids if n in members]
+    readable = set(readable_hashes([members[n] for n in named], principal, view)[0])
+    return {n for n in named if members[n] not in readable}
+
+@app.get("/manifests/{dataset}/{manifest_id}/summary")
+async def get_manifest_summary(dataset: str, manifest_id: str, principal=Depends(rate_limited("manifests:read"))):
     require_scope(principal, "manifests:read")
-    return JSONResponse(load_manifest(dataset, manifest_id))
+    view = decide_view_by_scopes(None, principal["scopes"])  # summaries expose object fields
+    async with limits["summary"].slot():
+        manifest = await aload_manifest(dataset, manifest_id)
+        hashes, withheld = await run_io(readable_hashes, manifest_hashes(manifest), principal, view)
+        summary = await run_io(summarize_manifest, hashes, read_object_by_hash, summary_cache)
+    summary.update({"dataset": dataset, "manifest_id": manifest_id, "withheld": withheld})
+    return JSONResponse(summary)
+
+@app.get("/graph/{dataset}/{manifest_id}/neighbors")
+async def get_neighbors(dataset: str, manifest_id: str, id: str, depth: int = Query(1, ge=1, le=5),
+                        direction: str = Query("both", enum=["out", "in", "both"]), rel: list[str] | None = Query(None),
+                        principal=Depends(rate_limited("manifests:read"))):
+    require_scope(principal, "manifests:read")
+    view = decide_view_by_scopes(None, principal["scopes"])  # nodes name objects, so they follow read policy too
+    async with limits["graph"].slot():
+        graph = await run_io(load_graph, dataset, manifest_id)
+        if id in graph:
+            result = graph.neighbors(id, depth, direction, rel)
+            hidden = await run_io(hidden_nodes, dataset, manifest_id, [id] + [n["id"] for n in result["nodes"]], principal, view)
+    if id not in graph or id in hidden:
+        raise HTTPException(status_code=404, detail={"error":{"code":"not_found","message":f"node not in graph: {id}"}})
+    result = {"nodes": [n for n in result["nodes"] if n["id"] not in hidden],
+              "edges": [e for e in result["edges"] if e["source"] not in hidden and e["target"] not in hidden]}
+    result.update({"dataset": dataset, "manifest_id": manifest_id, "id": id, "depth": depth, "withheld": len(hidden)})
+    return JSONResponse(result)
 
 @app.post("/channels/{dataset}/{channel}:promote")
-def promote_channel(dataset: str, channel: str, body: dict, principal=Depends(require_bearer)):
+async def promote_channel(dataset: str, channel: str, body: dict, principal=Depends(rate_limited("channels:promote"))):
     require_scope(principal, "channels:promote")
-    do_promote(dataset, channel, body["manifest"], principal)
+    async with limits["promote"].slot():
+        await run_io(do_promote, dataset, channel, body["manifest"], principal)
     return {"ok": True}
 
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+def _too_large(what: str) -> HTTPException:
+    return HTTPException(status_code=413, detail={"error":{"code":"too_large","message":f"{what} exceeds {settings.max_object_bytes} bytes"}})
+
+def _count(results: list[dict]) -> None:
+    for r in results:
+        INGEST_OBJECTS.labels("rejected" if "error" in r else "created" if r["created"] else "existing").inc()
+
+async def ingest_ndjson(request: Request, date: str | None) -> dict:
+    """Store an NDJSON body as it arrives: every `ingest_batch_size` lines are validated, hashed,
+    written and ledgered on the I/O executor while the next batch is still being received."""
+    objects, errors, created = [], [], 0
+    batch: list[tuple[int, bytes]] = []
+    pending = None
+    async def collect():
+        nonlocal created
+        if pending is None:
+            return
+        numbered, results = await pending
+        _count(results)
+        for line, r in zip(numbered, results):
+            if "error" in r:
+                errors.append({"line": line, **r})
+            else:
+                objects.append({"line": line, **r})
+                created += r["created"]
+    def submit():
+        nonlocal batch, pending
+        numbered, items = [n for n, _ in batch], [raw for _, raw in batch]
+        pending = asyncio.ensure_future(run_io(lambda: (numbered, store.put_many(items, date))))
+        batch = []
+    def oversized(line: int) -> None:
+        # earlier batches may already be stored, so this is a per-line error like any other
+        errors.append({"line": line, **_too_large(f"line {line}").detail})
+        INGEST_OBJECTS.labels("rejected").inc()
+    buf, line_no, skipping = b"", 0, False
+    try:
+        async for chunk in request.stream():
+            if skipping:  # drop the rest of an oversized line without buffering it
+                nl = chunk.find(b"\n")
+                if nl < 0:
+                    continue
+                chunk, skipping = chunk[nl + 1:], False
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for raw in lines:
+                line_no += 1
+                if len(raw) > settings.max_object_bytes:
+                    oversized(line_no)
+                elif raw.strip():
+                    batch.append((line_no, raw))
+            if len(buf) > settings.max_object_bytes:
+                line_no += 1
+                oversized(line_no)
+                buf, skipping = b"", True
+            if len(batch) >= settings.ingest_batch_size:
+                await collect()
+                submit()
+        if buf.strip():
+            batch.append((line_no + 1, buf))
+        await collect()
+        if batch:
+            submit()
+            await collect()
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])  # batches already handed to the store finish before we answer
+    errors.sort(key=lambda e: e["line"])
+    return {"count": len(objects) + len(errors), "created": created, "objects": objects, "errors": errors}
+
+@app.post("/objects")
+async def post_objects(request: Request, date: str | None = None, principal=Depends(rate_limited("objects:write"))):
+    """One JSON object (201, or 200 if it was already stored) or an NDJSON batch (200 with a
+    result per line; lines that fail are listed in `errors` and the rest are still stored)."""
+    require_scope(principal, "objects:write")
+    media = (request.headers.get("content-type") or "application/json").split(";")[0].strip().lower()
+    if media not in NDJSON_TYPES and media != "application/json":
+        raise HTTPException(status_code=415, detail={"error":{"code":"unsupported_media_type",
+                            "message":"send application/json (one object) or application/x-ndjson (one per line)"}})
+    async with limits["ingest"].slot():
+        if media in NDJSON_TYPES:
+            return JSONResponse(await ingest_ndjson(request, date))
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > settings.max_object_bytes:
+                raise _too_large("object")
+        try:
+            result = await run_io(store.put, bytes(body), date)
+        except IngestError as e:
+            INGEST_OBJECTS.labels("rejected").inc()
+            raise HTTPException(status_code=400 if e.code == "bad_json" else 422, detail=e.body())
+        _count([result])
+        return JSONResponse(result, status_code=201 if result["created"] else 200)
 
+@app.post("/query")
+def run_query(body: dict, request: Request, principal=Depends(rate_limited("query:run"))):
+    require_scope(principal, "query:run")
+    media = query.negotiate(request.headers.get("accept"))
+    name, params = body.get("query"), body.get("params") or {}
+    if not isinstance(name, str) or not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail={"error":{"code":"bad_request","message":"body needs 'query' name and 'params' object"}})
+    chunks = query.run(name, params, principal["scopes"], media, body.get("limit"), body.get("timeout"))
+    return StreamingResponse(chunks, media_type=media)
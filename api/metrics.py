@@ -0,0 +1,155 @@
+from __future__ import annotations
+import os, pathlib, threading, time
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Application metrics, served next to the instrumentator's HTTP metrics on /metrics.
+
+PREFETCH_JOBS = Counter("bnx_prefetch_jobs", "Background prefetch jobs started", ["trigger"])
+PREFETCH_OBJECTS = Counter("bnx_prefetch_objects", "Objects handled by background prefetch", ["result"])
+PREFETCH_REMAINING = Gauge("bnx_prefetch_remaining", "Objects queued for prefetch and not yet warmed", ["dataset"])
+
+SINGLEFLIGHT_COALESCED = Counter("bnx_singleflight_coalesced", "Loads that joined an identical in-flight load",
+                                 ["resource"])
+
+RATE_LIMIT_DECISIONS = Counter("bnx_rate_limit_decisions", "Rate limiter decisions", ["scope", "decision"])
+RATE_LIMIT_BUCKETS = Gauge("bnx_rate_limit_buckets", "Token buckets currently tracked")
+ENDPOINT_ACTIVE = Gauge("bnx_endpoint_active", "Requests holding an endpoint slot", ["endpoint"])
+ENDPOINT_QUEUE_LATENCY = Gauge("bnx_endpoint_queue_latency_seconds", "Smoothed wait for an endpoint slot", ["endpoint"])
+ENDPOINT_SHED = Counter("bnx_endpoint_shed", "Requests rejected by admission control", ["endpoint", "reason"])
+INGEST_OBJECTS = Counter("bnx_ingest_objects", "Objects received by POST /objects", ["result"])
+
+# Hot-path stages of the object and manifest reads: auth, read, parse, project, serialize, compress
+STAGE_SECONDS = Histogram("bnx_stage_seconds", "Time spent in one stage of serving a request", ["path", "stage"],
+                          buckets=(.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+
+def stage(path: str, name: str):
+    """Context manager timing one stage into bnx_stage_seconds{path,stage}."""
+    return STAGE_SECONDS.labels(path, name).time()
+
+def _stage_path(scope) -> str | None:
+    path = scope.get("path", "")
+    if path.startswith("/objects/"):
+        return "object"
+    if path.startswith("/manifests/"):
+        return "manifest"
+    return None
+
+class TimedGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that records the time spent compressing as the `compress` stage.
+
+    The app's sends go through the gzip responder, which compresses and then forwards to
+    the server; compression time is the responder's time minus the time spent forwarding."""
+
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(self._inner(app), **kwargs)
+
+    @staticmethod
+    def _inner(app: ASGIApp) -> ASGIApp:
+        async def inner(scope: Scope, receive: Receive, send: Send) -> None:
+            timing = scope.get("bnx.gzip")
+            if timing is None:
+                await app(scope, receive, send)
+                return
+            async def timed_send(message: Message) -> None:
+                start = time.perf_counter()
+                await send(message)
+                timing["total"] += time.perf_counter() - start
+            await app(scope, receive, timed_send)
+        return inner
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = _stage_path(scope) if scope["type"] == "http" else None
+        if path is None:
+            await super().__call__(scope, receive, send)
+            return
+        timing = {"total": 0.0, "forward": 0.0, "compressed": False}
+        scope["bnx.gzip"] = timing
+        async def forward(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                timing["compressed"] = any(k.lower() == b"content-encoding" and v == b"gzip"
+                                           for k, v in message.get("headers", ()))
+            start = time.perf_counter()
+            await send(message)
+            timing["forward"] += time.perf_counter() - start
+        await super().__call__(scope, receive, forward)
+        if timing["compressed"]:
+            STAGE_SECONDS.labels(path, "compress").observe(max(0.0, timing["total"] - timing["forward"]))
+
+class CacheCollector:
+    """bnx_cache_events_total{cache,event} read from the caches' own counters at scrape time,
+    so the hot path only bumps plain integers."""
+
+    def __init__(self, caches: dict[str, object]):
+        self.caches = caches
+
+    def collect(self):
+        events = CounterMetricFamily("bnx_cache_events", "Cache lookups and evictions", labels=["cache", "event"])
+        entries = GaugeMetricFamily("bnx_cache_entries", "Entries currently cached", labels=["cache"])
+        for name, cache in self.caches.items():
+            if cache is None:
+                continue
+            for event, attr in (("hit", "hits"), ("miss", "misses"), ("eviction", "evictions")):
+                value = getattr(cache, attr, None)
+                if value is not None:
+                    events.add_metric([name, event], value)
+            if hasattr(cache, "__len__"):
+                entries.add_metric([name], len(cache))
+        yield events
+        yield entries
+
+class StorageCollector:
+    """Object store and ledger gauges, kept up to date incrementally.
+
+    Each shard directory's totals are remembered with its mtime, which changes whenever a
+    file is added to or removed from it, so a scrape re-lists only the shards that changed.
+    The ledger is append-only: new events are counted from the last offset read."""
+
+    def __init__(self, data: pathlib.Path):
+        self.objects_dir = data / "objects"
+        self.ledger_path = data / "ledger.ndjson"
+        self._shards: dict[str, tuple[int, int, int]] = {}  # shard -> (mtime_ns, objects, bytes)
+        self._ledger = (0, 0)  # bytes read, events seen
+        self._lock = threading.Lock()
+
+    def refresh(self) -> dict:
+        with self._lock:
+            seen = set()
+            if self.objects_dir.is_dir():
+                for entry in os.scandir(self.objects_dir):
+                    if not entry.is_dir():
+                        continue
+                    seen.add(entry.name)
+                    mtime = entry.stat().st_mtime_ns
+                    cached = self._shards.get(entry.name)
+                    if cached is None or cached[0] != mtime:
+                        files = [f.stat().st_size for f in os.scandir(entry.path) if f.name.endswith(".json")]
+                        self._shards[entry.name] = (mtime, len(files), sum(files))
+            for name in set(self._shards) - seen:
+                del self._shards[name]
+            offset, events = self._ledger
+            size = self.ledger_path.stat().st_size if self.ledger_path.exists() else 0
+            if size < offset:  # truncated or replaced: count again from the start
+                offset, events = 0, 0
+            if size > offset:
+                with self.ledger_path.open("rb") as f:
+                    f.seek(offset)
+                    chunk = f.read(size - offset)
+                # only whole lines; a partially written event is counted on the next scrape
+                end = chunk.rfind(b"\n") + 1
+                offset, events = offset + end, events + chunk.count(b"\n", 0, end)
+            self._ledger = (offset, events)
+            shards = self._shards.values()
+            return {"objects": sum(s[1] for s in shards), "object_bytes": sum(s[2] for s in shards),
+                    "shards": len(self._shards), "shard_max_objects": max((s[1] for s in shards), default=0),
+                    "ledger_bytes": size, "ledger_events": events}
+
+    def collect(self):
+        stats = self.refresh()
+        for key, help_text in (("objects", "Objects in the store"), ("object_bytes", "Bytes of stored objects"),
+                               ("shards", "Object shard directories in use"),
+                               ("shard_max_objects", "Objects in the fullest shard directory"),
+                               ("ledger_bytes", "Size of the ledger file"), ("ledger_events", "Events in the ledger")):
+            yield GaugeMetricFamily(f"bnx_storage_{key}", help_text, value=stats[key])
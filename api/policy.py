@@ -1,24 +1,93 @@
 from __future__ import annotations
 from fastapi import HTTPException
+from .security import settings
 
 
 # super simple RBAC+purpose; swap to OPA next sprint
-def require_scope(p, needed: str):
-    if needed not in p.scope:
-        raise HTTPException(status_code=403, detail=f"missing scope {needed}")
+ALLOWED_PURPOSES = ("analysis", "planning")
+# classification -> scope that unlocks it; anything listed is denied without that scope
+CLASSIFICATION_SCOPES = {"restricted": "objects:read:restricted"}
 
 
-def allow_read_object(p, classification: str, redacted: bool, purpose: str | None):
-    # deny restricted unless we had special scope (not added yet)
-    if classification == "restricted":
-        raise HTTPException(status_code=403, detail="restricted")
-    if redacted:
-        require_scope(p, "objects:read:redacted")
-    else:
-        require_scope(p, "objects:read")
-    # simple purpose binding: if purpose is set, only allow "analysis" or "planning"
-    if p.purpose and p.purpose not in ("analysis", "planning"):
-        raise HTTPException(status_code=403, detail=f"purpose {p.purpose} denied")
+def policy_key(obj: dict) -> tuple[str, tuple[str, ...]]:
+    """The object attributes read policy depends on: classification and sorted policy_tags."""
+    privacy = obj.get("envelope", {}).get("privacy", {})
+    return privacy.get("classification") or "internal", tuple(sorted(privacy.get("policy_tags") or ()))
+
+
+class PolicyEngine:
+    """Read-policy rules (classification, scope, purpose, policy_tags) behind one decision function.
+
+    Verdicts depend only on (scopes, purpose, view, classification, policy_tags), so they
+    are memoized on that key; checking a whole manifest costs one dict lookup per object
+    and one rule evaluation per distinct key."""
+
+    def __init__(self, purposes=ALLOWED_PURPOSES, classification_scopes: dict[str, str] | None = None,
+                 tag_scopes: dict[str, str] | None = None, max_entries: int = 4096):
+        self.purposes = frozenset(purposes)
+        self.classification_scopes = dict(CLASSIFICATION_SCOPES if classification_scopes is None else classification_scopes)
+        self.tag_scopes = dict(tag_scopes or {})  # policy_tag -> scope required to read objects carrying it
+        self.max_entries = max_entries
+        self._verdicts: dict[tuple, str | None] = {}
+        self.rule_evaluations = 0
+
+    def _evaluate(self, scopes: frozenset, purpose: str | None, view: str, classification: str, tags: tuple) -> str | None:
+        """None when allowed, else the denial reason."""
+        self.rule_evaluations += 1
+        needed = self.classification_scopes.get(classification)
+        if needed and needed not in scopes:
+            return f"classification {classification} requires scope {needed}"
+        if view == "full" and "objects:read" not in scopes:
+            return "Missing scope: objects:read"
+        if not scopes & {"objects:read", "objects:read:redacted"}:
+            return "No read scope"
+        if purpose and purpose not in self.purposes:
+            return f"purpose {purpose} denied"
+        for tag in tags:
+            needed = self.tag_scopes.get(tag)
+            if needed and needed not in scopes:
+                return f"policy tag {tag} requires scope {needed}"
+        return None
+
+    def decide(self, scopes, purpose: str | None, view: str, key: tuple[str, tuple[str, ...]]) -> str | None:
+        k = (scopes if isinstance(scopes, frozenset) else frozenset(scopes), purpose, view, key)
+        try:
+            return self._verdicts[k]
+        except KeyError:
+            pass
+        if len(self._verdicts) >= self.max_entries:
+            self._verdicts.clear()
+        verdict = self._verdicts[k] = self._evaluate(k[0], purpose, view, *key)
+        return verdict
+
+    def check(self, principal: dict, obj: dict, view: str) -> None:
+        reason = self.decide(principal["scopes"], principal.get("purpose"), view, policy_key(obj))
+        if reason:
+            raise HTTPException(status_code=403, detail={"error":{"code":"forbidden","message":reason}})
+
+    def filter(self, principal: dict, objs: list[dict], view: str) -> tuple[list[dict], list[dict]]:
+        """Split `objs` into (allowed, denied) for one principal."""
+        scopes, purpose = frozenset(principal["scopes"]), principal.get("purpose")
+        verdicts: dict[tuple, str | None] = {}
+        allowed, denied = [], []
+        for obj in objs:
+            key = policy_key(obj)
+            if key not in verdicts:
+                verdicts[key] = self.decide(scopes, purpose, view, key)
+            (denied if verdicts[key] else allowed).append(obj)
+        return allowed, denied
+
+    def clear(self) -> None:
+        self._verdicts.clear()
+
+
+engine = PolicyEngine(tag_scopes=settings.policy_tag_scopes)
+
+
+def allow_read_object(p: dict, classification: str, redacted: bool, purpose: str | None):
+    reason = engine.decide(p["scopes"], purpose, "llm_min" if redacted else "full", (classification, ()))
+    if reason:
+        raise HTTPException(status_code=403, detail={"error":{"code":"forbidden","message":reason}})
 
 
 def decide_view_by_scopes(requested_view: str | None, scopes: set[str]) -> str:
@@ -33,5 +102,3 @@ def decide_view_by_scopes(requested_view: str | None, scopes: set[str]) -> str:
             raise HTTPException(status_code=403, detail={"error":{"code":"forbidden","message":"Only redacted view allowed"}})
         return "llm_min"
     raise HTTPException(status_code=403, detail={"error":{"code":"forbidden","message":"No read scope"}})
-
-
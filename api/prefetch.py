@@ -0,0 +1,100 @@
+from __future__ import annotations
+import logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+from .metrics import PREFETCH_JOBS, PREFETCH_OBJECTS, PREFETCH_REMAINING
+
+log = logging.getLogger("bnx.prefetch")
+
+class Job:
+    def __init__(self, dataset: str, manifest_id: str, total: int):
+        self.dataset, self.manifest_id = dataset, manifest_id
+        self.total, self.done, self.failed = total, 0, 0
+        self.finished = threading.Event()
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.done - self.failed
+
+def _first_unique(hashes: Iterable[str], limit: int | None) -> list[str]:
+    seen: dict[str, None] = {}
+    for h in hashes:
+        if limit is not None and len(seen) >= limit:
+            break
+        seen.setdefault(h)
+    return list(seen)
+
+class Prefetcher:
+    """Warms caches for a manifest's objects on a small, fixed pool of threads.
+
+    `warm(hash)` does the actual work (load + render). Each job runs at most `concurrency`
+    worker loops that pull hashes one at a time, so neither in-flight work nor queued
+    futures grow with the manifest, and only its first `limit` objects are warmed, so a
+    big promotion cannot push the rest of the hot set out of a cache that size. A manifest
+    already being prefetched is not queued twice."""
+
+    def __init__(self, warm: Callable[[str], None], concurrency: int = 4, limit: int | None = None):
+        self.warm = warm
+        self.concurrency = max(1, concurrency)
+        self.limit = limit
+        self._pool: ThreadPoolExecutor | None = None
+        self._active: dict[tuple[str, str], Job] = {}
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bnx-prefetch")
+        return self._pool
+
+    def submit(self, dataset: str, manifest_id: str, hashes: Iterable[str], trigger: str) -> Job:
+        key = (dataset, manifest_id)
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            unique = _first_unique(hashes, self.limit)
+            job = self._active[key] = Job(dataset, manifest_id, len(unique))
+            PREFETCH_JOBS.labels(trigger).inc()
+            PREFETCH_REMAINING.labels(dataset).inc(len(unique))
+            if not unique:
+                self._finish(job)
+                return job
+            pending = iter(unique)
+            executor = self._executor()
+        for _ in range(min(self.concurrency, job.total)):
+            executor.submit(self._drain, job, pending)
+        return job
+
+    def _drain(self, job: Job, pending: Iterator[str]) -> None:
+        while True:
+            with self._lock:
+                h = next(pending, None)
+            if h is None:
+                return
+            self._run(job, h)
+
+    def _run(self, job: Job, h: str) -> None:
+        try:
+            self.warm(h)
+            ok = True
+        except Exception:
+            log.warning("prefetch of %s for %s/%s failed", h, job.dataset, job.manifest_id, exc_info=True)
+            ok = False
+        with self._lock:
+            if ok:
+                job.done += 1
+            else:
+                job.failed += 1
+            PREFETCH_OBJECTS.labels("ok" if ok else "failed").inc()
+            PREFETCH_REMAINING.labels(job.dataset).dec()
+            if job.remaining == 0:
+                self._finish(job)
+
+    def _finish(self, job: Job) -> None:
+        self._active.pop((job.dataset, job.manifest_id), None)
+        job.finished.set()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
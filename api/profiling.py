@@ -0,0 +1,154 @@
+from __future__ import annotations
+import cProfile, contextvars, io, json, pathlib, pstats, random, re, threading, time, uuid
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .security import _decode, settings
+
+PROFILE_HEADER = "x-bnx-profile"
+PROFILE_SCOPE = "debug:profile"
+PROFILE_MODES = {"1": "file", "inline": "inline"}  # X-BNX-Profile values; anything else leaves the request alone
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")  # becomes a file name under profile_dir
+
+_active: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar("bnx_profile", default=None)
+
+class RequestProfile:
+    """cProfile data for one request: the event loop thread plus every I/O thread that ran
+    work for it (see `wrap`), merged into one pstats.Stats at the end."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self._profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def run(self, fn):
+        p = cProfile.Profile()
+        try:
+            p.enable()
+        except ValueError:
+            # Python >= 3.12: cProfile sits on sys.monitoring, one profiler per process, and the
+            # request's event-loop profiler already sees this thread
+            return fn()
+        try:
+            return fn()
+        finally:
+            p.disable()
+            with self._lock:
+                self._profiles.append(p)
+
+    def stats(self) -> pstats.Stats | None:
+        with self._lock:
+            profiles = [p for p in self._profiles if p.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for p in profiles[1:]:
+            stats.add(p)
+        return stats
+
+def wrap(fn):
+    """`fn` unchanged unless the current request is profiled; then `fn` profiles the thread it runs on."""
+    prof = _active.get()
+    if prof is None:
+        return fn
+    return lambda: prof.run(fn)
+
+def report(stats: pstats.Stats, limit: int) -> str:
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+class ProfileMiddleware:
+    """Profiles requests that send `X-BNX-Profile` with a token carrying `debug:profile`,
+    plus a `profile_sample_rate` fraction of all requests.
+
+    `X-BNX-Profile: 1` (and sampled requests) write `<profile_dir>/<request id>.prof`, loadable
+    with pstats or snakeviz, and answer normally with `X-BNX-Profile-Id`; `X-BNX-Profile: inline`
+    replaces the response with a JSON report. One request per process is profiled at a time
+    (cProfile is per thread); others are served unprofiled with `X-BNX-Profile-Status: busy`.
+    Only installed when `profile_enabled` is set, so it costs nothing otherwise."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.dir = pathlib.Path(settings.profile_dir)
+        self._busy = threading.Lock()
+
+    def _authorized(self, headers: Headers) -> bool:
+        auth = headers.get("authorization") or ""
+        if not auth.startswith("Bearer "):
+            return False
+        try:
+            claims = _decode(auth.split(" ", 1)[1])
+        except HTTPException:
+            return False
+        scopes = claims.get("scope") or claims.get("scopes") or ""
+        return PROFILE_SCOPE in (scopes.split() if isinstance(scopes, str) else scopes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        mode = PROFILE_MODES.get((headers.get(PROFILE_HEADER) or "").strip().lower())
+        if mode:
+            if not self._authorized(headers):
+                await _json(send, 403, {"error":{"code":"forbidden","message":f"Missing scope: {PROFILE_SCOPE}"}})
+                return
+        elif settings.profile_sample_rate and random.random() < settings.profile_sample_rate:
+            mode = "file"
+        else:
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, _with_headers(send, [(b"x-bnx-profile-status", b"busy")]))
+            return
+        try:
+            request_id = headers.get("x-request-id") or ""
+            if not _REQUEST_ID.match(request_id) or request_id.strip(".") == "":
+                request_id = uuid.uuid4().hex
+            await self._profile(scope, receive, send, mode, request_id)
+        finally:
+            self._busy.release()
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send, mode: str, request_id: str) -> None:
+        prof = RequestProfile(request_id)
+        token = _active.set(prof)
+        status, started = [None], time.perf_counter()
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            if mode == "file":
+                await send(message)
+        p = cProfile.Profile()
+        p.enable()
+        try:
+            await self.app(scope, receive, _with_headers(capture, [(b"x-bnx-profile-id", request_id.encode())]))
+        finally:
+            p.disable()
+            _active.reset(token)
+            with prof._lock:
+                prof._profiles.append(p)
+        elapsed = time.perf_counter() - started
+        stats = prof.stats()
+        if mode == "file":
+            if stats is not None:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                stats.dump_stats(self.dir / f"{request_id}.prof")
+            return
+        await _json(send, 200, {"request_id": request_id, "status": status[0], "elapsed_ms": round(elapsed * 1000, 3),
+                                "profile": report(stats, settings.profile_top) if stats else ""},
+                    [(b"x-bnx-profile-id", request_id.encode())])
+
+def _with_headers(send: Send, extra: list[tuple[bytes, bytes]]) -> Send:
+    async def wrapped(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": [*message.get("headers", []), *extra]}
+        await send(message)
+    return wrapped
+
+async def _json(send: Send, status: int, body: dict, headers: list[tuple[bytes, bytes]] = ()) -> None:
+    data = json.dumps(body).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": data})
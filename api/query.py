@@ -0,0 +1,319 @@
+from __future__ import annotations
+import datetime, json, math, os, queue, tempfile, threading, time
+from contextlib import contextmanager
+import duckdb
+from fastapi import HTTPException
+from .policy import engine as policy
+from .security import settings
+
+# Named, parameterized queries over the DuckDB projection. Callers pick one by name
+# and supply its params; `scopes` lists the token scopes allowed to run it (any one).
+# Queries returning object rows filter on `{readable}`: objects whose classification or
+# policy_tags the caller's scopes do not unlock (policy.classification_scopes, tag_scopes) are left out.
+QUERIES: dict[str, dict] = {
+    "entities_by_type": {
+        "sql": """SELECT hash, entity_id, entity_type, snapshot_as_of, labels
+                  FROM v_manifest_entity_record
+                  WHERE dataset = $dataset AND manifest_id = $manifest_id AND entity_type = $entity_type
+                    AND {readable}
+                  ORDER BY entity_id""",
+        "params": ["dataset", "manifest_id", "entity_type"],
+        "scopes": ["objects:read", "objects:read:redacted"],
+    },
+    "activities_by_status": {
+        "sql": """SELECT hash, activity_id, activity_type, status, due_date, subject_refs
+                  FROM v_manifest_activity_record
+                  WHERE dataset = $dataset AND manifest_id = $manifest_id AND status = $status
+                    AND {readable}
+                  ORDER BY due_date, activity_id""",
+        "params": ["dataset", "manifest_id", "status"],
+        "scopes": ["objects:read", "objects:read:redacted"],
+    },
+    "activities_for_subject": {
+        "sql": """SELECT hash, activity_id, activity_type, status, due_date, subject_refs
+                  FROM v_manifest_activity_record
+                  WHERE dataset = $dataset AND manifest_id = $manifest_id AND list_contains(subject_refs, $subject)
+                    AND {readable}
+                  ORDER BY due_date, activity_id""",
+        "params": ["dataset", "manifest_id", "subject"],
+        "scopes": ["objects:read", "objects:read:redacted"],
+    },
+    "relationships_of": {
+        "sql": """SELECT entity_id, rel, target_id
+                  FROM v_manifest_entity_relationship
+                  WHERE dataset = $dataset AND manifest_id = $manifest_id AND entity_id = $entity_id
+                    AND {readable}
+                  ORDER BY rel, target_id""",
+        "params": ["dataset", "manifest_id", "entity_id"],
+        "scopes": ["objects:read", "objects:read:redacted"],
+    },
+    "manifest_counts": {
+        "sql": """SELECT manifest_id, kind, count(*) AS objects
+                  FROM manifest_member WHERE dataset = $dataset
+                  GROUP BY manifest_id, kind ORDER BY manifest_id, kind""",
+        "params": ["dataset"],
+        "scopes": ["manifests:read"],
+    },
+    "manifest_diff": {
+        "sql": """SELECT coalesce(t.logical_id, b.logical_id) AS logical_id,
+                         coalesce(t.kind, b.kind) AS kind,
+                         b.hash AS base_hash, t.hash AS target_hash,
+                         CASE WHEN b.hash IS NULL THEN 'added' WHEN t.hash IS NULL THEN 'removed' ELSE 'changed' END AS change
+                  FROM (SELECT * FROM manifest_member WHERE dataset = $dataset AND manifest_id = $base) b
+                  FULL OUTER JOIN (SELECT * FROM manifest_member WHERE dataset = $dataset AND manifest_id = $target) t
+                    ON b.kind = t.kind AND b.logical_id = t.logical_id
+                  WHERE b.hash IS DISTINCT FROM t.hash
+                  ORDER BY logical_id""",
+        "params": ["dataset", "base", "target"],
+        "scopes": ["manifests:read"],
+    },
+}
+
+MEDIA_NDJSON = "application/x-ndjson"
+MEDIA_PARQUET = "application/vnd.apache.parquet"
+MEDIA_ARROW = "application/vnd.apache.arrow.stream"
+BATCH_ROWS = 1024
+
+def _error(status: int, code: str, message: str) -> HTTPException:
+    return HTTPException(status_code=status, detail={"error": {"code": code, "message": message}})
+
+class ConnectionPool:
+    """At most `size` read-only connections to one DuckDB file, checked out one per request.
+
+    DuckDB locks the file for as long as any connection to it is open, so connections are
+    only kept briefly: an idle one is closed after `idle_seconds`, and one opened before the
+    file last changed is never handed out again. That lets rebuild_duckdb.py take its write
+    lock between bursts of queries, and the next query reads what it wrote."""
+
+    def __init__(self, path: str, size: int, idle_seconds: float = 2.0):
+        self.path = path
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: list[tuple] = []  # (connection, file signature, released at)
+        self._opened: dict[int, tuple] = {}  # id(connection) -> file signature when opened
+        self._reaper: threading.Timer | None = None
+        self._closed = False
+
+    def _signature(self) -> tuple:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            raise _error(503, "unavailable", "projection database not built")
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _open(self, sig: tuple):
+        try:
+            con = duckdb.connect(self.path, read_only=True)
+        except duckdb.Error:  # e.g. rebuild_duckdb.py holds the write lock
+            raise _error(503, "unavailable", "projection database is being rebuilt")
+        self._opened[id(con)] = sig
+        return con
+
+    def acquire(self, timeout: float):
+        if not self._slots.acquire(timeout=timeout):
+            raise _error(503, "busy", "all query connections are in use")
+        try:
+            sig = self._signature()
+            con, stale = None, []
+            with self._lock:
+                while self._idle:
+                    idle, opened, _ = self._idle.pop()
+                    if opened == sig:
+                        con = idle
+                        break
+                    stale.append(idle)
+            self._close(stale)
+            return con if con is not None else self._open(sig)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, con) -> None:
+        with self._lock:
+            if self._closed:
+                self._close([con])
+            else:
+                self._idle.append((con, self._opened[id(con)], time.monotonic()))
+                if self._reaper is None:
+                    self._schedule()
+        self._slots.release()
+
+    def _schedule(self) -> None:
+        self._reaper = threading.Timer(self.idle_seconds, self._reap)
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def _reap(self) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            expired = [e[0] for e in self._idle if e[2] <= cutoff]
+            self._idle = [e for e in self._idle if e[2] > cutoff]
+            self._reaper = None
+            if self._idle and not self._closed:
+                self._schedule()
+        self._close(expired)
+
+    def _close(self, cons) -> None:
+        for con in cons:
+            self._opened.pop(id(con), None)
+            con.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._reaper is not None:
+                self._reaper.cancel()
+            idle, self._idle = [e[0] for e in self._idle], []
+        self._close(idle)
+
+_pool: ConnectionPool | None = None
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None or _pool.path != settings.db_path:
+        reset_pool()
+        _pool = ConnectionPool(settings.db_path, settings.query_pool_size, settings.query_idle_seconds)
+    return _pool
+
+def reset_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = None
+
+def resolve(name: str, params: dict, scopes: set[str]) -> dict:
+    q = QUERIES.get(name)
+    if q is None:
+        raise _error(404, "not_found", f"unknown query: {name}")
+    if not scopes & set(q["scopes"]):
+        raise _error(403, "forbidden", f"Missing scope for query {name}: one of {', '.join(q['scopes'])}")
+    missing = [p for p in q["params"] if p not in params]
+    extra = [p for p in params if p not in q["params"]]
+    if missing or extra:
+        raise _error(400, "bad_request", f"query {name} takes params {', '.join(q['params'])}")
+    return q
+
+def negotiate(accept: str | None) -> str:
+    accept = accept or ""
+    for media in (MEDIA_ARROW, MEDIA_PARQUET, MEDIA_NDJSON):
+        if media in accept:
+            return media
+    if "*/*" in accept or "application/json" in accept or not accept:
+        return MEDIA_NDJSON
+    raise _error(406, "not_acceptable", f"supported: {MEDIA_NDJSON}, {MEDIA_PARQUET}, {MEDIA_ARROW}")
+
+def _default(v):
+    return v.isoformat() if isinstance(v, (datetime.date, datetime.time)) else str(v)
+
+@contextmanager
+def deadline(con, until: float, seconds: float):
+    """Interrupt whatever `con` is running at `until` (time.monotonic()), the end of the query's
+    `seconds` budget, so executing and streaming share one budget."""
+    remaining = until - time.monotonic()
+    if remaining <= 0:  # an interrupt sent before the next call starts would be lost
+        raise _error(504, "timeout", f"query exceeded {seconds:g}s")
+    timer = threading.Timer(remaining, con.interrupt)
+    timer.start()
+    try:
+        yield
+    except duckdb.InterruptException:
+        raise _error(504, "timeout", f"query exceeded {seconds:g}s")
+    finally:
+        timer.cancel()
+
+def _bounded(value, name: str, cap, integer: bool):
+    """`value` capped at `cap` (`cap` itself when omitted); 400 unless it is a positive number."""
+    if value is None:
+        return cap
+    kinds = (int,) if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or not math.isfinite(value) or value <= 0:
+        raise _error(400, "invalid", f"{name} must be a positive {'integer' if integer else 'number'}")
+    return min(value, cap)
+
+READABLE = """hash NOT IN (SELECT hash FROM object_store
+                    WHERE list_contains($denied_classifications::VARCHAR[], classification)
+                       OR list_has_any($denied_tags::VARCHAR[],
+                                       coalesce(from_json(doc->'$.envelope.privacy.policy_tags', '["VARCHAR"]'), [])))"""
+
+def denied(rules: dict[str, str], scopes: set[str]) -> list[str]:
+    """The classifications or tags in `rules` whose required scope is not in `scopes`."""
+    return sorted(k for k, needed in rules.items() if needed not in scopes)
+
+def run(name: str, params: dict, scopes: set[str], media: str, limit: int | None, timeout: float | None):
+    """Execute a named query and return a generator of response chunks.
+
+    The cursor stays checked out until the generator is exhausted or closed, so rows
+    are pulled from DuckDB batch by batch while the response streams."""
+    q = resolve(name, params, scopes)
+    if media == MEDIA_ARROW:
+        try:
+            import pyarrow.ipc  # noqa: F401
+        except ImportError:
+            raise _error(406, "not_acceptable", "Arrow output requires pyarrow on the server")
+    limit = _bounded(limit, "limit", settings.query_max_rows, integer=True)
+    timeout = _bounded(timeout, "timeout", settings.query_timeout_seconds, integer=False)
+    until = time.monotonic() + timeout
+    if "{readable}" in q["sql"]:
+        params = {**params, "denied_classifications": denied(policy.classification_scopes, scopes),
+                  "denied_tags": denied(policy.tag_scopes, scopes)}
+    sql = f"SELECT * FROM ({q['sql'].replace('{readable}', READABLE)}) AS q LIMIT {int(limit)}"
+    pool = get_pool()
+    con = pool.acquire(timeout)
+    try:
+        with deadline(con, until, timeout):
+            if media == MEDIA_PARQUET:
+                fd, path = tempfile.mkstemp(suffix=".parquet")
+                os.close(fd)
+                con.sql(sql, params=params).write_parquet(path)
+            else:
+                res = con.execute(sql, params)
+    except BaseException:
+        pool.release(con)
+        raise
+    if media == MEDIA_PARQUET:
+        pool.release(con)
+        return _stream_file(path)
+    if media == MEDIA_ARROW:
+        return _stream_arrow(pool, con, res, until, timeout)
+    return _stream_ndjson(pool, con, res, until, timeout)
+
+def _stream_ndjson(pool, con, res, until, timeout):
+    cols = [d[0] for d in res.description]
+    try:
+        with deadline(con, until, timeout):
+            while True:
+                rows = res.fetchmany(BATCH_ROWS)
+                if not rows:
+                    break
+                yield "".join(json.dumps(dict(zip(cols, r)), default=_default) + "\n" for r in rows).encode("utf-8")
+    except HTTPException as e:
+        # headers are already sent; report the failure as the final line
+        yield (json.dumps(e.detail) + "\n").encode("utf-8")
+    finally:
+        pool.release(con)
+
+def _stream_arrow(pool, con, res, until, timeout):
+    import io, pyarrow.ipc
+    try:
+        with deadline(con, until, timeout):
+            reader = res.fetch_record_batch(BATCH_ROWS)
+            buf = io.BytesIO()
+            with pyarrow.ipc.new_stream(buf, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+    finally:
+        pool.release(con)
+
+def _stream_file(path: str, chunk: int = 1 << 16):
+    try:
+        with open(path, "rb") as f:
+            while data := f.read(chunk):
+                yield data
+    finally:
+        os.unlink(path)
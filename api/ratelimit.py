@@ -0,0 +1,75 @@
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from fastapi import Depends, HTTPException
+from .metrics import RATE_LIMIT_BUCKETS, RATE_LIMIT_DECISIONS
+from .security import require_bearer, settings
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`; each request takes one."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = burst, now
+
+    def take(self, now: float) -> float:
+        """0 when a token was taken, else seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+class RateLimiter:
+    """Per-(subject, scope) token buckets. Only scopes listed in `limits` are limited.
+
+    Buckets are kept in LRU order and capped at `max_buckets`; an evicted subject simply
+    starts again with a full bucket."""
+
+    def __init__(self, limits: dict[str, list[float]], max_buckets: int = 100_000, clock=time.monotonic):
+        self.limits = {scope: (float(rate), float(burst)) for scope, (rate, burst) in limits.items()}
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, subject: str, scope: str) -> float:
+        """0 if the request may proceed, else the Retry-After in seconds."""
+        limit = self.limits.get(scope)
+        if limit is None:
+            return 0.0
+        key = (subject, scope)
+        with self._lock:
+            now = self.clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(*limit, now)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                RATE_LIMIT_BUCKETS.set(len(self._buckets))
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(now)
+        RATE_LIMIT_DECISIONS.labels(scope, "limited" if wait else "allowed").inc()
+        return wait
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+        RATE_LIMIT_BUCKETS.set(0)
+
+limiter = RateLimiter(settings.rate_limits)
+
+def rate_limited(scope: str):
+    """Dependency: the authenticated principal, after charging one request to (sub, scope)."""
+    async def dependency(principal=Depends(require_bearer)) -> dict:
+        if settings.rate_limit_enabled:
+            wait = limiter.check(principal.get("sub") or "anonymous", scope)
+            if wait:
+                raise HTTPException(status_code=429, headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+                                    detail={"error":{"code":"rate_limited","message":f"rate limit exceeded for {scope}"}})
+        return principal
+    return dependency
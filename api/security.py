@@ -1,7 +1,14 @@
 from __future__ import annotations
+import pathlib
 from fastapi import Header, HTTPException
 from jose import jwt, JWTError
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
+from bnx.paths import DERIVED
+from .metrics import stage
+
+# max requests served at once per endpoint group; BNX_ENDPOINT_CONCURRENCY overrides any of them
+ENDPOINT_CONCURRENCY = {"objects": 512, "manifests": 128, "summary": 16, "graph": 64, "promote": 2, "ingest": 8}
 
 class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
@@ -11,9 +18,51 @@ class Settings(BaseSettings):
     jwt_public_key: str | None = None
     jwt_private_key: str | None = None
     cors_origins: str = ""
+    db_path: str = str(pathlib.Path(__file__).resolve().parents[1] / "db" / "bnxlink.duckdb")
+    query_pool_size: int = 4
+    query_idle_seconds: float = 2.0  # idle query connections are closed after this, releasing the DuckDB file lock
+    query_timeout_seconds: float = 10.0
+    query_max_rows: int = 100_000
+    shared_cache_path: str | None = None  # e.g. /dev/shm/bnxlink-objects; unset disables the cross-worker cache
+    shared_cache_mb: int = 64
+    object_cache_size: int = 10_000  # parsed objects kept per worker
+    snapshot_path: str = str(DERIVED / "snapshot.bnxs")
+    warm_start: bool = True
+    view_cache_size: int = 10_000  # rendered (redacted) views kept per worker
+    prefetch_concurrency: int = 4  # objects warmed in parallel after a promotion
+    prefetch_views: str = "llm_min"  # views rendered ahead of time, comma-separated
+    prefetch_on_manifest_fetch: bool = False
+    io_threads: int = 32  # threads for blocking file reads behind the async endpoints
+    endpoint_concurrency: dict[str, int] = ENDPOINT_CONCURRENCY  # JSON in BNX_ENDPOINT_CONCURRENCY, merged over the defaults
+    endpoint_queue_timeout_seconds: float = 2.0
+    queue_latency_target_ms: float = 250  # shed instead of queueing once the smoothed slot wait exceeds this
+    # policy_tag -> scope required to read objects carrying it; JSON in BNX_POLICY_TAG_SCOPES
+    policy_tag_scopes: dict[str, str] = {}
+    rate_limit_enabled: bool = True
+    # scope -> [requests per second, burst] per JWT subject; JSON in BNX_RATE_LIMITS
+    rate_limits: dict[str, list[float]] = {"objects:read": [100, 200], "manifests:read": [50, 100],
+                                           "query:run": [5, 20], "channels:promote": [0.2, 5], "objects:write": [20, 40]}
+    profile_enabled: bool = False  # install the X-BNX-Profile hook at all
+    profile_sample_rate: float = 0.0  # fraction of all requests profiled to profile_dir
+    profile_dir: str = str(DERIVED / "profiles")
+    profile_top: int = 40  # functions listed in an inline report
+    max_object_bytes: int = 1 << 20  # largest object accepted by POST /objects, per NDJSON line in bulk
+    fsync: str = "batch"  # batch | always | off: how object, ref, channel and ledger writes reach disk (BNX_FSYNC)
+    ingest_batch_size: int = 500  # NDJSON lines stored (and ledgered) per group while the body streams in
+    request_log_path: str | None = None  # NDJSON access log of api.request events, replayable by scripts/loadtest.py
     
     model_config = {"env_prefix": "BNX_", "env_file": ".env"}
 
+    @field_validator("endpoint_concurrency")
+    @classmethod
+    def _merge_endpoint_concurrency(cls, v: dict[str, int]) -> dict[str, int]:
+        unknown = sorted(set(v) - set(ENDPOINT_CONCURRENCY))
+        if unknown:
+            raise ValueError(f"unknown endpoint groups {', '.join(unknown)}; expected {', '.join(ENDPOINT_CONCURRENCY)}")
+        if any(n < 1 for n in v.values()):
+            raise ValueError("endpoint concurrency must be at least 1")
+        return {**ENDPOINT_CONCURRENCY, **v}
+
 settings = Settings()
 
 def _decode(token: str) -> dict:
@@ -28,10 +77,11 @@ def _decode(token: str) -> dict:
     except JWTError:
         raise HTTPException(status_code=401, detail={"error":{"code":"unauthorized","message":"Unauthorized"}})
 
-def require_bearer(authorization: str | None = Header(None, alias="Authorization")) -> dict:
+async def require_bearer(authorization: str | None = Header(None, alias="Authorization")) -> dict:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail={"error":{"code":"unauthorized","message":"Unauthorized"}})
-    claims = _decode(authorization.split(" ", 1)[1])
+    with stage("any", "auth"):
+        claims = _decode(authorization.split(" ", 1)[1])
     scopes = claims.get("scope") or claims.get("scopes") or ""
     scope_list = [s for s in (scopes if isinstance(scopes, str) else " ".join(scopes)).split() if s]
     return {"sub": claims.get("sub"), "scopes": set(scope_list), "purpose": claims.get("purpose"), "claims": claims}
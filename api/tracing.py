@@ -0,0 +1,25 @@
+from __future__ import annotations
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from bnx import tracing
+
+class TraceMiddleware:
+    """One server span per HTTP request, continuing the caller's `traceparent` if it sent one.
+
+    Installed only when BNX_TRACE_EXPORT is set; spans opened by the handler (object load,
+    redaction, summarization) become its children, including those run on I/O threads."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        parent = Headers(scope=scope).get("traceparent")
+        with tracing.span(f"http {scope['method']}", parent, **{"http.target": scope["path"]}) as span:
+            async def send_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set(**{"http.status_code": message["status"]})
+                await send(message)
+            await self.app(scope, receive, send_status)
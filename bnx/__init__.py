@@ -0,0 +1 @@
+"""BNX Link core library shared by the API, agent and scripts."""
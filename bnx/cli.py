@@ -0,0 +1,49 @@
+from __future__ import annotations
+import argparse, pathlib, time
+from bnx import manifest, snapshot, tracing
+
+def cmd_snapshot(args) -> None:
+    start = time.perf_counter()
+    snap = snapshot.build(pathlib.Path(args.data))
+    snapshot.write(snap, pathlib.Path(args.out))
+    print(f"[OK] snapshot {args.out}: {len(snap['manifests'])} manifests, {len(snap['hot'])} hot objects "
+          f"in {time.perf_counter() - start:.2f}s")
+
+def cmd_manifest_v2(args) -> None:
+    for dataset, manifest_id, path in manifest.manifest_files(pathlib.Path(args.data)):
+        if path.suffix == ".json" and (args.dataset is None or args.dataset == dataset):
+            size = path.stat().st_size
+            out = manifest.convert(path)
+            print(f"[OK] {dataset}/{manifest_id}: {size} -> {out.stat().st_size} bytes")
+
+def cmd_trace(args) -> None:
+    spans = tracing.read_spans(args.file)
+    if args.trace:
+        spans = [s for s in spans if s["trace_id"] == args.trace]
+    elif args.last:
+        recent = list(dict.fromkeys(s["trace_id"] for s in sorted(spans, key=lambda s: s["start_ns"])))[-args.last:]
+        spans = [s for s in spans if s["trace_id"] in recent]
+    for line in tracing.render_tree(spans):
+        print(line)
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(prog="bnx", description="BNX Link maintenance commands")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("snapshot", help="write the API warm-start snapshot (indexes + hot set)")
+    p.add_argument("--data", default=str(snapshot.DATA))
+    p.add_argument("--out", default=str(snapshot.SNAPSHOT_PATH))
+    p.set_defaults(func=cmd_snapshot)
+    p = sub.add_parser("manifest-v2", help="replace every v1 JSON manifest with a compact v2 one")
+    p.add_argument("--data", default=str(snapshot.DATA))
+    p.add_argument("--dataset", help="only this dataset")
+    p.set_defaults(func=cmd_manifest_v2)
+    p = sub.add_parser("trace", help="print exported spans as per-trace trees with durations")
+    p.add_argument("--file", default=str(tracing.TRACE_FILE))
+    p.add_argument("--trace", help="only this trace id")
+    p.add_argument("--last", type=int, default=5, help="only the most recent N traces (default 5)")
+    p.set_defaults(func=cmd_trace)
+    args = ap.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
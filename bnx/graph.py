@@ -0,0 +1,125 @@
+from __future__ import annotations
+import json, os, pathlib, struct, sys
+from array import array
+from collections import deque
+from typing import Iterable
+from bnx.paths import DERIVED
+
+GRAPH_DIR = DERIVED / "manifests"
+MAGIC = b"BNXG"
+GRAPH_VERSION = 1
+
+def graph_path(dataset: str, manifest_id: str) -> pathlib.Path:
+    return GRAPH_DIR / dataset / manifest_id / "graph.bnxg"
+
+def _u32(values=()) -> array:
+    a = array("I", values)
+    assert a.itemsize == 4
+    return a
+
+def _csr(n: int, pairs: list[tuple[int, int, int]]) -> tuple[array, array, array]:
+    """Compressed sparse rows from (src, dst, rel) triples: offsets[n+1], targets, rels."""
+    pairs.sort()
+    offsets, targets, rels = _u32([0] * (n + 1)), _u32(), _u32()
+    for src, dst, rel in pairs:
+        offsets[src + 1] += 1
+        targets.append(dst)
+        rels.append(rel)
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    return offsets, targets, rels
+
+class Graph:
+    """Relationship graph over interned logical ids, held as forward and reverse CSR arrays.
+
+    Edges are EntityRecord relationships (entity -> target_id, labelled by rel) and
+    ActivityRecord subject_refs (activity -> subject, labelled "subject")."""
+
+    def __init__(self, nodes: list[str], rels: list[str], out: tuple[array, array, array], inc: tuple[array, array, array]):
+        self.nodes = nodes
+        self.rels = rels
+        self.ids = {n: i for i, n in enumerate(nodes)}
+        self.rel_ids = {r: i for i, r in enumerate(rels)}
+        self.out = out
+        self.inc = inc
+
+    @classmethod
+    def build(cls, edges: Iterable[tuple[str, str, str]], nodes: Iterable[str] = ()) -> "Graph":
+        edges = list(dict.fromkeys(edges))
+        names = sorted({n for n in nodes if n} | {e[0] for e in edges} | {e[2] for e in edges})
+        ids = {n: i for i, n in enumerate(names)}
+        rels = sorted({e[1] for e in edges})
+        rel_ids = {r: i for i, r in enumerate(rels)}
+        fwd = [(ids[s], ids[d], rel_ids[r]) for s, r, d in edges]
+        rev = [(d, s, r) for s, d, r in fwd]
+        return cls(names, rels, _csr(len(names), fwd), _csr(len(names), rev))
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.ids
+
+    def _adjacent(self, i: int, csr: tuple[array, array, array], allowed: set[int] | None):
+        offsets, targets, rels = csr
+        for k in range(offsets[i], offsets[i + 1]):
+            if allowed is None or rels[k] in allowed:
+                yield targets[k], rels[k]
+
+    def neighbors(self, node: str, depth: int = 1, direction: str = "both", rels: Iterable[str] | None = None) -> dict:
+        """Breadth-first expansion up to `depth` hops; returns reached nodes and traversed edges."""
+        allowed = None if rels is None else {self.rel_ids[r] for r in rels if r in self.rel_ids}
+        start = self.ids[node]
+        seen = {start: 0}
+        edges = set()
+        frontier = deque([start])
+        while frontier:
+            i = frontier.popleft()
+            if seen[i] >= depth:
+                continue
+            steps = []
+            if direction in ("out", "both"):
+                steps += [(i, j, r, j) for j, r in self._adjacent(i, self.out, allowed)]
+            if direction in ("in", "both"):
+                steps += [(j, i, r, j) for j, r in self._adjacent(i, self.inc, allowed)]
+            for src, dst, r, nxt in steps:
+                edges.add((src, r, dst))
+                if nxt not in seen:
+                    seen[nxt] = seen[i] + 1
+                    frontier.append(nxt)
+        return {
+            "nodes": [{"id": self.nodes[i], "depth": d} for i, d in sorted(seen.items(), key=lambda x: (x[1], self.nodes[x[0]])) if i != start],
+            "edges": [{"source": self.nodes[s], "rel": self.rels[r], "target": self.nodes[d]} for s, r, d in sorted(edges)],
+        }
+
+    def save(self, path: pathlib.Path) -> None:
+        header = json.dumps({"version": GRAPH_VERSION, "nodes": self.nodes, "rels": self.rels}).encode("utf-8")
+        arrays = [*self.out, *self.inc]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            for a in arrays:
+                f.write(struct.pack("<I", len(a)))
+                if sys.byteorder != "little":
+                    a = _u32(a)
+                    a.byteswap()
+                a.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "Graph":
+        data = path.read_bytes()
+        if data[:4] != MAGIC:
+            raise ValueError(f"not a graph file: {path}")
+        (hlen,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(data[8:8 + hlen])
+        if header.get("version") != GRAPH_VERSION:
+            raise ValueError(f"unsupported graph version {header.get('version')}: {path}")
+        pos, arrays = 8 + hlen, []
+        for _ in range(6):
+            (n,) = struct.unpack_from("<I", data, pos)
+            a = _u32()
+            a.frombytes(data[pos + 4:pos + 4 + 4 * n])
+            if sys.byteorder != "little":
+                a.byteswap()
+            arrays.append(a)
+            pos += 4 + 4 * n
+        return cls(header["nodes"], header["rels"], tuple(arrays[:3]), tuple(arrays[3:]))
@@ -0,0 +1,304 @@
+from __future__ import annotations
+import array, bisect, hashlib, json, mmap, os, pathlib, struct, sys
+from collections.abc import Mapping, Sequence
+from typing import Iterator
+from bnx.paths import DATA
+
+# Manifest format v2 (`<id>.bnxm`, little-endian):
+#   MAGIC, u32 format version, u32 header length, JSON header, zero padding to a multiple of 4, then columns
+#   digests   count x 32 bytes   object sha256 digests
+#   kinds     count x u16        index into header["kinds"]
+#   dates     count x u16        index into header["dates"]
+#   id_offs   (count + 1) x u32  logical id i is ids[id_offs[i]:id_offs[i + 1]]
+#   ids       UTF-8 logical ids, back to back
+# Entries are sorted by logical id, so one logical id is found by bisection; the sort is stable, so
+# entries sharing a logical id keep their input order and the last one wins, as in a v1 dict. Kinds
+# and dates are interned in the header; "" stands for a missing kind, date or logical id.
+MAGIC = b"BNXM"
+FORMAT_VERSION = 2
+SUFFIX = ".bnxm"
+_LITTLE = sys.byteorder == "little"
+
+def manifest_file(dataset: str, manifest_id: str, data: pathlib.Path = DATA) -> pathlib.Path | None:
+    """The manifest's file, preferring v2 over v1 JSON when both exist; None if there is neither."""
+    base = data / "manifests" / dataset / manifest_id
+    for path in (base.with_name(manifest_id + SUFFIX), base.with_name(manifest_id + ".json")):
+        if path.exists():
+            return path
+    return None
+
+def manifest_files(data: pathlib.Path = DATA) -> list[tuple[str, str, pathlib.Path]]:
+    """(dataset, manifest id, file) for every manifest under `data`, one file per id."""
+    found: dict[tuple[str, str], pathlib.Path] = {}
+    for path in sorted((data / "manifests").glob("*/*")):
+        if path.suffix in (SUFFIX, ".json") and not path.name.startswith("."):
+            key = (path.parent.name, path.stem)
+            if key not in found or path.suffix == SUFFIX:
+                found[key] = path
+    return [(ds, mid, path) for (ds, mid), path in sorted(found.items())]
+
+def _column(buf, fmt: str) -> Sequence[int]:
+    if _LITTLE:
+        return memoryview(buf).cast(fmt)
+    col = array.array(fmt, bytes(buf))
+    col.byteswap()
+    return col
+
+def _pad(n: int) -> int:
+    return -n % 4
+
+class Manifest(Mapping):
+    """One manifest as parallel columns: packed 32-byte digests, u16 kind and date indexes into
+    interned string tables, and logical ids as one UTF-8 buffer plus offsets. About 45 bytes per
+    entry instead of two dicts of Python strings.
+
+    It is also a read-only Mapping shaped like a v1 manifest (`entries`, `objects`, `manifest_id`,
+    ...), so code written against v1 dicts keeps working; `hashes()`, `members()` and
+    `find()` go straight to the columns."""
+
+    def __init__(self, header: dict, digests, kinds, dates, id_offs, ids, ordered: bool, source: pathlib.Path | None = None):
+        self.header = header
+        self.count = header["count"]
+        self._digests, self._kinds, self._dates, self._id_offs, self._ids = digests, kinds, dates, id_offs, ids
+        self.kinds: list[str] = header["kinds"]
+        self.dates: list[str] = header["dates"]
+        self.ordered = ordered  # sorted by logical id, so find() can bisect
+        self.source = source
+        self._index: dict[str, int] | None = None
+
+    @property
+    def manifest_id(self) -> str | None:
+        return self.header.get("manifest_id")
+
+    def hash(self, i: int) -> str:
+        return "sha256:" + self._digests[32 * i:32 * (i + 1)].hex()
+
+    def hashes(self) -> list[str]:
+        hexes = bytes(self._digests).hex()
+        return ["sha256:" + hexes[64 * i:64 * (i + 1)] for i in range(self.count)]
+
+    def logical_id(self, i: int) -> str | None:
+        return bytes(self._ids[self._id_offs[i]:self._id_offs[i + 1]]).decode("utf-8") or None
+
+    def kind(self, i: int) -> str | None:
+        return self.kinds[self._kinds[i]] or None
+
+    def date(self, i: int) -> str | None:
+        return self.dates[self._dates[i]] or None
+
+    def entry(self, i: int) -> dict:
+        return {"kind": self.kind(i), "logical_id": self.logical_id(i), "date": self.date(i), "object": self.hash(i)}
+
+    def members(self) -> dict[str, str]:
+        """logical_id -> object hash for every entry that has a logical id; the last entry wins."""
+        ids, offs = bytes(self._ids), self._id_offs
+        hexes = bytes(self._digests).hex()
+        out = {}
+        for i in range(self.count):
+            if offs[i] != offs[i + 1]:
+                out[ids[offs[i]:offs[i + 1]].decode("utf-8")] = "sha256:" + hexes[64 * i:64 * (i + 1)]
+        return out
+
+    def unnamed(self) -> list[int]:
+        """Positions of entries without a logical id (all of them, for objects-only v1 manifests)."""
+        offs = self._id_offs
+        return [i for i in range(self.count) if offs[i] == offs[i + 1]]
+
+    def find(self, logical_id: str) -> str | None:
+        """The object hash listed for `logical_id` (the last entry if it is listed more than once,
+        like `members()`), or None."""
+        if self.ordered:
+            key = logical_id.encode("utf-8")
+            i = bisect.bisect_right(range(self.count), key, key=lambda j: bytes(self._ids[self._id_offs[j]:self._id_offs[j + 1]])) - 1
+            return self.hash(i) if i >= 0 and self.logical_id(i) == logical_id else None
+        if self._index is None:
+            self._index = {self.logical_id(i): i for i in range(self.count)}
+        i = self._index.get(logical_id)
+        return None if i is None else self.hash(i)
+
+    # v1 view
+    def _fields(self) -> dict:
+        return {"manifest_id": self.header.get("manifest_id"), "dataset": self.header.get("dataset"),
+                "created_at": self.header.get("created_at"), **self.header.get("extra", {})}
+
+    def __getitem__(self, key: str):
+        if key == "entries":
+            return _Rows(self, self.entry)
+        if key == "objects":
+            return _Rows(self, lambda i: {"hash": self.hash(i)})
+        fields = self._fields()
+        if key in fields:
+            return fields[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._fields()
+        yield "entries"
+        yield "objects"
+
+    def __len__(self) -> int:
+        return len(self._fields()) + 2
+
+    def iter_v1_json(self, batch: int = 10_000) -> Iterator[bytes]:
+        """The manifest as v1 JSON (`entries` plus the back-compat `objects` list), in chunks."""
+        yield json.dumps(self._fields())[:-1].encode("utf-8") + b', "entries": ['
+        for start in range(0, self.count, batch):
+            rows = ", ".join(json.dumps(self.entry(i)) for i in range(start, min(start + batch, self.count)))
+            yield (", " if start else "").encode() + rows.encode("utf-8")
+        yield b'], "objects": ['
+        for start in range(0, self.count, batch):
+            rows = ", ".join(f'{{"hash": "{self.hash(i)}"}}' for i in range(start, min(start + batch, self.count)))
+            yield (", " if start else "").encode() + rows.encode("utf-8")
+        yield b"]}"
+
+    def to_v1(self) -> dict:
+        return {**self._fields(), "entries": [self.entry(i) for i in range(self.count)],
+                "objects": [{"hash": self.hash(i)} for i in range(self.count)]}
+
+    def digest(self) -> str:
+        """sha256 over the v1 JSON rendering, in this manifest's entry order."""
+        h = hashlib.sha256()
+        for chunk in self.iter_v1_json():
+            h.update(chunk)
+        return h.hexdigest()
+
+class _Rows(Sequence):
+    """entries / objects of a Manifest, built one dict at a time."""
+
+    def __init__(self, manifest: Manifest, row):
+        self._m, self._row = manifest, row
+
+    def __len__(self) -> int:
+        return self._m.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._row(j) for j in range(*i.indices(self._m.count))]
+        if i < 0:
+            i += self._m.count
+        if not 0 <= i < self._m.count:
+            raise IndexError(i)
+        return self._row(i)
+
+def _columns(entries: list[dict]) -> tuple[list[str], list[str], bytes, array.array, array.array, array.array, bytes]:
+    kinds: dict[str, int] = {"": 0}
+    dates: dict[str, int] = {"": 0}
+    digests, ids = bytearray(), bytearray()
+    kind_col, date_col, offs = array.array("H"), array.array("H"), array.array("I", [0])
+    for e in entries:
+        h = e.get("object") or e.get("hash") or ""
+        if not h.startswith("sha256:") or len(h) != 71:
+            raise ValueError(f"not a sha256 object hash: {h!r}")
+        digests += bytes.fromhex(h[7:])
+        kind_col.append(kinds.setdefault(e.get("kind") or "", len(kinds)))
+        date_col.append(dates.setdefault(e.get("date") or "", len(dates)))
+        ids += (e.get("logical_id") or "").encode("utf-8")
+        offs.append(len(ids))
+    if len(kinds) > 0xFFFF or len(dates) > 0xFFFF:
+        raise ValueError("too many distinct kinds or dates for a v2 manifest")
+    return list(kinds), list(dates), bytes(digests), kind_col, date_col, offs, bytes(ids)
+
+def _v1_entries(doc: dict) -> list[dict]:
+    if "entries" in doc:
+        return doc["entries"]
+    if "objects" in doc:
+        return [{"object": it["hash"]} for it in doc["objects"]]
+    raise ValueError("manifest missing 'objects' or 'entries'")
+
+def from_v1(doc: dict, source: pathlib.Path | None = None) -> Manifest:
+    """A v1 manifest dict as columns, in its original entry order."""
+    entries = _v1_entries(doc)
+    kinds, dates, digests, kind_col, date_col, offs, ids = _columns(entries)
+    extra = {k: v for k, v in doc.items() if k not in ("manifest_id", "dataset", "created_at", "entries", "objects")}
+    header = {"manifest_id": doc.get("manifest_id"), "dataset": doc.get("dataset"), "created_at": doc.get("created_at"),
+              "count": len(entries), "kinds": kinds, "dates": dates, "extra": extra}
+    return Manifest(header, digests, kind_col, date_col, offs, ids, ordered=False, source=source)
+
+def encode(manifest_id: str, dataset: str, created_at: str, entries: list[dict], extra: dict | None = None) -> bytes:
+    """A v2 manifest file's bytes for v1-style entry dicts (kind, logical_id, date, object)."""
+    entries = sorted(entries, key=lambda e: (e.get("logical_id") or "").encode("utf-8"))
+    kinds, dates, digests, kind_col, date_col, offs, ids = _columns(entries)
+    header = json.dumps({"manifest_id": manifest_id, "dataset": dataset, "created_at": created_at, "count": len(entries),
+                         "kinds": kinds, "dates": dates, "extra": extra or {}}, separators=(",", ":")).encode("utf-8")
+    if not _LITTLE:
+        for col in (kind_col, date_col, offs):
+            col.byteswap()
+    parts = [MAGIC, struct.pack("<II", FORMAT_VERSION, len(header)), header, b"\0" * _pad(12 + len(header)), digests,
+             kind_col.tobytes(), date_col.tobytes(), b"\0" * _pad(4 * len(entries)), offs.tobytes(), ids]
+    return b"".join(parts)
+
+def _layout(head: bytes, path) -> tuple[dict, int]:
+    """(header, offset of the digest column) from a file's first bytes."""
+    if head[:4] != MAGIC:
+        raise ValueError(f"not a v2 manifest: {path}")
+    version, hlen = struct.unpack_from("<II", head, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported manifest format {version}: {path}")
+    return json.loads(head[12:12 + hlen]), 12 + hlen + _pad(12 + hlen)
+
+def _sections(count: int, start: int) -> tuple[int, int, int, int, int]:
+    kinds = start + 32 * count
+    dates = kinds + 2 * count
+    offs = dates + 2 * count + _pad(4 * count)
+    ids = offs + 4 * (count + 1)
+    return start, kinds, dates, offs, ids
+
+def load(path: str | os.PathLike) -> Manifest:
+    """A manifest file of either format. v2 files are memory-mapped, so columns are paged in as used."""
+    path = pathlib.Path(path)
+    if path.suffix != SUFFIX:
+        return from_v1(json.loads(path.read_bytes()), source=path)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return from_buffer(memoryview(mm), source=path)
+
+def from_buffer(view: memoryview, source: pathlib.Path | None = None) -> Manifest:
+    """A v2 manifest over bytes already in memory or mapped (e.g. a section of a snapshot file);
+    the columns are views into `view`, not copies."""
+    (hlen,) = struct.unpack_from("<I", view, 8)
+    header, start = _layout(bytes(view[:12 + hlen]), source)
+    n = header["count"]
+    d, k, t, o, i = _sections(n, start)
+    return Manifest(header, view[d:k], _column(view[k:k + 2 * n], "H"), _column(view[t:t + 2 * n], "H"),
+                    _column(view[o:o + 4 * (n + 1)], "I"), view[i:], ordered=True, source=source)
+
+def iter_entries(path: str | os.PathLike, batch: int = 10_000) -> Iterator[dict]:
+    """A v2 manifest's entries read `batch` at a time with plain file reads, without loading
+    the whole file (v1 JSON files are parsed whole)."""
+    path = pathlib.Path(path)
+    if path.suffix != SUFFIX:
+        yield from _v1_entries(json.loads(path.read_bytes()))
+        return
+    with open(path, "rb") as f:
+        head = f.read(12)
+        (hlen,) = struct.unpack_from("<I", head, 8)
+        header, start = _layout(head + f.read(hlen), path)
+        n = header["count"]
+        d, k, t, o, i = _sections(n, start)
+        def read(offset: int, size: int) -> bytes:
+            f.seek(offset)
+            return f.read(size)
+        for lo in range(0, n, batch):
+            hi = min(lo + batch, n)
+            digests = read(d + 32 * lo, 32 * (hi - lo)).hex()
+            kinds = _column(read(k + 2 * lo, 2 * (hi - lo)), "H")
+            dates = _column(read(t + 2 * lo, 2 * (hi - lo)), "H")
+            offs = _column(read(o + 4 * lo, 4 * (hi - lo + 1)), "I")
+            ids = read(i + offs[0], offs[-1] - offs[0])
+            for j in range(hi - lo):
+                yield {"kind": header["kinds"][kinds[j]] or None,
+                       "logical_id": ids[offs[j] - offs[0]:offs[j + 1] - offs[0]].decode("utf-8") or None,
+                       "date": header["dates"][dates[j]] or None, "object": "sha256:" + digests[64 * j:64 * (j + 1)]}
+
+def convert(path: str | os.PathLike, keep: bool = False) -> pathlib.Path:
+    """Replace a v1 `<id>.json` with `<id>.bnxm`. The JSON is removed unless `keep`, since readers
+    prefer the `.bnxm` and a kept copy would silently go stale."""
+    from bnx.store import write_file
+    path = pathlib.Path(path)
+    m = load(path)
+    out = path.with_suffix(SUFFIX)
+    write_file(out, encode(m.header["manifest_id"] or path.stem, m.header["dataset"] or path.parent.name,
+                           m.header["created_at"], [m.entry(i) for i in range(m.count)], m.header["extra"]))
+    if not keep:
+        path.unlink()
+    return out
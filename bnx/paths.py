@@ -0,0 +1,7 @@
+from __future__ import annotations
+import os, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+# the object store, refs, manifests, channels and ledger; BNX_DATA_DIR points everything at another tree
+DATA = pathlib.Path(os.environ.get("BNX_DATA_DIR") or ROOT / "data")
+DERIVED = DATA / "derived"
@@ -0,0 +1,150 @@
+from __future__ import annotations
+import os, pathlib
+from typing import Callable
+import yaml
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+PROFILES_PATH = pathlib.Path(os.environ.get("BNX_REDACTION_PROFILES") or ROOT / "data" / "redaction.yaml")
+MASK = "[redacted]"
+
+Projector = Callable[[dict], dict]
+
+def _identity(obj):
+    return obj
+
+def _node() -> dict:
+    return {"include": None, "exclude": set(), "mask": set(), "children": {}}
+
+def _tree(rules: dict) -> dict:
+    """Nest dotted include/exclude/mask paths into {key: {"include", "exclude", "mask", "children"}}."""
+    root = _node()
+    for action in ("include", "exclude", "mask"):
+        for path in rules.get(action) or ():
+            node, *parts = root, *path.split(".")
+            for i, part in enumerate(parts):
+                if action == "include":
+                    # ordered: included keys come out in config order
+                    node["include"] = node["include"] or {}
+                    node["include"][part] = None
+                elif i == len(parts) - 1:
+                    node[action].add(part)
+                if i < len(parts) - 1:
+                    node = node["children"].setdefault(part, _node())
+    return root
+
+def _over(f: Projector) -> Callable:
+    """Apply a dict projection to dicts and to each element of lists; leave scalars alone."""
+    def project(v):
+        if type(v) is dict:
+            return f(v)
+        if type(v) is list:
+            return [project(x) for x in v]
+        return v
+    return project
+
+def _masked(v):
+    return MASK
+
+_MISSING = object()
+
+def _compile(node: dict) -> Projector:
+    """Turn one tree node into the cheapest dict -> dict function that applies it."""
+    exclude = frozenset(node["exclude"])
+    children = {k: _compile(v) for k, v in node["children"].items()}
+    actions = {k: _over(f) for k, f in children.items() if f is not _identity}
+    actions.update({k: _masked for k in node["mask"]})
+    if node["include"] is not None:
+        return _compile_include([k for k in node["include"] if k not in exclude], children, actions, node["mask"])
+    if not actions:
+        if not exclude:
+            return _identity
+        return lambda d: {k: v for k, v in d.items() if k not in exclude}
+    get = actions.get
+    return lambda d: {k: v if (f := get(k)) is None else f(v) for k, v in d.items() if k not in exclude}
+
+def _compile_include(keys: list[str], children: dict, actions: dict, mask: set) -> Projector:
+    """Generate straight-line code for a node that keeps a known set of keys.
+
+    Walks only the included keys, in config order; dict values go straight to the child
+    projection and anything else through the list-aware wrapper."""
+    ns = {"_MISSING": _MISSING, "MASK": MASK}
+    lines = ["def project(d):", "    out = {}"]
+    for i, k in enumerate(keys):
+        lines.append(f"    v = d.get({k!r}, _MISSING)")
+        if k in mask:
+            value = "MASK"
+        elif k in actions:
+            ns[f"c{i}"], ns[f"a{i}"] = children[k], actions[k]
+            value = f"c{i}(v) if type(v) is dict else a{i}(v)"
+        else:
+            value = "v"
+        lines.append(f"    if v is not _MISSING: out[{k!r}] = {value}")
+    lines.append("    return out")
+    exec("\n".join(lines), ns)
+    return ns["project"]
+
+def _merge(*rule_sets: dict) -> dict:
+    return {a: [p for r in rule_sets for p in (r.get(a) or ())] or None for a in ("include", "exclude", "mask")}
+
+class Profile:
+    """A named redaction view: base rules plus per-kind and per-`privacy.pii` tag rules.
+
+    Projections are compiled on first use for each (kind, pii tags) combination and reused;
+    `project` only looks at the envelope fields the profile actually has rules for."""
+
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.version = str(spec.get("version", 1))
+        self.spec = spec
+        self._compiled: dict[tuple, Projector] = {}
+        self.project = self._dispatcher()
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def projector(self, kind: str | None, pii: tuple[str, ...] = ()) -> Projector:
+        key = (kind, pii)
+        f = self._compiled.get(key)
+        if f is None:
+            rules = [self.spec, (self.spec.get("kinds") or {}).get(kind) or {}]
+            rules += [(self.spec.get("pii") or {}).get(tag) or {} for tag in pii]
+            f = self._compiled[key] = _compile(_tree(_merge(*rules)))
+        return f
+
+    def _dispatcher(self) -> Projector:
+        by_kind, by_pii = bool(self.spec.get("kinds")), bool(self.spec.get("pii"))
+        if not by_kind and not by_pii:
+            return self.projector(None)
+        compiled, projector = self._compiled, self.projector
+        base = None if by_kind else self.projector(None)
+
+        def project(obj: dict) -> dict:
+            env = obj.get("envelope") or {}
+            pii = (env.get("privacy") or {}).get("pii") if by_pii else None
+            if not pii and base is not None:
+                return base(obj)
+            key = (env.get("kind") if by_kind else None, tuple(sorted(pii)) if pii else ())
+            f = compiled.get(key)
+            return (f or projector(*key))(obj)
+        return project
+
+def load_profiles(path: pathlib.Path = PROFILES_PATH) -> dict[str, Profile]:
+    spec = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    profiles = {name: Profile(name, p or {}) for name, p in (spec.get("profiles") or {}).items()}
+    profiles.setdefault("full", Profile("full", {}))
+    return profiles
+
+_profiles: dict[str, Profile] | None = None
+
+def profiles() -> dict[str, Profile]:
+    global _profiles
+    if _profiles is None:
+        _profiles = load_profiles()
+    return _profiles
+
+def get_profile(name: str) -> Profile:
+    try:
+        return profiles()[name]
+    except KeyError:
+        raise KeyError(f"unknown redaction profile: {name}") from None
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import mmap, os, pathlib, struct, zlib
+from contextlib import contextmanager
+
+MAGIC = b"BNXC"
+CACHE_VERSION = 1
+# magic, version, slot count, arena bytes, generation, arena bytes used
+HEADER = struct.Struct("<4sIQQQQ")
+HEADER_SIZE = 64
+# sha256 digest, arena offset, length, crc32 of the bytes
+SLOT = struct.Struct("<32sQII")
+MAX_PROBE = 16
+EMPTY = bytes(32)
+
+class SharedCache:
+    """Object bytes keyed by sha256, in one memory-mapped file shared by every worker process.
+
+    Layout: header, an open-addressing table of slots, then an append-only arena. Writers
+    serialize on an flock; readers take no lock at all. A reader copies the bytes, then
+    checks the slot's crc32 and that the generation (bumped around every reset, odd while
+    one is running) did not move, and treats anything inconsistent as a miss. When the
+    arena fills up the next writer resets the whole cache."""
+
+    def __init__(self, path: str | os.PathLike, size: int, slots: int | None = None):
+        import fcntl  # POSIX only; callers treat ImportError as "no shared cache"
+        self._fcntl = fcntl
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.hits = self.misses = 0
+        with self._locked():
+            head = os.pread(self._fd, HEADER.size, 0)
+            if len(head) == HEADER.size and head[:4] == MAGIC and HEADER.unpack(head)[1] == CACHE_VERSION:
+                _, _, self.slots, self.arena_size, _, _ = HEADER.unpack(head)
+            else:
+                self.slots = slots or max(1024, size // 2048)
+                self.arena_size = size
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, HEADER_SIZE + self.slots * SLOT.size + self.arena_size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, CACHE_VERSION, self.slots, self.arena_size, 0, 0), 0)
+        self._arena = HEADER_SIZE + self.slots * SLOT.size
+        self._mm = mmap.mmap(self._fd, self._arena + self.arena_size)
+
+    @contextmanager
+    def _locked(self):
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def _generation(self) -> int:
+        return struct.unpack_from("<Q", self._mm, 24)[0]
+
+    def _slot(self, i: int) -> int:
+        return HEADER_SIZE + (i % self.slots) * SLOT.size
+
+    def _key(self, hex_digest: str) -> bytes | None:
+        try:
+            key = bytes.fromhex(hex_digest)
+        except ValueError:
+            return None
+        return key if len(key) == 32 else None
+
+    def get(self, hex_digest: str) -> bytes | None:
+        key = self._key(hex_digest)
+        if key is None:
+            return None
+        gen = self._generation()
+        if not gen & 1:
+            start = int.from_bytes(key[:8], "little")
+            for probe in range(MAX_PROBE):
+                k, off, n, crc = SLOT.unpack_from(self._mm, self._slot(start + probe))
+                if k == EMPTY:
+                    break
+                if k == key:
+                    if off + n <= self.arena_size:
+                        data = self._mm[self._arena + off:self._arena + off + n]
+                        if zlib.crc32(data) == crc and self._generation() == gen:
+                            self.hits += 1
+                            return data
+                    break
+        self.misses += 1
+        return None
+
+    def put(self, hex_digest: str, data: bytes) -> bool:
+        """Store `data` unless it is already cached; False when it cannot be placed."""
+        key = self._key(hex_digest)
+        if key is None or len(data) > self.arena_size:
+            return False
+        with self._locked():
+            used = struct.unpack_from("<Q", self._mm, 32)[0]
+            if used + len(data) > self.arena_size:
+                self._reset()
+                used = 0
+            start = int.from_bytes(key[:8], "little")
+            for probe in range(MAX_PROBE):
+                pos = self._slot(start + probe)
+                k = self._mm[pos:pos + 32]
+                if k == key:
+                    return True
+                if k == EMPTY:
+                    break
+            else:
+                return False
+            self._mm[self._arena + used:self._arena + used + len(data)] = data
+            struct.pack_into("<Q", self._mm, 32, used + len(data))
+            # publish: location first, key last, so a reader never matches a half-written slot
+            struct.pack_into("<QII", self._mm, pos + 32, used, len(data), zlib.crc32(data))
+            self._mm[pos:pos + 32] = key
+        return True
+
+    def _reset(self) -> None:
+        gen = self._generation()
+        struct.pack_into("<Q", self._mm, 24, gen + 1)
+        self._mm[HEADER_SIZE:self._arena] = bytes(self._arena - HEADER_SIZE)
+        struct.pack_into("<Q", self._mm, 32, 0)
+        struct.pack_into("<Q", self._mm, 24, gen + 2)
+
+    def clear(self) -> None:
+        with self._locked():
+            self._reset()
+
+    def stats(self) -> dict:
+        used = struct.unpack_from("<Q", self._mm, 32)[0]
+        return {"hits": self.hits, "misses": self.misses, "bytes_used": used, "bytes_total": self.arena_size,
+                "generation": self._generation()}
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+def open_shared_cache(path: str | None, size_mb: int) -> SharedCache | None:
+    """The shared cache at `path`, or None when it is disabled or unsupported on this platform."""
+    if not path:
+        return None
+    try:
+        return SharedCache(path, size_mb << 20)
+    except ImportError:
+        return None
@@ -0,0 +1,54 @@
+from __future__ import annotations
+import asyncio, threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Hashable
+
+class SingleFlight:
+    """Concurrent calls for the same key share one execution of the loader.
+
+    The first caller (the leader) runs `fn`; everyone who asks for the key while it is
+    running waits for the leader's result or exception instead of loading it again.
+    Threads call `do`, coroutines `do_async`; both join the same in-flight call."""
+
+    def __init__(self, on_coalesce: Callable[[], None] | None = None):
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.on_coalesce = on_coalesce
+        self.coalesced = 0
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is None:
+                fut = self._calls[key] = Future()
+                return fut, True
+            self.coalesced += 1
+        if self.on_coalesce is not None:
+            self.on_coalesce()
+        return fut, False
+
+    def _lead(self, key: Hashable, fut: Future, fn: Callable[[], Any]) -> Any:
+        try:
+            value = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        fut, leader = self._join(key)
+        if leader:
+            return self._lead(key, fut, fn)
+        return fut.result()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Any], executor: Executor | None = None) -> Any:
+        """Like `do`, but the leader runs the blocking `fn` on `executor` and waiters never block the loop."""
+        fut, leader = self._join(key)
+        if leader:
+            return await asyncio.get_running_loop().run_in_executor(executor, self._lead, key, fut, fn)
+        return await asyncio.wrap_future(fut)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import json, mmap, pathlib, struct
+from typing import Callable, Iterator
+import yaml
+from bnx.manifest import Manifest, encode, from_buffer, load as load_manifest, manifest_files
+from bnx.paths import DATA, DERIVED
+from bnx.store import write_file
+
+# Snapshot file (little-endian): MAGIC, u32 version, u32 header length, JSON header, zero padding to a
+# multiple of 4, the hot set as packed 32-byte digests, then one membership section per manifest. A
+# section is a v2 manifest (bnx/manifest.py) of (logical id, object) entries, padded to a multiple of 4;
+# the header maps "<dataset>/<id>" to its source mtime and its section's offset (from the end of the hot
+# set) and length. Opening a snapshot parses only the header; a manifest's membership is decoded when
+# first asked for.
+SNAPSHOT_PATH = DERIVED / "snapshot.bnxs"
+MAGIC = b"BNXS"
+SNAPSHOT_VERSION = 2
+
+def channel_pointers(channels: dict) -> dict[str, dict[str, str]]:
+    """{dataset: {channel: manifest_id}} from channels.yaml, legacy or normalized entries."""
+    out: dict[str, dict[str, str]] = {}
+    for dataset, chans in (channels or {}).items():
+        for channel, ch in (chans or {}).items():
+            # legacy "channel: id" or normalized {current: {id: ...}} (current may itself be a legacy string)
+            if isinstance(ch, dict):
+                ch = ch.get("current")
+            if isinstance(ch, dict):
+                ch = ch.get("id")
+            if ch:
+                out.setdefault(dataset, {})[channel] = ch
+    return out
+
+def logical_id(obj: dict) -> str | None:
+    body = obj.get("body", {})
+    return body.get("entity_id") or body.get("activity_id")
+
+def members_of(manifest: dict | Manifest, load: Callable[[str], dict]) -> dict[str, str]:
+    """logical_id -> object hash; objects-only manifests need each object loaded to learn its id."""
+    if isinstance(manifest, Manifest):
+        members = manifest.members()
+        for i in manifest.unnamed():
+            h = manifest.hash(i)
+            members.setdefault(logical_id(load(h)), h)
+        members.pop(None, None)
+        return members
+    if "entries" in manifest:
+        return {e["logical_id"]: e["object"] for e in manifest["entries"] if e.get("logical_id")}
+    members = {logical_id(load(it["hash"])): it["hash"] for it in manifest.get("objects", [])}
+    members.pop(None, None)
+    return members
+
+def _load_object(data: pathlib.Path, h: str) -> dict:
+    hexf = h.split(":", 1)[1]
+    return json.loads((data / f"objects/{hexf[:2]}/{hexf}.json").read_text(encoding="utf-8"))
+
+def build(data: pathlib.Path = DATA) -> dict:
+    """Indexes the API would otherwise rebuild lazily: channel pointers, per-manifest membership
+    (with the manifest mtime it was built from) and the hot set, i.e. objects of manifests a
+    channel points at."""
+    channels_path = data / "channels.yaml"
+    channels = yaml.safe_load(channels_path.read_text()) if channels_path.exists() else {}
+    pointers = channel_pointers(channels)
+    manifests = {}
+    for dataset, manifest_id, path in manifest_files(data):
+        manifests[f"{dataset}/{manifest_id}"] = {"mtime": path.stat().st_mtime,
+                                                 "members": members_of(load_manifest(path), lambda h: _load_object(data, h))}
+    hot = {}
+    for dataset, chans in pointers.items():
+        for mid in chans.values():
+            for h in manifests.get(f"{dataset}/{mid}", {}).get("members", {}).values():
+                hot[h] = None
+    return {"channels": pointers, "channels_mtime": channels_path.stat().st_mtime if channels_path.exists() else None,
+            "manifests": manifests, "hot": list(hot)}
+
+def _pad(n: int) -> int:
+    return -n % 4
+
+def write(snap: dict, path: pathlib.Path = SNAPSHOT_PATH) -> None:
+    """Pack a `build()` result into a snapshot file (layout above)."""
+    manifests, sections, offset = {}, [], 0
+    for key, entry in snap["manifests"].items():
+        dataset, manifest_id = key.split("/", 1)
+        section = encode(manifest_id, dataset, "", [{"logical_id": lid, "object": h} for lid, h in entry["members"].items()])
+        manifests[key] = {"mtime": entry["mtime"], "offset": offset, "length": len(section)}
+        sections += [section, b"\0" * _pad(len(section))]
+        offset += len(section) + _pad(len(section))
+    header = json.dumps({"channels": snap["channels"], "channels_mtime": snap["channels_mtime"],
+                         "hot_count": len(snap["hot"]), "manifests": manifests}).encode("utf-8")
+    hot = b"".join(bytes.fromhex(h.split(":", 1)[1]) for h in snap["hot"])
+    write_file(path, b"".join([MAGIC, struct.pack("<II", SNAPSHOT_VERSION, len(header)), header,
+                               b"\0" * _pad(12 + len(header)), hot, *sections]))
+
+class Snapshot:
+    """A snapshot file opened read-only. Only the header is parsed; the hot set and each
+    manifest's membership stay in the mapping until asked for."""
+
+    def __init__(self, path: pathlib.Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:4] != MAGIC:
+            raise ValueError(f"not a snapshot file: {path}")
+        version, hlen = struct.unpack_from("<II", self._mm, 4)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {version}: {path}")
+        header = json.loads(self._mm[12:12 + hlen])
+        self.channels: dict[str, dict[str, str]] = header["channels"]
+        self.channels_mtime: float | None = header["channels_mtime"]
+        self.manifests: dict[str, dict] = header["manifests"]  # "<dataset>/<id>" -> {mtime, offset, length}
+        self.hot_count: int = header["hot_count"]
+        self._hot = 12 + hlen + _pad(12 + hlen)
+        self._sections = self._hot + 32 * self.hot_count
+
+    def hot(self) -> Iterator[str]:
+        for i in range(self.hot_count):
+            yield "sha256:" + self._mm[self._hot + 32 * i:self._hot + 32 * (i + 1)].hex()
+
+    def members(self, key: str) -> dict[str, str]:
+        """logical_id -> object hash for manifest `key` ("<dataset>/<id>"), decoded from its section."""
+        entry = self.manifests[key]
+        start = self._sections + entry["offset"]
+        with memoryview(self._mm) as view:
+            section = view[start:start + entry["length"]]
+            try:
+                return from_buffer(section).members()
+            finally:
+                section.release()
+
+    def close(self) -> None:
+        self._mm.close()
+
+def load(path: pathlib.Path = SNAPSHOT_PATH) -> Snapshot | None:
+    """The snapshot at `path`, or None when there is none or it was written by another version."""
+    try:
+        return Snapshot(path)
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,293 @@
+from __future__ import annotations
+import hashlib, itertools, json, os, pathlib, re, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as _date, datetime, timezone
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import best_match
+from bnx.paths import DATA, ROOT
+
+SCHEMA_DIR = ROOT / "schemas"
+REF_DIRS = {"EntityRecord": ("entity", "entity_id"), "ActivityRecord": ("activity", "activity_id")}
+_SAFE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._:@-]{0,199}$")  # logical ids and dates become path components
+# batch: one fsync pass per commit group (default); always: fsync every file as written; off: no fsync
+FSYNC_MODES = ("batch", "always", "off")
+FSYNC = os.environ.get("BNX_FSYNC", "batch")
+_seq = itertools.count()
+_sync_pool: ThreadPoolExecutor | None = None
+_sync_pool_lock = threading.Lock()
+# directories some WriteBatch created whose parent has not been fsynced yet; a batch writing
+# into one syncs that parent itself rather than trust the creator to commit first
+_uncommitted_dirs: set[pathlib.Path] = set()
+_new_dirs_lock = threading.Lock()
+
+class IngestError(ValueError):
+    """An object that cannot be stored; `code` goes into the API's error body."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code, self.message = code, message
+
+    def body(self) -> dict:
+        return {"error": {"code": self.code, "message": self.message}}
+
+def canonical_json(obj) -> bytes:
+    # Deterministic JSON: UTF-8, sorted keys, no extra spaces. Every stored hash depends on these exact bytes.
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def load_validators(schema_dir: pathlib.Path = SCHEMA_DIR) -> dict[str, Draft202012Validator]:
+    """{kind: validator} for the newest `<Kind>.v<N>.json` of each kind in the schema registry."""
+    newest: dict[str, tuple[int, pathlib.Path]] = {}
+    for path in schema_dir.glob("*.v*.json"):
+        kind, _, version = path.name[:-len(".json")].rpartition(".v")
+        if version.isdigit() and int(version) > newest.get(kind, (0, path))[0]:
+            newest[kind] = (int(version), path)
+    return {kind: Draft202012Validator(json.loads(path.read_text(encoding="utf-8"))) for kind, (_, path) in newest.items()}
+
+def seal(obj: dict) -> tuple[str, bytes]:
+    """(hex digest, stored bytes) for `obj`, hashed as canonical JSON with `envelope.integrity.sha256`
+    set to null and stored with it set to the digest. A hash the client already filled in must match."""
+    integrity = obj["envelope"].setdefault("integrity", {})
+    if not isinstance(integrity, dict):
+        raise IngestError("invalid", "envelope.integrity must be an object")
+    claimed = integrity.get("sha256")
+    integrity["sha256"] = None
+    h = sha256_hex(canonical_json(obj))
+    if claimed is not None and claimed != f"sha256:{h}":
+        raise IngestError("hash_mismatch", f"claimed {claimed} but content hashes to sha256:{h}")
+    integrity["sha256"] = f"sha256:{h}"
+    return h, canonical_json(obj)
+
+def _fsync_path(path: pathlib.Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _pool() -> ThreadPoolExecutor:
+    global _sync_pool
+    with _sync_pool_lock:
+        if _sync_pool is None:
+            _sync_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="bnx-fsync")
+        return _sync_pool
+
+class WriteBatch:
+    """Whole-file writes that become visible together. `add` writes each file to a temp name
+    beside its target; `commit` fsyncs the temp files (in parallel, so the filesystem can fold
+    them into a few journal commits), renames each into place and then fsyncs every touched
+    directory once. A crash can leave stray `.tmp` files but never a truncated file under a real
+    name. Directories made with `mkdir` are durable too: commit also fsyncs the parent holding
+    each new directory's entry. fsync="always" syncs each file and directory one at a time (the
+    naive path, kept to measure against); "off" still renames atomically but leaves flushing to the OS."""
+
+    def __init__(self, fsync: str = FSYNC):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_MODES)}")
+        self.fsync = fsync
+        self.fsyncs = 0
+        self._files: dict[pathlib.Path, pathlib.Path] = {}  # target -> temp file
+        self._new_dirs: list[pathlib.Path] = []  # directories whose entries this commit must sync
+        self._created: list[pathlib.Path] = []
+        self._ensured: set[pathlib.Path] = set()
+
+    def mkdir(self, path: pathlib.Path) -> None:
+        """Create `path` and any missing parents. Directories this batch creates, or that another
+        batch created and has not committed yet, get their parent fsynced by this commit."""
+        if path in self._ensured:
+            return
+        self._ensured.add(path)
+        missing = []
+        with _new_dirs_lock:
+            while not path.is_dir():
+                missing.append(path)
+                path = path.parent
+            while path in _uncommitted_dirs:
+                self._new_dirs.append(path)
+                path = path.parent
+            for d in reversed(missing):
+                d.mkdir(exist_ok=True)
+                _uncommitted_dirs.add(d)
+                self._new_dirs.append(d)
+            self._created.extend(missing)
+
+    def add(self, path: pathlib.Path, data: bytes) -> None:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{next(_seq)}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if self.fsync == "always":
+                f.flush()
+                os.fsync(f.fileno())
+                self.fsyncs += 1
+        old = self._files.pop(path, None)
+        if old is not None:
+            os.unlink(old)
+        self._files[path] = tmp
+
+    def __contains__(self, path: pathlib.Path) -> bool:
+        return path in self._files
+
+    def commit(self) -> None:
+        files, self._files = self._files, {}
+        new_dirs, self._new_dirs = self._new_dirs, []
+        created, self._created, self._ensured = self._created, [], set()
+        if self.fsync == "batch" and files:
+            list(_pool().map(_fsync_path, files.values()))
+            self.fsyncs += len(files)
+        dirs = set()
+        for path, tmp in files.items():
+            os.replace(tmp, path)
+            if self.fsync == "always":
+                _fsync_path(path.parent)
+                self.fsyncs += 1
+            dirs.add(path.parent)
+        parents = {d.parent for d in new_dirs}  # a new directory's own entry lives in its parent
+        if self.fsync == "always":
+            for d in parents - dirs:
+                _fsync_path(d)
+                self.fsyncs += 1
+        else:
+            dirs |= parents
+        if self.fsync == "batch":
+            list(_pool().map(_fsync_path, dirs))
+            self.fsyncs += len(dirs)
+        with _new_dirs_lock:
+            _uncommitted_dirs.difference_update(created)
+
+    def abort(self) -> None:
+        # directories already made stay in _uncommitted_dirs, so the next batch using them syncs them
+        files, self._files = self._files, {}
+        self._new_dirs, self._created, self._ensured = [], [], set()
+        for tmp in files.values():
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> WriteBatch:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+def write_file(path: str | os.PathLike, data: bytes, fsync: str = FSYNC) -> None:
+    """Atomically replace `path` with `data` (temp file, fsync, rename, fsync the directory)."""
+    path = pathlib.Path(path)
+    with WriteBatch(fsync) as batch:
+        batch.mkdir(path.parent)
+        batch.add(path, data)
+
+class Ledger:
+    """Appends events to ledger.ndjson with group commit: writers queue their lines, and whichever
+    one holds the write lock flushes everything queued so far in a single O_APPEND write and (unless
+    fsync is "off") a single fsync, so concurrent writers share one sync."""
+
+    def __init__(self, path: pathlib.Path, fsync: str = FSYNC):
+        self.path, self.fsync = path, fsync
+        self.fsyncs = 0
+        self._pending: list[bytes] = []
+        self._queue_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def append(self, events: list[dict]) -> None:
+        if not events:
+            return
+        lines = "".join(json.dumps(e) + "\n" for e in events).encode("utf-8")
+        with self._queue_lock:
+            self._pending.append(lines)
+        with self._write_lock:
+            with self._queue_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return  # an earlier writer already flushed our lines
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b"".join(batch))
+                if self.fsync != "off":
+                    os.fsync(fd)
+                    self.fsyncs += 1
+            finally:
+                os.close(fd)
+
+class ObjectStore:
+    """Validates, canonicalizes, hashes and stores objects under `root` (objects, refs and
+    ledger laid out as scripts/canonicalize_and_hash.py always has). Objects are content
+    addressed, so storing one that already exists only rewrites its ref.
+
+    Each `put_many` call is one commit group: its objects and refs are committed through one
+    WriteBatch, and only then are their ledger events appended, so the ledger never names an
+    object that a crash could lose."""
+
+    def __init__(self, root: pathlib.Path = DATA, validators: dict[str, Draft202012Validator] | None = None,
+                 fsync: str = FSYNC):
+        self.root, self.fsync = root, fsync
+        self.validators = load_validators() if validators is None else validators
+        self.ledger = Ledger(root / "ledger.ndjson", fsync)
+        self.fsyncs = 0
+
+    def prepare(self, obj, date: str | None = None) -> tuple[str, bytes, pathlib.Path]:
+        """(hex digest, stored bytes, ref path) for a valid object; IngestError otherwise."""
+        if not isinstance(obj, dict) or not isinstance(obj.get("envelope"), dict) or not isinstance(obj.get("body"), dict):
+            raise IngestError("invalid", "object needs an envelope and a body")
+        kind = obj["envelope"].get("kind")
+        validator = self.validators.get(kind)
+        if validator is None:
+            raise IngestError("unknown_kind", f"no schema registered for kind {kind!r}")
+        error = best_match(validator.iter_errors(obj["body"]))
+        if error is not None:
+            where = "/".join(str(p) for p in error.absolute_path)
+            raise IngestError("schema", f"{kind} body{'/' + where if where else ''}: {error.message}")
+        date = date or (obj.get("context") or {}).get("snapshot_as_of") or _date.today().isoformat()
+        subdir, id_field = REF_DIRS.get(kind, ("object", None))
+        logical = obj["body"].get(id_field) if id_field else "object"
+        if not isinstance(logical, str) or not _SAFE.match(logical) or not isinstance(date, str) or not _SAFE.match(date):
+            raise IngestError("invalid", f"unusable logical id or date for a ref: {logical!r}, {date!r}")
+        h, data = seal(obj)
+        return h, data, self.root / "refs" / subdir / logical / f"{date}.json"
+
+    def write(self, batch: WriteBatch, h: str, data: bytes, ref: pathlib.Path) -> bool:
+        """Add one sealed object and its ref to `batch`; True if the object is new."""
+        path = self.root / "objects" / h[:2] / f"{h}.json"
+        created = path not in batch and not path.exists()
+        if created:
+            batch.mkdir(path.parent)
+            batch.add(path, data)
+        batch.mkdir(ref.parent)
+        batch.add(ref, json.dumps({"object": f"sha256:{h}"}, indent=2).encode("utf-8"))
+        return created
+
+    def put_many(self, items: list, date: str | None = None) -> list[dict]:
+        """Store each item (a parsed object, or one JSON document as bytes) and append one ledger
+        group for the batch. One result per item: {hash, ref, created} or an error body."""
+        results, events = [], []
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        with WriteBatch(self.fsync) as batch:
+            for item in items:
+                try:
+                    if isinstance(item, (bytes, str)):
+                        try:
+                            item = json.loads(item)
+                        except ValueError as e:
+                            raise IngestError("bad_json", f"not valid JSON: {e}")
+                    h, data, ref = self.prepare(item, date)
+                    created = self.write(batch, h, data, ref)
+                except IngestError as e:
+                    results.append(e.body())
+                    continue
+                rel = str(ref.relative_to(self.root.parent))
+                results.append({"hash": f"sha256:{h}", "ref": rel, "created": created})
+                events.append({"ts": ts, "event": "object.write", "hash": f"sha256:{h}", "ref": rel})
+        self.fsyncs += batch.fsyncs
+        self.ledger.append(events)
+        return results
+
+    def put(self, obj, date: str | None = None) -> dict:
+        result = self.put_many([obj], date)[0]
+        if "error" in result:
+            raise IngestError(result["error"]["code"], result["error"]["message"])
+        return result
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import atexit, contextvars, json, os, pathlib, secrets, sys, threading, time, urllib.request
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator
+from bnx.paths import DERIVED
+
+TRACE_FILE = DERIVED / "traces" / "spans.ndjson"
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "service", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, service: str, attrs: dict):
+        self.trace_id, self.parent_id = trace_id, parent_id
+        self.span_id = secrets.token_hex(8)
+        self.name, self.service, self.attrs = name, service, attrs
+        self.start_ns, self.end_ns = time.time_ns(), 0
+        self.error: str | None = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def record(self) -> dict:
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                "service": self.service, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3), "attrs": self.attrs, "error": self.error}
+
+class FileExporter:
+    """One JSON line per finished span, appended to `path`; safe to share between processes."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = (json.dumps(span.record()) + "\n").encode("utf-8")
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # one O_APPEND write per span keeps lines whole when several processes share the file
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def flush(self) -> None:
+        pass
+
+class OTLPExporter:
+    """Batches spans and POSTs them as OTLP/JSON to `<endpoint>/v1/traces`, for a local
+    collector (or anything that speaks the same JSON). Export failures drop the batch."""
+
+    def __init__(self, endpoint: str, batch_size: int = 256, timeout: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size, self.timeout = batch_size, timeout
+        self._pending: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._pending.append(span)
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._send(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch: list[Span]) -> None:
+        by_service: dict[str, list[dict]] = {}
+        for s in batch:
+            by_service.setdefault(s.service, []).append({
+                "traceId": s.trace_id, "spanId": s.span_id, "parentSpanId": s.parent_id or "", "name": s.name,
+                "kind": 1, "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1}})
+        body = {"resourceSpans": [{"resource": {"attributes": [{"key": "service.name", "value": {"stringValue": svc}}]},
+                                   "scopeSpans": [{"scope": {"name": "bnx"}, "spans": spans}]}
+                                  for svc, spans in by_service.items()]}
+        req = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            urllib.request.urlopen(req, timeout=self.timeout).close()
+        except OSError:
+            pass
+
+def _otlp_value(v: Any) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+def exporter_from(spec: str | None):
+    """`file` (default path), `file:<path>`, `otlp:<http endpoint>`; empty disables tracing."""
+    if not spec:
+        return None
+    kind, _, arg = spec.partition(":")
+    if kind == "file":
+        return FileExporter(arg or TRACE_FILE)
+    if kind == "otlp":
+        return OTLPExporter(arg or "http://localhost:4318")
+    raise ValueError(f"unknown trace exporter: {spec}")
+
+_exporter = exporter_from(os.environ.get("BNX_TRACE_EXPORT"))
+_service = os.environ.get("BNX_SERVICE_NAME") or pathlib.Path(sys.argv[0] or "bnx").stem
+_current: contextvars.ContextVar[tuple[str, str] | None] = contextvars.ContextVar("bnx_trace", default=None)
+
+def configure(service: str | None = None, export: str | None = None, exporter=None) -> None:
+    """Name this process in its spans and/or replace the exporter chosen from BNX_TRACE_EXPORT."""
+    global _exporter, _service
+    if service:
+        _service = os.environ.get("BNX_SERVICE_NAME") or service
+    if exporter is not None or export is not None:
+        if _exporter is not None:
+            _exporter.flush()
+        _exporter = exporter if exporter is not None else exporter_from(export)
+
+def enabled() -> bool:
+    return _exporter is not None
+
+def flush() -> None:
+    if _exporter is not None:
+        _exporter.flush()
+
+atexit.register(flush)
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """(trace id, parent span id) from a W3C `traceparent` header, or None if malformed."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+def traceparent() -> str | None:
+    """The `traceparent` header value for the current span, if one is active."""
+    cur = _current.get()
+    return f"00-{cur[0]}-{cur[1]}-01" if cur else None
+
+def inject(headers: dict) -> dict:
+    """Add the current trace context to outgoing HTTP `headers` (in place) and return them."""
+    tp = traceparent()
+    if tp:
+        headers["traceparent"] = tp
+    return headers
+
+@contextmanager
+def _span(name: str, parent: tuple[str, str] | None, attrs: dict) -> Iterator[Span]:
+    parent = parent or _current.get() or parse_traceparent(os.environ.get("TRACEPARENT"))
+    s = Span(name, parent[0] if parent else secrets.token_hex(16), parent[1] if parent else None, _service, attrs)
+    token = _current.set((s.trace_id, s.span_id))
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(s)
+
+_NOOP = nullcontext(None)
+
+def span(name: str, parent: str | None = None, **attrs: Any):
+    """Context manager timing `name` as a child of the current span (or of the `traceparent`
+    string `parent`, or of $TRACEPARENT for a process's first span). Yields the Span, or
+    None when tracing is off, in which case it costs one global lookup."""
+    if _exporter is None:
+        return _NOOP
+    return _span(name, parse_traceparent(parent) if parent else None, attrs)
+
+def wrap(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """`fn` bound to the current trace context, for running on another thread."""
+    if _exporter is None or _current.get() is None:
+        return fn
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn)
+
+def read_spans(path: str | os.PathLike = TRACE_FILE) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def render_tree(spans: list[dict]) -> list[str]:
+    """Indented `duration name [service] attrs` lines, one tree per trace, children in start order."""
+    children: dict[str | None, list[dict]] = {}
+    ids = {s["span_id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start_ns"]):
+        children.setdefault(s["parent_id"] if s["parent_id"] in ids else None, []).append(s)
+    lines = []
+    def walk(s: dict, depth: int) -> None:
+        attrs = " ".join(f"{k}={v}" for k, v in s["attrs"].items())
+        err = f" ERROR {s['error']}" if s.get("error") else ""
+        lines.append(f"{s['duration_ms']:>10.3f} ms  {'  ' * depth}{s['name']} [{s['service']}] {attrs}{err}".rstrip())
+        for c in children.get(s["span_id"], ()):
+            walk(c, depth + 1)
+    for root in children.get(None, ()):
+        lines.append(f"trace {root['trace_id']}")
+        walk(root, 1)
+    return lines
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Throughput of the async object endpoint versus the old sync handler at high concurrency.
+
+Starts the API under uvicorn in a subprocess with an extra route, /_bench/sync/objects/{hash},
+that serves objects the way the sync endpoint did (a blocking handler in Starlette's
+threadpool), then drives both routes with the same number of concurrent connections."""
+from __future__ import annotations
+import argparse, asyncio, os, pathlib, random, socket, subprocess, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+if os.environ.get("BNX_BENCH_SERVER"):
+    from fastapi import Depends
+    from api import main as m
+    from api.main import app  # noqa: F401  (served by uvicorn)
+    from api.security import require_bearer
+
+    delay = float(os.environ.get("BNX_BENCH_IO_DELAY_MS", "0")) / 1000
+    if delay:
+        # simulate slower storage (network filesystem, cold disk) on every object read
+        _load = m._load_object
+        def _slow_load(h):
+            time.sleep(delay)
+            return _load(h)
+        m._load_object = _slow_load
+
+    @app.get("/_bench/sync/objects/{hash_id}")
+    def sync_object(hash_id: str, principal=Depends(require_bearer)):
+        view = m.decide_view_by_scopes(None, principal["scopes"])
+        obj = m.read_object_by_hash(hash_id)
+        m.policy.check(principal, obj, view)
+        return m.JSONResponse(obj)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def drive(base: str, path: str, hashes: list[str], token: str, connections: int, total: int) -> tuple[float, int]:
+    import httpx
+    sem = asyncio.Semaphore(connections)
+    errors = 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def one():
+            nonlocal errors
+            async with sem:
+                try:
+                    r = await client.get(path.format(random.choice(hashes)))
+                    errors += r.status_code != 200
+                except httpx.TransportError:
+                    errors += 1
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start, errors
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--connections", type=int, default=1000)
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--io-delay-ms", type=float, default=0, help="added latency per object read")
+    ap.add_argument("--io-threads", type=int, default=None, help="BNX_IO_THREADS for the server")
+    ap.add_argument("--cold", action="store_true", help="disable the parsed-object cache so every read hits storage")
+    args = ap.parse_args()
+
+    from jose import jwt
+    now = int(time.time())
+    token = jwt.encode({"iss": "bnxlink", "aud": "bnx-data", "sub": "bench", "iat": now, "exp": now + 3600,
+                        "scope": "objects:read", "purpose": "analysis"}, "dev-only-not-for-prod", algorithm="HS256")
+    hashes = ["sha256:" + p.stem for p in (ROOT / "data/objects").glob("*/*.json")]
+    port = free_port()
+    env = dict(os.environ, BNX_BENCH_SERVER="1", BNX_BENCH_IO_DELAY_MS=str(args.io_delay_ms), BNX_WARM_START="false")
+    if args.io_threads:
+        env["BNX_IO_THREADS"] = str(args.io_threads)
+    if args.cold:
+        env["BNX_OBJECT_CACHE_SIZE"] = "0"
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "bench_async:app", "--app-dir", str(ROOT / "scripts"),
+                               "--port", str(port), "--log-level", "warning", "--backlog", "4096", "--timeout-keep-alive", "120"], env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        import httpx
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/health")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        for name, path in (("sync (before)", "/_bench/sync/objects/{}"), ("async (after)", "/objects/{}")):
+            asyncio.run(drive(base, path, hashes, token, min(args.connections, 50), 200))  # warm up
+            secs, errors = asyncio.run(drive(base, path, hashes, token, args.connections, args.requests))
+            print(f"{name:14s} {args.requests / secs:8.0f} req/s  ({args.requests} requests, "
+                  f"{args.connections} connections, {errors} errors, {secs:.1f}s)")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""Compare compiled redaction profiles with the hand-written llm_min dict comprehensions."""
+from __future__ import annotations
+import argparse, json, pathlib, sys, timeit
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from bnx.redaction import Profile, get_profile  # noqa: E402
+
+def handwritten_llm_min(obj: dict) -> dict:
+    # the rules as they were inlined in api/main.py and agent/pipes/redactor.py
+    return {
+        "envelope": {k: v for k, v in obj.get("envelope", {}).items() if k not in ("owner",)},
+        "context": obj.get("context", {}),
+        "body": {k: v for k, v in obj.get("body", {}).items() if k != "links"},
+    }
+
+def load_objects() -> list[dict]:
+    return [json.loads(p.read_text(encoding="utf-8")) for p in sorted((ROOT / "data/objects").glob("*/*.json"))]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--number", type=int, default=20000, help="projections per object per run")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    objs = load_objects()
+    profile = get_profile("llm_min")
+    for o in objs:
+        assert profile.project(o) == handwritten_llm_min(o), "profile and hand-written rules disagree"
+    # the same rules without the per-pii masks, i.e. exactly what the hand-written code does
+    plain = Profile("llm_min_plain", {k: v for k, v in profile.spec.items() if k not in ("pii", "kinds")})
+    candidates = {"handwritten": handwritten_llm_min, "compiled": profile.project, "compiled-plain": plain.project}
+    best = dict.fromkeys(candidates, float("inf"))
+    for _ in range(args.repeat):
+        # interleave candidates so machine noise hits both alike
+        for name, fn in candidates.items():
+            best[name] = min(best[name], timeit.timeit(lambda: [fn(o) for o in objs], number=args.number))
+    for name, t in best.items():
+        per = t / (args.number * len(objs)) * 1e6
+        print(f"{name:15s} {per:7.2f} us/object ({len(objs)} objects x {args.number}, best of {args.repeat})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+"""End-to-end benchmark suite over a synthetic dataset, with a regression gate.
+
+Cases: ingest (gen_dataset: canonicalize, hash, store objects, refs, ledger), build_manifest,
+validate_repo, rebuild_duckdb (full rebuild of the v2 manifest), agent_startup (load, validate,
+redact and summarize the v1 manifest; best of --repeat, so fragment caches are warm),
+api.* (p95 latency per endpoint against a local uvicorn), manifest.json / manifest.bnxm (load the
+v1 manifest from JSON and from its compact .bnxm form and list its hashes and members, with file
+size and heap held), store.* (bnx.store ingest time per fsync mode, with fsyncs per object) and crash (objects torn or lost when a writer is killed
+mid-commit; anything above 0 fails). Every value is lower-is-better;
+results go to --out as JSON, and a case slower than the stored baseline for the same scale
+by more than --tolerance fails the run."""
+from __future__ import annotations
+import argparse, asyncio, json, multiprocessing, os, pathlib, platform, random, signal, statistics, subprocess, sys, tempfile, time, tracemalloc
+from datetime import datetime, timezone
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SCRIPTS = ROOT / "scripts"
+sys.path.insert(0, str(SCRIPTS))
+import dev_token, gen_dataset  # noqa: E402
+from loadtest import percentile, serve  # noqa: E402
+sys.path.insert(0, str(ROOT))
+from bnx import manifest as bnx_manifest  # noqa: E402
+from bnx.store import FSYNC_MODES, ObjectStore, canonical_json, sha256_hex  # noqa: E402
+
+BASELINE = SCRIPTS / "bench_baseline.json"
+CASES = ("ingest", "build_manifest", "validate_repo", "rebuild_duckdb", "agent_startup", "api", "manifest", "store", "crash")
+STORE_OBJECTS = 5_000  # objects per store.* run; fsync=always makes larger runs slow on real disks
+STORE_BATCH = 500  # objects per commit group, as POST /objects uses by default
+# endpoint -> (path template, requests per run)
+ENDPOINTS = {"objects": ("/objects/{hash}", 500), "objects_llm_min": ("/objects/{hash}?view=llm_min", 500),
+             "manifest": ("/manifests/{dataset}/v1", 20), "summary": ("/manifests/{dataset}/v1/summary", 20)}
+
+def timed(cmd: list[str], env: dict, repeat: int) -> float:
+    """Best wall time of `repeat` runs of `cmd`; a failing run aborts the suite."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        elapsed = time.perf_counter() - start
+        if proc.returncode:
+            raise SystemExit(f"{' '.join(cmd)} failed ({proc.returncode}):\n{proc.stderr}")
+        best = min(best, elapsed)
+    return best
+
+def bench_token() -> str:
+    return dev_token.mint("objects:read objects:read:restricted manifests:read", sub="bench", ttl=3600)
+
+async def drive(base: str, paths: list[str], concurrency: int) -> tuple[list[float], float, int]:
+    """Closed loop: `concurrency` workers issue `paths` back to back. (latencies, seconds, errors)"""
+    import httpx
+    queue, latencies, errors = list(reversed(paths)), [], 0
+    async with httpx.AsyncClient(base_url=base, timeout=120, headers={"Authorization": f"Bearer {bench_token()}"}) as client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                path = queue.pop()
+                start = time.perf_counter()
+                try:
+                    r = await client.get(path)
+                    errors += r.status_code != 200
+                except httpx.TransportError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - start, errors
+
+def bench_api(env: dict, dataset: str, concurrency: int) -> dict:
+    manifest = json.loads((pathlib.Path(env["BNX_DATA_DIR"]) / "manifests" / dataset / "v1.json").read_text())
+    hashes = [e["object"] for e in manifest["entries"]]
+    rng = random.Random(1)
+    results = {}
+    with serve(env) as base:
+        for name, (template, n) in ENDPOINTS.items():
+            paths = [template.format(hash=rng.choice(hashes), dataset=dataset) for _ in range(n)]
+            asyncio.run(drive(base, paths[:max(1, n // 10)], concurrency))  # warm up
+            latencies, secs, errors = asyncio.run(drive(base, paths, concurrency))
+            results[f"api.{name}"] = {"value": percentile(latencies, 95), "unit": "ms",
+                                      "p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+                                      "mean": statistics.fmean(latencies), "rps": n / secs, "errors": errors}
+            print(f"  {'api.' + name:24s} {results['api.' + name]['value']:10.3f} ms (p95)", file=sys.stderr, flush=True)
+    return results
+
+def bench_manifest(data: pathlib.Path, dataset: str, repeat: int) -> dict:
+    """Load the generated v1 manifest in each format and read its hashes and members (best of `repeat`)."""
+    v1 = data / "manifests" / dataset / "v1.json"
+    paths = {"json": v1, "bnxm": bnx_manifest.convert(v1, keep=True)}
+    results = {}
+    for fmt, path in paths.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            m = json.loads(path.read_bytes()) if fmt == "json" else bnx_manifest.load(path)
+            hashes = [e["object"] for e in m["entries"]] if fmt == "json" else m.hashes()
+            members = {e["logical_id"]: e["object"] for e in m["entries"]} if fmt == "json" else m.members()
+            best = min(best, time.perf_counter() - start)
+            del m, hashes, members
+        tracemalloc.start()
+        m = json.loads(path.read_bytes()) if fmt == "json" else bnx_manifest.load(path)
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del m
+        results[f"manifest.{fmt}"] = {"value": best, "unit": "s", "bytes": path.stat().st_size, "held_bytes": held}
+        print(f"  {'manifest.' + fmt:24s} {best:10.3f} s ({path.stat().st_size} bytes on disk, {held} held)",
+              file=sys.stderr, flush=True)
+    paths["bnxm"].unlink()  # leave the tree as gen_dataset wrote it for later cases
+    return results
+
+def sample_objects(n: int, seed: int = 11) -> list[bytes]:
+    """`n` distinct generated objects as NDJSON lines, in the shape POST /objects receives them."""
+    entities = max(20, n * 3 // 10)
+    return [json.dumps(gen_dataset.make_entity(seed, i, entities) if i < entities
+                       else gen_dataset.make_activity(seed, i, entities)).encode("utf-8") for i in range(n)]
+
+def bench_store(lines: list[bytes], workdir: pathlib.Path) -> dict:
+    """Ingest `lines` into a fresh tree once per fsync mode, in STORE_BATCH commit groups."""
+    results = {}
+    for mode in FSYNC_MODES:
+        store = ObjectStore(workdir / f"store-{mode}", fsync=mode)
+        store.root.mkdir(parents=True)
+        start = time.perf_counter()
+        for i in range(0, len(lines), STORE_BATCH):
+            store.put_many(lines[i:i + STORE_BATCH])
+        secs = time.perf_counter() - start
+        fsyncs = store.fsyncs + store.ledger.fsyncs
+        results[f"store.{mode}"] = {"value": secs, "unit": "s", "items": len(lines), "per_second": len(lines) / secs,
+                                    "fsyncs_per_object": fsyncs / len(lines)}
+        print(f"  {'store.' + mode:24s} {secs:10.3f} s ({len(lines) / secs:.0f} objects/s, "
+              f"{fsyncs / len(lines):.2f} fsyncs/object)", file=sys.stderr, flush=True)
+    return results
+
+def _crash_writer(root: str, seed: int) -> None:
+    # always fresh objects, in small groups, so kills land in every phase of a commit
+    store = ObjectStore(pathlib.Path(root))
+    for chunk in range(1_000_000):
+        lines = sample_objects(500, seed * 1_000_000 + chunk)
+        for i in range(0, len(lines), 50):
+            store.put_many(lines[i:i + 50])
+
+def check_tree(root: pathlib.Path) -> dict:
+    """Objects whose bytes do not hash to their name, and ledger events naming a missing object or ref."""
+    torn = 0
+    for f in root.glob("objects/*/*.json"):
+        try:
+            obj = json.loads(f.read_bytes())
+            obj["envelope"]["integrity"]["sha256"] = None
+            torn += sha256_hex(canonical_json(obj)) != f.stem
+        except (ValueError, KeyError, TypeError):
+            torn += 1
+    lost, events = 0, 0
+    ledger = root / "ledger.ndjson"
+    for line in (ledger.read_text(encoding="utf-8").splitlines() if ledger.exists() else ()):
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            lost += 1  # a torn ledger line
+            continue
+        events += 1
+        h = ev["hash"].split(":", 1)[1]
+        lost += not (root / "objects" / h[:2] / f"{h}.json").exists() or not (root.parent / ev["ref"]).exists()
+    return {"torn": torn, "lost": lost, "events": events}
+
+def bench_crash(workdir: pathlib.Path, rounds: int) -> dict:
+    """Kill a writer at a random point of its commit loop `rounds` times, then check the tree."""
+    root = workdir / "crash"
+    root.mkdir()
+    rng = random.Random(5)
+    ctx = multiprocessing.get_context("fork" if sys.platform != "win32" else "spawn")
+    for seed in range(rounds):
+        proc = ctx.Process(target=_crash_writer, args=(str(root), seed))
+        proc.start()
+        time.sleep(rng.uniform(0.5, 1.5))
+        os.kill(proc.pid, signal.SIGKILL)
+        proc.join()
+    stats = check_tree(root)
+    bad = stats["torn"] + stats["lost"]
+    print(f"  {'crash':24s} {bad:10d} torn or lost ({stats['events']} ledgered writes, {rounds} kills)",
+          file=sys.stderr, flush=True)
+    return {"crash": {"value": bad, "unit": "count", **stats, "kills": rounds}}
+
+def run(args) -> dict:
+    objects = args.objects or gen_dataset.SCALES[args.scale]
+    results: dict[str, dict] = {}
+    tmp = tempfile.TemporaryDirectory(prefix="bnx-bench-") if not args.data else None
+    data = pathlib.Path(args.data) if args.data else pathlib.Path(tmp.name) / "data"
+    env = dict(os.environ, BNX_DATA_DIR=str(data), BNX_RATE_LIMIT_ENABLED="false", BNX_WARM_START="false",
+               PYTHONPATH=str(ROOT))
+    try:
+        if not args.data:
+            stats = gen_dataset.generate(data, objects, args.dataset, workers=args.workers)
+            results["ingest"] = {"value": stats["seconds"], "unit": "s", "items": stats["objects"],
+                                 "per_second": stats["objects"] / stats["seconds"]}
+            print(f"  {'ingest':24s} {stats['seconds']:10.3f} s", file=sys.stderr, flush=True)
+        py = sys.executable
+        commands = {
+            "build_manifest": [py, "scripts/build_manifest.py", "--dataset", args.dataset, "--id", "bench-built"],
+            "validate_repo": [py, "scripts/validate_repo.py"],
+            "rebuild_duckdb": [py, "scripts/rebuild_duckdb.py", "--dataset", args.dataset, "--manifest", "v2", "--full",
+                               "--db", str(data / "derived" / "bench.duckdb")],
+            "agent_startup": [py, "-m", "agent.cli", "--dataset", args.dataset, "--manifest", "v1"],
+        }
+        for name, cmd in commands.items():
+            if name in args.cases:
+                secs = timed(cmd, env, args.repeat)
+                results[name] = {"value": secs, "unit": "s", "items": objects, "per_second": objects / secs}
+                print(f"  {name:24s} {secs:10.3f} s", file=sys.stderr, flush=True)
+        if "api" in args.cases:
+            results.update(bench_api(env, args.dataset, args.concurrency))
+        if "manifest" in args.cases:
+            results.update(bench_manifest(data, args.dataset, args.repeat))
+        if args.cases & {"store", "crash"}:
+            with tempfile.TemporaryDirectory(prefix="bnx-store-") as work:
+                if "store" in args.cases:
+                    results.update(bench_store(sample_objects(min(objects, STORE_OBJECTS)), pathlib.Path(work)))
+                if "crash" in args.cases:
+                    results.update(bench_crash(pathlib.Path(work), args.repeat * 2))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    return {"suite": "bnx-bench", "version": 1, "scale": args.scale if not args.objects else str(objects),
+            "objects": objects, "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "results": results}
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta: dict[str, float]) -> list[str]:
+    """Cases slower than the baseline by more than `tolerance` (and by more than the unit's noise floor)."""
+    regressions = []
+    for name, res in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or base.get("unit") != res["unit"]:
+            continue
+        limit = base["value"] * (1 + tolerance)
+        if res["value"] > limit and res["value"] - base["value"] > min_delta.get(res["unit"], 0):
+            regressions.append(f"{name}: {res['value']:.3f} {res['unit']} vs baseline {base['value']:.3f} "
+                               f"(+{(res['value'] / base['value'] - 1) * 100:.0f}%, tolerance {tolerance * 100:.0f}%)")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scale", choices=sorted(gen_dataset.SCALES), default="10k")
+    ap.add_argument("--objects", type=int, default=None, help="exact object count (overrides --scale; no baseline)")
+    ap.add_argument("--data", default=None, help="existing gen_dataset tree to use instead of generating one (skips ingest)")
+    ap.add_argument("--dataset", default="bench")
+    ap.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {', '.join(CASES)}")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per script case; the best is kept")
+    ap.add_argument("--concurrency", type=int, default=16, help="concurrent API clients")
+    ap.add_argument("--workers", type=int, default=None, help="generator processes")
+    ap.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore smaller absolute slowdowns (noise floor)")
+    ap.add_argument("--update-baseline", action="store_true", help="store these results as the baseline for this scale")
+    args = ap.parse_args()
+    args.cases = {c.strip() for c in args.cases.split(",") if c.strip()}
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        pathlib.Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    baseline_path = pathlib.Path(args.baseline)
+    baselines = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if args.update_baseline:
+        baselines[report["scale"]] = {k: report[k] for k in ("objects", "created_at", "host", "results")}
+        baseline_path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"[OK] baseline for {report['scale']} updated in {baseline_path}", file=sys.stderr)
+        return
+    if report["scale"] not in baselines:
+        print(f"[WARN] no baseline for scale {report['scale']}; nothing to compare", file=sys.stderr)
+        return
+    regressions = compare(report, baselines[report["scale"]], args.tolerance,
+                          {"ms": args.min_delta_ms, "s": args.min_delta_ms / 1000})
+    if regressions:
+        print("[FAIL] regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+    print("[OK] no regressions against baseline", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 from __future__ import annotations
-import argparse, json, pathlib
+import argparse, json, pathlib, sys
 from datetime import datetime
-from common import now_iso, read_json, write_text
+from common import now_iso, read_json, write_file, write_text
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from bnx import tracing  # noqa: E402
+from bnx.manifest import SUFFIX, encode  # noqa: E402
+from bnx.paths import DATA  # noqa: E402
 
 
 def select_latest_date_file(dir_path: pathlib.Path) -> tuple[str, pathlib.Path] | None:
@@ -27,7 +31,7 @@ def collect_entries() -> list[dict]:
         'activity': 'ActivityRecord',
     }
     for ref_kind, kind_title in mapping.items():
-        base = ROOT / 'data' / 'refs' / ref_kind
+        base = DATA / 'refs' / ref_kind
         if not base.exists():
             continue
         for logical_dir in sorted([p for p in base.iterdir() if p.is_dir()]):
@@ -50,9 +54,23 @@ def main():
     ap = argparse.ArgumentParser(description='Build a dataset manifest from refs')
     ap.add_argument('--dataset', required=True)
     ap.add_argument('--id', required=True, dest='manifest_id')
+    ap.add_argument('--format', choices=['v1', 'v2'], default='v1',
+                    help='v1: pretty JSON (default); v2: compact binary .bnxm, replacing the JSON of the same id')
     args = ap.parse_args()
 
-    entries = collect_entries()
+    with tracing.span("manifest.collect_entries") as span:
+        entries = collect_entries()
+        if span is not None:
+            span.set(entries=len(entries))
+
+    base = DATA / 'manifests' / args.dataset / args.manifest_id
+    if args.format == 'v2':
+        out_path = base.with_name(args.manifest_id + SUFFIX)
+        with tracing.span("manifest.write"):
+            write_file(out_path, encode(args.manifest_id, args.dataset, now_iso(), entries))
+        base.with_name(f"{args.manifest_id}.json").unlink(missing_ok=True)  # readers would never see it again
+        print(f"Wrote manifest: {out_path}")
+        return
 
     # Back-compat: include both detailed 'entries' and flat 'objects' lists
     objects = [{ 'hash': e['object'] } for e in entries]
@@ -65,9 +83,13 @@ def main():
         'objects': objects,
     }
 
-    out_path = ROOT / 'data' / 'manifests' / args.dataset / f"{args.manifest_id}.json"
-    write_text(str(out_path), json.dumps(manifest, indent=2))
+    out_path = base.with_name(f"{args.manifest_id}.json")
+    with tracing.span("manifest.write"):
+        write_text(str(out_path), json.dumps(manifest, indent=2))
+    base.with_name(args.manifest_id + SUFFIX).unlink(missing_ok=True)  # or the old v2 file would shadow this one
     print(f"Wrote manifest: {out_path}")
 
 if __name__ == '__main__':
-    main()
+    tracing.configure("build_manifest")
+    with tracing.span("manifest.build"):
+        main()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 from __future__ import annotations
-import argparse, json, pathlib
-from common import canonical_json, sha256_hex, write_text, read_json, now_iso
+import argparse, json, pathlib, sys
+from common import canonical_json, sha256_hex, read_json, now_iso
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from bnx.paths import DATA  # noqa: E402
+from bnx.store import Ledger, WriteBatch  # noqa: E402
 
 def main():
     ap = argparse.ArgumentParser(description="Canonicalize an object, compute sha256, store content-addressed, write ref")
@@ -26,9 +29,7 @@ def main():
     obj["envelope"]["integrity"]["sha256"] = f"sha256:{h}"
     data2 = canonical_json(obj)
     prefix = h[:2]
-    obj_path = ROOT / f"data/objects/{prefix}/{h}.json"
-    obj_path.parent.mkdir(parents=True, exist_ok=True)
-    obj_path.write_bytes(data2)
+    obj_path = DATA / f"objects/{prefix}/{h}.json"
 
     # write a ref (human pointer)
     kind = obj.get("envelope", {}).get("kind", "Object")
@@ -40,29 +41,30 @@ def main():
     body = obj.get("body", {})
     if kind == "EntityRecord":
         logical_id = body.get("entity_id","entity")
-        ref_path = ROOT / f"data/refs/entity/{logical_id}/{date}.json"
+        ref_path = DATA / f"refs/entity/{logical_id}/{date}.json"
     elif kind == "ActivityRecord":
         logical_id = body.get("activity_id","activity")
-        ref_path = ROOT / f"data/refs/activity/{logical_id}/{date}.json"
+        ref_path = DATA / f"refs/activity/{logical_id}/{date}.json"
     else:
         logical_id = "object"
-        ref_path = ROOT / f"data/refs/object/{logical_id}/{date}.json"
+        ref_path = DATA / f"refs/object/{logical_id}/{date}.json"
 
-    write_text(str(ref_path), json.dumps({"object": f"sha256:{h}"}, indent=2))
+    # object and ref land atomically and durably before the ledger mentions them
+    with WriteBatch() as batch:
+        batch.mkdir(obj_path.parent)
+        batch.mkdir(ref_path.parent)
+        batch.add(obj_path, data2)
+        batch.add(ref_path, json.dumps({"object": f"sha256:{h}"}, indent=2).encode("utf-8"))
 
     # ledger append
-    with (ROOT / "data/ledger.ndjson").open("a", encoding="utf-8") as f:
-        f.write(
-            json.dumps(
-                {
-                    "ts": now_iso(),
-                    "event": "object.write",
-                    "hash": f"sha256:{h}",
-                    "ref": str(ref_path.relative_to(ROOT)),
-                }
-            )
-            + "\n"
-        )
+    Ledger(DATA / "ledger.ndjson").append([
+        {
+            "ts": now_iso(),
+            "event": "object.write",
+            "hash": f"sha256:{h}",
+            "ref": str(ref_path.relative_to(DATA.parent)),
+        }
+    ])
 
     print(f"Wrote object: {obj_path}")
     print(f"Wrote ref:    {ref_path}")
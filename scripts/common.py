@@ -1,15 +1,12 @@
 from __future__ import annotations
-import json, hashlib, pathlib, datetime, typing as t
+import json, pathlib, datetime, sys, typing as t
 
-def canonical_json(obj: t.Any) -> bytes:
-    # Deterministic JSON: UTF-8, sorted keys, no extra spaces
-    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
-
-def sha256_hex(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from bnx.store import canonical_json, sha256_hex, write_file  # noqa: E402,F401  (re-exported for the scripts)
 
 def write_text(path: str, content: str) -> None:
-    p = pathlib.Path(path); p.parent.mkdir(parents=True, exist_ok=True); p.write_text(content, encoding="utf-8")
+    # temp file + fsync + rename: a crash leaves the old file or the new one, never half of either
+    write_file(path, content.encode("utf-8"))
 
 def read_json(path: str) -> dict:
     return json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
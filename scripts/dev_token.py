@@ -7,18 +7,22 @@ ALG = os.getenv("BNX_JWT_ALGORITHM","HS256").upper()
 ISS = os.getenv("BNX_JWT_ISSUER","bnxlink")
 AUD = os.getenv("BNX_JWT_AUDIENCE","bnx-data")
 SUB = os.getenv("BNX_DEV_SUBJECT","dev-user")
-SCOPES = os.getenv("BNX_DEV_SCOPES","objects:read objects:read:redacted manifests:read channels:promote")
+SCOPES = os.getenv("BNX_DEV_SCOPES","objects:read objects:read:redacted objects:write manifests:read channels:promote query:run")
 PURPOSE = os.getenv("BNX_DEV_PURPOSE","analysis")
 TTL = int(os.getenv("BNX_DEV_TTL_SECONDS","86400"))
 
-claims = {"iss":ISS,"aud":AUD,"sub":SUB,"iat":int(time.time()),"exp":int(time.time())+TTL,"scope":SCOPES,"purpose":PURPOSE}
-
-if ALG == "RS256":
-    priv = os.getenv("BNX_JWT_PRIVATE_KEY")
-    if not priv: print("Missing BNX_JWT_PRIVATE_KEY for RS256", file=sys.stderr); sys.exit(2)
-    print(jwt.encode(claims, priv, algorithm="RS256"))
-else:
+def mint(scopes: str = SCOPES, sub: str = SUB, purpose: str = PURPOSE, ttl: int = TTL) -> str:
+    """A dev token signed the way the API is configured to verify (BNX_JWT_* environment)."""
+    claims = {"iss":ISS,"aud":AUD,"sub":sub,"iat":int(time.time()),"exp":int(time.time())+ttl,"scope":scopes,"purpose":purpose}
+    if ALG == "RS256":
+        priv = os.getenv("BNX_JWT_PRIVATE_KEY")
+        if not priv: raise ValueError("Missing BNX_JWT_PRIVATE_KEY for RS256")
+        return jwt.encode(claims, priv, algorithm="RS256")
     secret = os.getenv("BNX_JWT_SECRET","dev-only-not-for-prod")
-    print(jwt.encode(claims, secret, algorithm="HS256"))
-
+    return jwt.encode(claims, secret, algorithm="HS256")
 
+if __name__ == "__main__":
+    try:
+        print(mint())
+    except ValueError as e:
+        print(e, file=sys.stderr); sys.exit(2)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+from __future__ import annotations
+import argparse, pathlib, shutil, duckdb
+from rebuild_duckdb import DBDIR, DBPATH
+
+KINDS = {
+    "entity_record": "EntityRecord",
+    "entity_relationship": "EntityRecord",
+    "activity_record": "ActivityRecord",
+}
+
+def export(con, out: pathlib.Path) -> dict[str, int]:
+    """Write each typed table to <out>/<table>/kind=<Kind>/snapshot_date=<date>/*.parquet."""
+    counts = {}
+    for table, kind in KINDS.items():
+        target = out / table
+        if target.exists():
+            shutil.rmtree(target)
+        out.mkdir(parents=True, exist_ok=True)
+        con.execute(f"""
+          COPY (SELECT *, '{kind}' AS kind, snapshot_as_of AS snapshot_date FROM {table})
+          TO '{target}' (FORMAT PARQUET, PARTITION_BY (kind, snapshot_date))
+        """)
+        counts[table] = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    return counts
+
+def main():
+    ap = argparse.ArgumentParser(description="Export the typed DuckDB projection to partitioned Parquet")
+    ap.add_argument("--db", default=str(DBPATH))
+    ap.add_argument("--out", default=str(DBDIR / "parquet"))
+    args = ap.parse_args()
+
+    con = duckdb.connect(args.db, read_only=True)
+    counts = export(con, pathlib.Path(args.out))
+    con.close()
+    for table, n in counts.items():
+        print(f"[OK] {table}: {n} rows -> {pathlib.Path(args.out) / table}")
+
+if __name__ == "__main__":
+    main()
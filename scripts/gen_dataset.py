@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""Generate a synthetic BNX data tree: EntityRecord/ActivityRecord objects, refs, ledger, manifests and channels.
+
+Output is deterministic for a given --seed and --objects. About 30% of objects are entities
+(teams, projects, services, people with pii), 60% activities whose subject_refs point at
+entities, and the rest second, later-dated revisions of existing entities. Manifest `v1`
+holds every first version, `v2` the same with revisions swapped in; `prod` points at v1
+and `staging` at v2. Point the API and scripts at the tree with BNX_DATA_DIR."""
+from __future__ import annotations
+import argparse, json, multiprocessing, os, pathlib, random, shutil, sys, time
+from common import canonical_json, now_iso, sha256_hex
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+CHUNK = 5_000
+DATE_V1, DATE_V2 = "2025-08-10", "2025-09-10"
+# entity type by index % 20
+TYPES = ["team"] + ["project"] * 6 + ["service"] * 10 + ["person"] * 3
+ACTIVITY_TYPES = ["task", "deployment", "review", "incident", "migration"]
+STATUSES = ["planned", "in_progress", "completed", "cancelled", "failed"]
+ENVS = ["dev", "staging", "prod"]
+DOMAINS = ["infrastructure", "payments", "search", "identity", "data", "mobile"]
+
+def layout(n: int) -> tuple[int, int, int]:
+    """(entities, activities, revisions) adding up to n; revisions re-version the first entities."""
+    entities = max(20, n * 3 // 10)
+    revisions = min(entities, n // 10)
+    return entities, max(0, n - entities - revisions), revisions
+
+def entity_id(i: int) -> str:
+    return f"{TYPES[i % 20]}_{i:08d}"
+
+def pick(rng: random.Random, entities: int, kind: str) -> str:
+    """A random entity id of type `kind`."""
+    offsets = [o for o, t in enumerate(TYPES) if t == kind]
+    while True:
+        i = rng.randrange(max(1, entities // 20)) * 20 + rng.choice(offsets)
+        if i < entities:
+            return entity_id(i)
+
+def envelope(kind: str, date: str, pii: list[str], classification: str) -> dict:
+    return {"type": "bnx.object", "version": "1.0", "kind": kind, "owner": {"id": "gen"},
+            "created_at": f"{date}T00:00:00Z",
+            "privacy": {"classification": classification, "pii": pii, "policy_tags": ["generic"]},
+            "capabilities": ["read", "summarize", "link", "validate"],
+            "provenance": {"sources": [{"kind": "synthetic", "ref": "gen_dataset"}]},
+            "integrity": {"sha256": None}}
+
+def make_entity(seed: int, i: int, entities: int, revision: int = 1) -> dict:
+    rng = random.Random(seed * 1_000_003 + i)
+    etype = TYPES[i % 20]
+    date = DATE_V1 if revision == 1 else DATE_V2
+    labels = {"env": rng.choice(ENVS), "domain": rng.choice(DOMAINS)}
+    attributes = {"summary": f"{etype} {i}", "revision": revision}
+    rels, pii, links = [], [], {}
+    if etype == "team":
+        attributes["size"] = rng.randrange(3, 40)
+        links["wiki"] = f"https://wiki.example.com/teams/{i}"
+    elif etype == "project":
+        rels.append({"rel": "owned_by", "target_id": pick(rng, entities, "team")})
+        links["repo"] = f"https://example.com/repo/{i}"
+    elif etype == "service":
+        rels.append({"rel": "part_of", "target_id": pick(rng, entities, "project")})
+        rels += [{"rel": "depends_on", "target_id": pick(rng, entities, "service")} for _ in range(rng.randrange(3))]
+    else:
+        attributes.update({"name": f"Person {i}", "email": f"person{i}@example.com"})
+        rels.append({"rel": "member_of", "target_id": pick(rng, entities, "team")})
+        pii = ["email", "person_name"]
+    if revision > 1:
+        labels["env"] = "prod"
+    classification = "restricted" if rng.random() < 0.02 else "internal"
+    body = {"entity_id": entity_id(i), "entity_type": etype, "attributes": attributes, "labels": labels,
+            "relationships": rels, "links": links}
+    return {"envelope": envelope("EntityRecord", date, pii, classification),
+            "context": {"snapshot_as_of": date, "facts": []}, "body": body}
+
+def make_activity(seed: int, j: int, entities: int) -> dict:
+    rng = random.Random(seed * 1_000_003 + 7_000_000_000 + j)
+    atype = rng.choice(ACTIVITY_TYPES)
+    subjects = list(dict.fromkeys(entity_id(rng.randrange(entities)) for _ in range(rng.randrange(1, 4))))
+    body = {"activity_id": f"{atype}_{j:08d}", "activity_type": atype, "status": rng.choice(STATUSES),
+            "subject_refs": subjects, "payload": {"priority": rng.choice(["low", "medium", "high"])},
+            "scheduling": {"due_date": f"2025-{rng.randrange(8, 13):02d}-{rng.randrange(1, 29):02d}T10:00:00Z"},
+            "audit": []}
+    return {"envelope": envelope("ActivityRecord", DATE_V1, [], "internal"),
+            "context": {"snapshot_as_of": DATE_V1, "facts": []}, "body": body}
+
+def store(out: pathlib.Path, obj: dict) -> str:
+    """Canonicalize, hash and write `obj` and its ref exactly as canonicalize_and_hash.py does."""
+    h = sha256_hex(canonical_json(obj))
+    obj["envelope"]["integrity"]["sha256"] = f"sha256:{h}"
+    path = out / "objects" / h[:2] / f"{h}.json"
+    path.write_bytes(canonical_json(obj))
+    body, date = obj["body"], obj["context"]["snapshot_as_of"]
+    ref = out / "refs" / ("entity" if "entity_id" in body else "activity") / (body.get("entity_id") or body["activity_id"])
+    ref.mkdir(parents=True, exist_ok=True)
+    (ref / f"{date}.json").write_text(json.dumps({"object": f"sha256:{h}"}, indent=2), encoding="utf-8")
+    return f"sha256:{h}"
+
+def entry(obj: dict) -> dict:
+    body = obj["body"]
+    return {"kind": obj["envelope"]["kind"], "logical_id": body.get("entity_id") or body["activity_id"],
+            "date": obj["context"]["snapshot_as_of"], "object": obj["envelope"]["integrity"]["sha256"]}
+
+def run_chunk(task: tuple) -> tuple[list[dict], list[dict], str]:
+    """One chunk of entities (with their revisions) or activities: (v1 entries, v2 entries, ledger lines)."""
+    out, seed, kind, start, end, entities, revisions = task
+    out = pathlib.Path(out)
+    v1, v2, written = [], [], []
+    for i in range(start, end):
+        obj = make_entity(seed, i, entities) if kind == "entity" else make_activity(seed, i, entities)
+        written.append(store(out, obj))
+        v1.append(entry(obj))
+        if kind == "entity" and i < revisions:
+            obj = make_entity(seed, i, entities, revision=2)
+            written.append(store(out, obj))
+        v2.append(entry(obj))
+    ts = now_iso()
+    return v1, v2, "".join(json.dumps({"ts": ts, "event": "object.write", "hash": h}) + "\n" for h in written)
+
+class ManifestWriter:
+    """Streams a manifest's `entries` and `objects` lists so 10M-object manifests never sit in memory."""
+
+    def __init__(self, path: pathlib.Path, dataset: str, manifest_id: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path, self.first = path, True
+        self.f = path.open("w", encoding="utf-8")
+        self.objects = path.with_suffix(".objects.tmp").open("w+", encoding="utf-8")
+        head = json.dumps({"manifest_id": manifest_id, "dataset": dataset, "created_at": now_iso()})
+        self.f.write(head[:-1] + ', "entries": [')
+
+    def add(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        sep = "" if self.first else ", "
+        self.f.write(sep + ", ".join(json.dumps(e) for e in entries))
+        self.objects.write(sep + ", ".join(json.dumps({"hash": e["object"]}) for e in entries))
+        self.first = False
+
+    def close(self) -> None:
+        self.f.write('], "objects": [')
+        self.objects.seek(0)
+        shutil.copyfileobj(self.objects, self.f)
+        self.f.write("]}\n")
+        self.f.close()
+        self.objects.close()
+        os.unlink(self.objects.name)
+
+def generate(out: pathlib.Path, objects: int, dataset: str = "bench", seed: int = 7, workers: int | None = None) -> dict:
+    entities, activities, revisions = layout(objects)
+    for d in range(256):
+        (out / "objects" / f"{d:02x}").mkdir(parents=True, exist_ok=True)
+    tasks = [(str(out), seed, "entity", s, min(s + CHUNK, entities), entities, revisions) for s in range(0, entities, CHUNK)]
+    tasks += [(str(out), seed, "activity", s, min(s + CHUNK, activities), entities, revisions) for s in range(0, activities, CHUNK)]
+    manifests = {mid: ManifestWriter(out / "manifests" / dataset / f"{mid}.json", dataset, mid) for mid in ("v1", "v2")}
+    start = time.perf_counter()
+    with (out / "ledger.ndjson").open("a", encoding="utf-8") as ledger, \
+         multiprocessing.get_context("fork" if sys.platform != "win32" else "spawn").Pool(workers) as pool:
+        for v1, v2, lines in pool.imap(run_chunk, tasks):
+            manifests["v1"].add(v1)
+            manifests["v2"].add(v2)
+            ledger.write(lines)
+    for w in manifests.values():
+        w.close()
+    channels = out / "channels.yaml"
+    channels.write_text(f"{dataset}:\n  prod: v1\n  staging: v2\n", encoding="utf-8")
+    return {"objects": entities + activities + revisions, "entities": entities, "activities": activities,
+            "revisions": revisions, "seconds": time.perf_counter() - start}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--out", required=True, help="data directory to create (use as BNX_DATA_DIR)")
+    ap.add_argument("--scale", choices=sorted(SCALES), default="10k")
+    ap.add_argument("--objects", type=int, default=None, help="exact object count (overrides --scale)")
+    ap.add_argument("--dataset", default="bench")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--workers", type=int, default=None, help="generator processes (default: CPU count)")
+    args = ap.parse_args()
+
+    out = pathlib.Path(args.out)
+    if out.exists() and any(out.iterdir()):
+        raise SystemExit(f"{out} is not empty")
+    stats = generate(out, args.objects or SCALES[args.scale], args.dataset, args.seed, args.workers)
+    print(f"[OK] {stats['objects']} objects ({stats['entities']} entities, {stats['activities']} activities, "
+          f"{stats['revisions']} revisions) in {out} in {stats['seconds']:.1f}s "
+          f"({stats['objects'] / stats['seconds']:.0f} objects/s)")
+
+if __name__ == "__main__":
+    main()
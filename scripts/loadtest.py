@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+"""Open-loop HTTP load test: replay a request log or ledger, or drive a synthetic object/manifest/promote mix.
+
+Arrivals are scheduled up front (Poisson or evenly spaced at --rate for --duration seconds,
+or the recorded timestamps of a --replay file scaled by --speed) and each request is sent
+when due whether or not earlier ones have finished. Latency is measured from the scheduled
+time, so a saturated server shows up as growing latency rather than as a quietly lower
+request rate. Replay reads the API's request log (`api.request` events, see
+BNX_REQUEST_LOG_PATH) and ledger.ndjson (`channel.promote` becomes a promote call,
+`object.write` a read of that object). Without --url a uvicorn is launched on --data, or on
+a freshly generated tree, with rate limits off; tokens are minted like scripts/dev_token.py."""
+from __future__ import annotations
+import argparse, asyncio, json, os, pathlib, random, re, socket, subprocess, sys, tempfile, time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Iterator
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import dev_token  # noqa: E402
+
+SCOPES = "objects:read objects:read:restricted manifests:read channels:promote query:run"
+MIX_KINDS = ("objects", "objects_llm_min", "manifests", "summary", "neighbors", "promote")
+DEFAULT_MIX = "objects=70,objects_llm_min=10,manifests=10,summary=5,promote=5"
+# path pattern -> endpoint template used to group results
+ROUTES = [(re.compile(p), t) for p, t in (
+    (r"^/objects/[^/]+$", "/objects/{hash}"),
+    (r"^/manifests/[^/]+/[^/]+/summary$", "/manifests/{dataset}/{manifest}/summary"),
+    (r"^/manifests/[^/]+/[^/]+$", "/manifests/{dataset}/{manifest}"),
+    (r"^/graph/[^/]+/[^/]+/neighbors$", "/graph/{dataset}/{manifest}/neighbors"),
+    (r"^/channels/[^/]+/[^/]+:promote$", "/channels/{dataset}/{channel}:promote"),
+)]
+
+def endpoint(method: str, url: str) -> str:
+    """`METHOD /template` for a request URL; an object `view` stays in the label since views cost differently."""
+    path, _, query = url.partition("?")
+    template = next((t for p, t in ROUTES if p.match(path)), path)
+    view = re.search(r"(?:^|&)view=([^&]+)", query) if template == "/objects/{hash}" else None
+    return f"{method} {template}" + (f"?view={view.group(1)}" if view else "")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+@contextmanager
+def serve(env: dict, workers: int = 1) -> Iterator[str]:
+    """A uvicorn running api.main:app with `env`, as its base URL, stopped on exit."""
+    import httpx
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--workers", str(workers),
+                               "--log-level", "warning"], cwd=ROOT, env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            if server.poll() is not None:
+                raise SystemExit(f"uvicorn exited with {server.returncode}")
+            try:
+                httpx.get(f"{base}/health")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        yield base
+    finally:
+        server.terminate()
+        server.wait()
+
+def arrivals(rate: float, duration: float, kind: str, rng: random.Random) -> list[float]:
+    """Send offsets (seconds) for `duration` seconds at `rate` requests/s: `poisson` or `uniform` spacing."""
+    times, t = [], 0.0
+    while True:
+        t = t + rng.expovariate(rate) if kind == "poisson" else len(times) / rate
+        if t >= duration:
+            return times
+        times.append(t)
+
+def _ts(value: str | None) -> float | None:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+def read_replay(path: str | os.PathLike, limit: int | None = None) -> list[dict]:
+    """Requests ({ts, method, url, body}) recorded in a request log or ledger; other events are skipped."""
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            ev = json.loads(line)
+            kind, req = ev.get("event", ""), None
+            if kind.startswith("api.") and ev.get("path"):
+                url = ev["path"] + (f"?{ev['query']}" if ev.get("query") else "")
+                req = {"method": ev.get("method", "GET"), "url": url, "body": ev.get("body")}
+            elif kind == "channel.promote":
+                req = {"method": "POST", "url": f"/channels/{ev['dataset']}/{ev['channel']}:promote",
+                       "body": {"manifest": ev["manifest"]}}
+            elif kind == "object.write":
+                req = {"method": "GET", "url": f"/objects/{ev['hash']}", "body": None}
+            if req is None or req["url"] in ("/health", "/metrics"):
+                continue
+            req["ts"] = _ts(ev.get("ts"))
+            out.append(req)
+            if limit and len(out) >= limit:
+                break
+    return out
+
+def schedule_replay(records: list[dict], speed: float, rate: float, kind: str, rng: random.Random) -> list[dict]:
+    """Attach send offsets: recorded spacing divided by `speed`, or fresh arrivals at `rate` when
+    `speed` is 0 or the records carry no timestamps."""
+    if speed > 0 and records and all(r["ts"] is not None for r in records):
+        t0 = min(r["ts"] for r in records)
+        return sorted(({**r, "at": (r["ts"] - t0) / speed} for r in records), key=lambda r: r["at"])
+    times, t = [], 0.0
+    for _ in records:
+        times.append(t)
+        t += rng.expovariate(rate) if kind == "poisson" else 1 / rate
+    return [{**r, "at": at} for r, at in zip(records, times)]
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in MIX_KINDS:
+            raise ValueError(f"unknown mix entry {name!r}; expected one of {', '.join(MIX_KINDS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("empty mix")
+    return mix
+
+def synthetic(times: list[float], mix: dict[str, float], dataset: str, manifests: list[str], entries: list[dict],
+              channel: str, rng: random.Random) -> list[dict]:
+    """One request per send offset, drawn from `mix` over the objects in `entries`."""
+    kinds, weights = list(mix), list(mix.values())
+    out = []
+    for at in times:
+        kind, entry, manifest = rng.choices(kinds, weights)[0], rng.choice(entries), rng.choice(manifests)
+        h = entry["object"]
+        url, method, body = {
+            "objects": f"/objects/{h}",
+            "objects_llm_min": f"/objects/{h}?view=llm_min",
+            "manifests": f"/manifests/{dataset}/{manifest}",
+            "summary": f"/manifests/{dataset}/{manifest}/summary",
+            "neighbors": f"/graph/{dataset}/{manifest}/neighbors?id={entry.get('logical_id', '')}",
+        }.get(kind, f"/channels/{dataset}/{channel}:promote"), "GET", None
+        if kind == "promote":
+            method, body = "POST", {"manifest": manifest}
+        out.append({"at": at, "method": method, "url": url, "body": body})
+    return out
+
+async def fire(base: str, requests: list[dict], token: str, connections: int, timeout: float) -> dict:
+    """Send every request at its offset. (endpoint, status, latency ms) results; status 0 is a transport error."""
+    import httpx
+    results: list[tuple[str, int, float]] = []
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base, timeout=timeout, limits=limits,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        loop = asyncio.get_running_loop()
+        async def one(req: dict, due: float) -> None:
+            try:
+                r = await client.request(req["method"], req["url"], json=req["body"])
+                await r.aread()
+                status = r.status_code
+            except httpx.TransportError:
+                status = 0
+            results.append((endpoint(req["method"], req["url"]), status, (loop.time() - due) * 1000))
+        start, lag, tasks = loop.time() + 0.05, 0.0, []
+        for req in requests:
+            due = start + req["at"]
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag = max(lag, loop.time() - due)
+            tasks.append(asyncio.create_task(one(req, due)))
+        await asyncio.gather(*tasks)
+        return {"results": results, "seconds": loop.time() - start, "max_send_lag_ms": lag * 1000}
+
+def summarize(run: dict) -> dict:
+    """Per-endpoint and overall count, errors, error rate, p50/p95/p99/max latency and throughput."""
+    groups: dict[str, list[tuple[int, float]]] = {}
+    for name, status, ms in run["results"]:
+        groups.setdefault(name, []).append((status, ms))
+    groups["all"] = [(s, ms) for _, s, ms in run["results"]]
+    secs = run["seconds"] or 1e-9
+    report = {}
+    for name, rows in groups.items():
+        if not rows:
+            continue
+        latencies = [ms for _, ms in rows]
+        statuses: dict[str, int] = {}
+        for s, _ in rows:
+            statuses[str(s)] = statuses.get(str(s), 0) + 1
+        errors = sum(1 for s, _ in rows if s == 0 or s >= 400)
+        report[name] = {"requests": len(rows), "errors": errors, "error_rate": errors / len(rows),
+                        "throughput_rps": len(rows) / secs, "p50_ms": percentile(latencies, 50),
+                        "p95_ms": percentile(latencies, 95), "p99_ms": percentile(latencies, 99),
+                        "max_ms": max(latencies), "statuses": statuses}
+    return report
+
+def table(report: dict) -> str:
+    lines = [f"{'endpoint':48s} {'reqs':>7s} {'rps':>8s} {'err%':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}"]
+    for name in sorted(report, key=lambda n: (n == "all", n)):
+        r = report[name]
+        lines.append(f"{name:48s} {r['requests']:7d} {r['throughput_rps']:8.1f} {r['error_rate'] * 100:6.2f} "
+                     f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}")
+    return "\n".join(lines)
+
+def fetch_entries(base: str, token: str, dataset: str, manifest: str) -> list[dict]:
+    import httpx
+    r = httpx.get(f"{base}/manifests/{dataset}/{manifest}", headers={"Authorization": f"Bearer {token}"}, timeout=120)
+    if r.status_code != 200:
+        raise SystemExit(f"cannot load manifest {dataset}/{manifest} for the synthetic mix: {r.status_code} {r.text[:200]}")
+    return r.json()["entries"]
+
+def build_requests(args, base: str, token: str, rng: random.Random) -> list[dict]:
+    if args.replay:
+        return schedule_replay(read_replay(args.replay, args.limit), args.speed, args.rate, args.arrivals, rng)
+    manifests = [m for m in args.manifests.split(",") if m]
+    entries = fetch_entries(base, token, args.dataset, manifests[0])
+    times = arrivals(args.rate, args.duration, args.arrivals, rng)
+    return synthetic(times, parse_mix(args.mix), args.dataset, manifests, entries, args.promote_channel, rng)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default=None, help="target this server instead of launching one")
+    ap.add_argument("--data", default=None, help="data tree for the launched server (default: generate --objects objects)")
+    ap.add_argument("--objects", type=int, default=10_000, help="size of the generated tree")
+    ap.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    ap.add_argument("--replay", default=None, help="request log or ledger NDJSON to replay")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay time compression (2 = twice as fast; 0 = ignore timestamps, use --rate)")
+    ap.add_argument("--limit", type=int, default=None, help="replay at most this many requests")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"synthetic weights over {', '.join(MIX_KINDS)}")
+    ap.add_argument("--dataset", default="bench")
+    ap.add_argument("--manifests", default="v1,v2", help="manifests read and promoted by the mix; the first supplies object hashes")
+    ap.add_argument("--promote-channel", default="loadtest", help="channel the mix promotes to (keep it off prod)")
+    ap.add_argument("--rate", type=float, default=50.0, help="arrival rate, requests/s")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds of synthetic load")
+    ap.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    ap.add_argument("--connections", type=int, default=512, help="client connection pool size")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="also write the JSON report here")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    try:
+        token = dev_token.mint(SCOPES, sub="loadtest")
+    except ValueError as e:
+        raise SystemExit(str(e))
+    tmp = None
+    try:
+        if args.url:
+            target = nullcontext(args.url.rstrip("/"))
+        else:
+            data = pathlib.Path(args.data) if args.data else None
+            if data is None:
+                import gen_dataset
+                tmp = tempfile.TemporaryDirectory(prefix="bnx-loadtest-")
+                data = pathlib.Path(tmp.name) / "data"
+                gen_dataset.generate(data, args.objects, args.dataset)
+            env = dict(os.environ, BNX_DATA_DIR=str(data), BNX_RATE_LIMIT_ENABLED="false", PYTHONPATH=str(ROOT))
+            target = serve(env, args.server_workers)
+        with target as base:
+            requests = build_requests(args, base, token, rng)
+            if not requests:
+                raise SystemExit("nothing to send")
+            print(f"sending {len(requests)} requests over {requests[-1]['at']:.1f}s to {base}", file=sys.stderr, flush=True)
+            run = asyncio.run(fire(base, requests, token, args.connections, args.timeout))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    report = {"requests": len(requests), "seconds": run["seconds"], "max_send_lag_ms": run["max_send_lag_ms"],
+              "endpoints": summarize(run)}
+    print(table(report["endpoints"]))
+    if run["max_send_lag_ms"] > 100:
+        print(f"[WARN] the load generator fell {run['max_send_lag_ms']:.0f} ms behind schedule; "
+              f"latencies include client-side delay", file=sys.stderr)
+    if args.out:
+        pathlib.Path(args.out).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
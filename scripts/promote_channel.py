@@ -1,31 +1,33 @@
 #!/usr/bin/env python
 from __future__ import annotations
-import argparse, json, pathlib, yaml
-from common import now_iso
+import argparse, pathlib, sys, yaml
+from common import now_iso, write_text
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from bnx.manifest import manifest_file  # noqa: E402
+from bnx.paths import DATA  # noqa: E402
+from bnx.store import Ledger  # noqa: E402
 
 def main():
     ap = argparse.ArgumentParser(description="Promote a manifest to a channel")
     ap.add_argument("--dataset", required=True)
     ap.add_argument("--channel", required=True, choices=["prod","staging"])
-    ap.add_argument("--manifest", required=True, help="manifest id (file name without .json)")
+    ap.add_argument("--manifest", required=True, help="manifest id (file name without .bnxm/.json)")
     args = ap.parse_args()
 
-    manifest_path = ROOT / f"data/manifests/{args.dataset}/{args.manifest}.json"
-    if not manifest_path.exists():
-        raise SystemExit(f"Manifest not found: {manifest_path}")
+    if manifest_file(args.dataset, args.manifest) is None:
+        raise SystemExit(f"Manifest not found: {DATA / 'manifests' / args.dataset / args.manifest}")
 
-    channels_yml = ROOT / "data/channels.yaml"
+    channels_yml = DATA / "channels.yaml"
     data = {}
     if channels_yml.exists():
         data = yaml.safe_load(channels_yml.read_text(encoding="utf-8")) or {}
     data.setdefault(args.dataset, {})
     data[args.dataset][args.channel] = args.manifest
-    channels_yml.write_text(yaml.safe_dump(data, sort_keys=True), encoding="utf-8")
+    write_text(str(channels_yml), yaml.safe_dump(data, sort_keys=True))
 
-    with (ROOT / "data/ledger.ndjson").open("a", encoding="utf-8") as f:
-        f.write(json.dumps({"ts": now_iso(), "event":"channel.promote", "dataset": args.dataset, "channel": args.channel, "manifest": args.manifest}) + "\n")
+    Ledger(DATA / "ledger.ndjson").append([{"ts": now_iso(), "event":"channel.promote", "dataset": args.dataset, "channel": args.channel, "manifest": args.manifest}])
 
     print(f"Promoted {args.dataset}@{args.channel} -> {args.manifest}")
 
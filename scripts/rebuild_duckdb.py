@@ -1,40 +1,63 @@
 #!/usr/bin/env python
 from __future__ import annotations
-import argparse, json, pathlib, duckdb, yaml
+import argparse, json, os, pathlib, re, sys, tempfile, duckdb, yaml
+from common import now_iso
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
-DATA = ROOT / "data"
+sys.path.insert(0, str(ROOT))
+from bnx import tracing  # noqa: E402
+from bnx.graph import Graph, graph_path  # noqa: E402
+from bnx.manifest import Manifest, load as read_manifest, manifest_file  # noqa: E402
+from bnx.paths import DATA  # noqa: E402
+
 DBDIR = ROOT / "db"
 DBPATH = DBDIR / "bnxlink.duckdb"
 
-def load_manifest(dataset: str, manifest_id: str | None) -> dict:
+# bump when the projected tables change shape; a mismatch forces a full rebuild
+SCHEMA_VERSION = "3"
+# objects handed to DuckDB per read_text() call
+BATCH_SIZE = 50_000
+
+def channel_manifest_id(channels: dict, dataset: str, channel: str = "prod") -> str | None:
+    cur = channels.get(dataset, {}).get(channel)
+    if isinstance(cur, dict):  # normalized format written by the API
+        cur = (cur.get("current") or {}).get("id")
+    return cur
+
+def load_channels() -> dict:
+    path = DATA / "channels.yaml"
+    return (yaml.safe_load(path.read_text(encoding="utf-8")) or {}) if path.exists() else {}
+
+def channel_pointers(channels: dict, dataset: str) -> dict[str, str]:
+    pointers = {ch: channel_manifest_id(channels, dataset, ch) for ch in channels.get(dataset, {})}
+    return {ch: mid for ch, mid in pointers.items() if mid}
+
+def load_manifest(dataset: str, manifest_id: str | None) -> Manifest:
     if manifest_id is None:
-        ch = yaml.safe_load((DATA/"channels.yaml").read_text(encoding="utf-8")) or {}
-        manifest_id = ch.get(dataset, {}).get("prod")
+        manifest_id = channel_manifest_id(load_channels(), dataset)
         if not manifest_id:
             raise SystemExit(f"No prod channel set for dataset '{dataset}'.")
-    mpath = DATA / f"manifests/{dataset}/{manifest_id}.json"
-    if not mpath.exists():
-        raise SystemExit(f"Manifest not found: {mpath}")
-    return json.loads(mpath.read_text(encoding="utf-8"))
+    mpath = manifest_file(dataset, manifest_id)
+    if mpath is None:
+        raise SystemExit(f"Manifest not found: {DATA / 'manifests' / dataset / manifest_id}")
+    return read_manifest(mpath)
 
 def object_path_for_hash(h: str) -> pathlib.Path:
     assert h.startswith("sha256:")
     hexh = h.split(":",1)[1]
     return DATA / f"objects/{hexh[:2]}/{hexh}.json"
 
-def main():
-    ap = argparse.ArgumentParser(description="Rebuild DuckDB projection from manifest")
-    ap.add_argument("--dataset", default="core")
-    ap.add_argument("--manifest", default=None, help="manifest id; default: channels.yaml prod")
-    args = ap.parse_args()
-
-    manifest = load_manifest(args.dataset, args.manifest)
-    DBDIR.mkdir(parents=True, exist_ok=True)
-    con = duckdb.connect(str(DBPATH))
-    con.execute("PRAGMA threads=4")
+def manifest_hashes(manifest: dict | Manifest) -> list[str]:
+    # support manifests with either 'objects' or 'entries'
+    if isinstance(manifest, Manifest):
+        return manifest.hashes()
+    if "objects" in manifest:
+        return [(it["hash"]) for it in manifest["objects"]]
+    if "entries" in manifest:
+        return [(it["object"]) for it in manifest["entries"]]
+    raise SystemExit("Manifest missing 'objects' or 'entries' array")
 
-    # fresh schema
+def create_schema(con) -> None:
     con.execute("""
       DROP TABLE IF EXISTS object_store;
       CREATE TABLE object_store(
@@ -44,60 +67,348 @@ def main():
         created_at TIMESTAMP,
         doc JSON
       );
+      DROP TABLE IF EXISTS projection_meta;
+      CREATE TABLE projection_meta(key TEXT PRIMARY KEY, value TEXT);
+      DROP TABLE IF EXISTS manifest_member;
+      CREATE TABLE manifest_member(
+        dataset TEXT,
+        manifest_id TEXT,
+        hash TEXT,
+        kind TEXT,
+        logical_id TEXT,
+        date DATE,
+        PRIMARY KEY (dataset, manifest_id, hash)
+      );
+      DROP TABLE IF EXISTS channel_pointer;
+      CREATE TABLE channel_pointer(
+        dataset TEXT,
+        channel TEXT,
+        manifest_id TEXT,
+        PRIMARY KEY (dataset, channel)
+      );
+      DROP TABLE IF EXISTS entity_record;
+      CREATE TABLE entity_record(
+        hash TEXT PRIMARY KEY,
+        entity_id TEXT,
+        entity_type TEXT,
+        classification TEXT,
+        created_at TIMESTAMP,
+        snapshot_as_of DATE,
+        labels MAP(VARCHAR, VARCHAR),
+        attributes JSON
+      );
+      DROP TABLE IF EXISTS entity_relationship;
+      CREATE TABLE entity_relationship(
+        hash TEXT,
+        entity_id TEXT,
+        rel TEXT,
+        target_id TEXT,
+        snapshot_as_of DATE
+      );
+      DROP TABLE IF EXISTS activity_record;
+      CREATE TABLE activity_record(
+        hash TEXT PRIMARY KEY,
+        activity_id TEXT,
+        activity_type TEXT,
+        status TEXT,
+        classification TEXT,
+        created_at TIMESTAMP,
+        snapshot_as_of DATE,
+        due_date TIMESTAMP,
+        start_date TIMESTAMP,
+        subject_refs VARCHAR[],
+        payload JSON
+      );
     """)
 
-    # load objects (support manifests with either 'objects' or 'entries')
-    rows = []
-    items = []
-    if "objects" in manifest:
-        items = [(it["hash"]) for it in manifest["objects"]]
-    elif "entries" in manifest:
-        items = [(it["object"]) for it in manifest["entries"]]
-    else:
-        raise SystemExit("Manifest missing 'objects' or 'entries' array")
-    for h in items:
-        p = object_path_for_hash(h)
-        doc = json.loads(p.read_text(encoding="utf-8"))
-        rows.append((
-            h,
-            doc.get("envelope",{}).get("kind"),
-            doc.get("envelope",{}).get("privacy",{}).get("classification","internal"),
-            doc.get("envelope",{}).get("created_at"),
-            json.dumps(doc)
-        ))
-    con.executemany("INSERT INTO object_store VALUES (?,?,?,?,?)", rows)
-
-    # views
-    con.execute("DROP VIEW IF EXISTS v_entity_record")
+# typed per-kind tables, parsed once at sync time instead of on every query
+TYPED_TABLES = ("entity_record", "entity_relationship", "activity_record")
+
+def sql_list(values: list[str]) -> str:
+    # inlined rather than bound: DuckDB binds large list parameters element by element
+    return "[" + ",".join("'" + v.replace("'", "''") + "'" for v in values) + "]"
+
+def materialize(con) -> None:
+    """Fill the typed tables from the rows currently staged in object_stage."""
     con.execute("""
-      CREATE VIEW v_entity_record AS
+      INSERT INTO entity_record
       SELECT
         hash,
-        json_extract_string(doc, '$.body.entity_id') AS entity_id,
-        json_extract_string(doc, '$.body.entity_type') AS entity_type,
-        json_extract_string(doc, '$.context.snapshot_as_of') AS snapshot_as_of,
-        json_extract(doc, '$.body.labels') AS labels
-      FROM object_store
+        json_extract_string(doc, '$.body.entity_id'),
+        json_extract_string(doc, '$.body.entity_type'),
+        classification,
+        created_at,
+        TRY_CAST(json_extract_string(doc, '$.context.snapshot_as_of') AS DATE),
+        TRY_CAST(json_extract(doc, '$.body.labels') AS MAP(VARCHAR, VARCHAR)),
+        json_extract(doc, '$.body.attributes')
+      FROM object_stage
       WHERE kind='EntityRecord';
     """)
-    con.execute("DROP VIEW IF EXISTS v_activity_record")
     con.execute("""
-      CREATE VIEW v_activity_record AS
+      INSERT INTO entity_relationship
+      SELECT hash, entity_id, r->>'rel', r->>'target_id', snapshot_as_of
+      FROM (
+        SELECT
+          hash,
+          json_extract_string(doc, '$.body.entity_id') AS entity_id,
+          TRY_CAST(json_extract_string(doc, '$.context.snapshot_as_of') AS DATE) AS snapshot_as_of,
+          unnest(TRY_CAST(json_extract(doc, '$.body.relationships') AS JSON[])) AS r
+        FROM object_stage
+        WHERE kind='EntityRecord'
+      );
+    """)
+    con.execute("""
+      INSERT INTO activity_record
       SELECT
         hash,
-        json_extract_string(doc, '$.body.activity_id') AS activity_id,
-        json_extract_string(doc, '$.body.activity_type') AS activity_type,
-        json_extract_string(doc, '$.body.status') AS status,
-        json_extract_string(doc, '$.body.scheduling.due_date') AS due_date,
-        json_extract(doc, '$.body.subject_refs') AS subject_refs
-      FROM object_store
+        json_extract_string(doc, '$.body.activity_id'),
+        json_extract_string(doc, '$.body.activity_type'),
+        json_extract_string(doc, '$.body.status'),
+        classification,
+        created_at,
+        TRY_CAST(json_extract_string(doc, '$.context.snapshot_as_of') AS DATE),
+        TRY_CAST(json_extract_string(doc, '$.body.scheduling.due_date') AS TIMESTAMP),
+        TRY_CAST(json_extract_string(doc, '$.body.scheduling.start_date') AS TIMESTAMP),
+        TRY_CAST(json_extract(doc, '$.body.subject_refs') AS VARCHAR[]),
+        json_extract(doc, '$.body.payload')
+      FROM object_stage
       WHERE kind='ActivityRecord';
     """)
 
-    print(f"[OK] DuckDB rebuilt at {DBPATH} using manifest {manifest['manifest_id']}.")
-    con.close()
+def schema_version(con) -> str | None:
+    try:
+        row = con.execute("SELECT value FROM projection_meta WHERE key='schema_version'").fetchone()
+    except duckdb.CatalogException:
+        return None
+    return row[0] if row else None
 
-if __name__ == "__main__":
-    main()
+def projected(con) -> tuple[list[list[str]], list[tuple]]:
+    """The [dataset, manifest_id] pairs and channel_pointer rows in the projection, read before a
+    rebuild drops the tables (empty when there is no projection yet)."""
+    try:
+        row = con.execute("SELECT value FROM projection_meta WHERE key='projected'").fetchone()
+        pairs = json.loads(row[0]) if row else [list(r) for r in con.execute(
+            "SELECT DISTINCT dataset, manifest_id FROM manifest_member ORDER BY ALL").fetchall()]
+        pointers = con.execute("SELECT dataset, channel, manifest_id FROM channel_pointer").fetchall()
+    except duckdb.CatalogException:
+        return [], []
+    return pairs, pointers
+
+def insert_objects(con, hashes: list[str], batch_size: int = BATCH_SIZE) -> None:
+    """Bulk-load canonical object files with DuckDB's own reader.
+
+    read_text() scans each batch of files on DuckDB's worker threads and the JSON is
+    parsed inside the engine, so nothing is decoded or re-encoded in Python; the
+    stored doc is the canonical bytes that were hashed. Each batch is staged once
+    and feeds both object_store and the typed tables."""
+    for i in range(0, len(hashes), batch_size):
+        paths = [str(object_path_for_hash(h)) for h in hashes[i:i + batch_size]]
+        with tracing.span("duckdb.insert", table="object_store", rows=len(paths)):
+            con.execute(f"""
+              CREATE OR REPLACE TEMP TABLE object_stage AS
+              SELECT
+                'sha256:' || regexp_extract(filename, '([0-9a-f]{{64}})\\.json$', 1) AS hash,
+                doc->>'$.envelope.kind' AS kind,
+                coalesce(doc->>'$.envelope.privacy.classification', 'internal') AS classification,
+                TRY_CAST(doc->>'$.envelope.created_at' AS TIMESTAMP) AS created_at,
+                doc
+              FROM (SELECT filename, content::JSON AS doc FROM read_text({sql_list(paths)}))
+            """)
+            con.execute("INSERT INTO object_store SELECT * FROM object_stage ON CONFLICT DO NOTHING")
+            materialize(con)
+    con.execute("DROP TABLE IF EXISTS object_stage")
+
+def member_rows(dataset: str, manifest: dict | Manifest) -> list[dict]:
+    mid = manifest.get("manifest_id")
+    if "entries" in manifest:
+        rows = [{"dataset": dataset, "manifest_id": mid, "hash": e["object"], "kind": e.get("kind"),
+                 "logical_id": e.get("logical_id"), "date": e.get("date")} for e in manifest["entries"]]
+    else:  # flat 'objects' lists carry no metadata; it is filled in from the documents
+        rows = [{"dataset": dataset, "manifest_id": mid, "hash": h, "kind": None, "logical_id": None, "date": None}
+                for h in manifest_hashes(manifest)]
+    return list({r["hash"]: r for r in rows}.values())
 
+def insert_members(con, rows: list[dict]) -> None:
+    if not rows:
+        return
+    with tracing.span("duckdb.insert", table="manifest_member", rows=len(rows)):
+        # staged through a file so DuckDB ingests them in one scan instead of per-row binds
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False, encoding="utf-8") as f:
+            f.writelines(json.dumps(r) + "\n" for r in rows)
+        try:
+            con.execute(f"""
+              INSERT INTO manifest_member
+              SELECT dataset, manifest_id, hash, kind, logical_id, TRY_CAST(date AS DATE)
+              FROM read_json('{f.name}', format='newline_delimited', columns={{
+                'dataset': 'VARCHAR', 'manifest_id': 'VARCHAR', 'hash': 'VARCHAR', 'kind': 'VARCHAR',
+                'logical_id': 'VARCHAR', 'date': 'VARCHAR'}})
+            """)
+        finally:
+            os.unlink(f.name)
 
+def view_name(*parts: str) -> str:
+    return "v_" + "_".join(re.sub(r"[^0-9A-Za-z]+", "_", p).strip("_").lower() for p in parts)
+
+RECORD_VIEWS = {"entity_record": "entity_record", "activity_record": "activity_record",
+                "entity_relationship": "entity_relationship"}
+
+def create_views(con) -> None:
+    # same columns as the original json_extract views, over every projected object
+    con.execute("""
+      CREATE OR REPLACE VIEW v_entity_record AS
+      SELECT hash, entity_id, entity_type, snapshot_as_of, labels
+      FROM entity_record;
+    """)
+    con.execute("""
+      CREATE OR REPLACE VIEW v_activity_record AS
+      SELECT hash, activity_id, activity_type, status, due_date, subject_refs
+      FROM activity_record;
+    """)
+    # per-manifest views for side-by-side comparisons: filter or group on manifest_id
+    for suffix, table in RECORD_VIEWS.items():
+        con.execute(f"""
+          CREATE OR REPLACE VIEW v_manifest_{suffix} AS
+          SELECT m.dataset, m.manifest_id, t.*
+          FROM manifest_member m JOIN {table} t USING (hash);
+        """)
+    # channel pointer views, e.g. v_core_prod_entity_record
+    for dataset, channel in con.execute("SELECT dataset, channel FROM channel_pointer").fetchall():
+        for suffix, table in RECORD_VIEWS.items():
+            con.execute(f"""
+              CREATE OR REPLACE VIEW {view_name(dataset, channel, suffix)} AS
+              SELECT t.*
+              FROM channel_pointer c
+              JOIN manifest_member m ON m.dataset = c.dataset AND m.manifest_id = c.manifest_id
+              JOIN {table} t USING (hash)
+              WHERE c.dataset = '{dataset.replace("'", "''")}' AND c.channel = '{channel.replace("'", "''")}';
+            """)
+
+def sync(con, dataset: str, manifests: list[dict | Manifest], channels: dict[str, str] | None = None,
+         drop: list[str] = (), full: bool = False) -> dict:
+    """Project `manifests` into the shared store inside one transaction.
+
+    Each object is stored once no matter how many manifests list it; membership lives
+    in manifest_member. Only hashes not yet in object_store are loaded, and objects no
+    longer referenced by any manifest are garbage-collected. Readers see either the
+    old or the new snapshot, never a mix. A full rebuild happens on request or when
+    the stored schema version differs; in the latter case the manifests and channel
+    pointers projected before are projected again from disk and listed in
+    "reprojected" (any whose file is gone are listed in "lost")."""
+    con.execute("BEGIN TRANSACTION")
+    try:
+        stored = schema_version(con)
+        rebuilt = full or stored != SCHEMA_VERSION
+        before, pointers = projected(con) if rebuilt and not full else ([], [])
+        if rebuilt:
+            create_schema(con)
+        ids = [m.get("manifest_id") for m in manifests] + list(drop)
+        if ids:
+            con.execute(f"DELETE FROM manifest_member WHERE dataset = ? AND manifest_id IN (SELECT unnest({sql_list(ids)}))", [dataset])
+        for m in manifests:
+            insert_members(con, member_rows(dataset, m))
+        reprojected, lost = [], []
+        for ds, mid in before:
+            if ds == dataset and mid in ids:
+                continue
+            path = manifest_file(ds, mid, DATA)
+            if path is None:
+                lost.append((ds, mid))
+                continue
+            insert_members(con, member_rows(ds, read_manifest(path)))
+            reprojected.append((ds, mid))
+        if pointers:
+            con.executemany("INSERT INTO channel_pointer VALUES (?, ?, ?)", pointers)
+        new = [r[0] for r in con.execute("""
+          SELECT DISTINCT hash FROM manifest_member
+          WHERE hash NOT IN (SELECT hash FROM object_store)
+        """).fetchall()]
+        insert_objects(con, new)
+        con.execute("""
+          UPDATE manifest_member SET
+            kind = coalesce(manifest_member.kind, o.kind),
+            logical_id = coalesce(manifest_member.logical_id,
+                                  o.doc->>'$.body.entity_id', o.doc->>'$.body.activity_id'),
+            date = coalesce(manifest_member.date, TRY_CAST(o.doc->>'$.context.snapshot_as_of' AS DATE))
+          FROM object_store o
+          WHERE manifest_member.hash = o.hash
+            AND (manifest_member.kind IS NULL OR manifest_member.logical_id IS NULL OR manifest_member.date IS NULL)
+        """)
+        orphans = "SELECT hash FROM object_store WHERE hash NOT IN (SELECT hash FROM manifest_member)"
+        removed = con.execute(f"SELECT count(*) FROM ({orphans})").fetchone()[0]
+        if removed:
+            for table in TYPED_TABLES:
+                con.execute(f"DELETE FROM {table} WHERE hash IN ({orphans})")
+            con.execute(f"DELETE FROM object_store WHERE hash IN ({orphans})")
+        if channels is not None:
+            con.execute("DELETE FROM channel_pointer WHERE dataset = ?", [dataset])
+            con.executemany("INSERT INTO channel_pointer VALUES (?, ?, ?)",
+                            [(dataset, ch, mid) for ch, mid in channels.items()])
+        pairs = con.execute("SELECT DISTINCT dataset, manifest_id FROM manifest_member ORDER BY ALL").fetchall()
+        meta = {"schema_version": SCHEMA_VERSION, "synced_at": now_iso(), "projected": json.dumps([list(p) for p in pairs])}
+        con.executemany("INSERT OR REPLACE INTO projection_meta VALUES (?, ?)", list(meta.items()))
+        create_views(con)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    objects = con.execute("SELECT count(*) FROM object_store").fetchone()[0]
+    return {"rebuilt": rebuilt, "added": len(new), "removed": removed, "objects": objects,
+            "reprojected": reprojected, "lost": lost}
+
+def build_graph(con, dataset: str, manifest_id: str) -> Graph:
+    """Adjacency for one projected manifest: entity relationships plus activity subject_refs."""
+    args = {"dataset": dataset, "manifest_id": manifest_id}
+    edges = con.execute("""
+      SELECT r.entity_id, r.rel, r.target_id
+      FROM manifest_member m JOIN entity_relationship r USING (hash)
+      WHERE m.dataset = $dataset AND m.manifest_id = $manifest_id
+      UNION ALL
+      SELECT activity_id, 'subject', unnest(subject_refs)
+      FROM manifest_member m JOIN activity_record a USING (hash)
+      WHERE m.dataset = $dataset AND m.manifest_id = $manifest_id
+    """, args).fetchall()
+    nodes = con.execute("SELECT logical_id FROM manifest_member WHERE dataset = $dataset AND manifest_id = $manifest_id",
+                        args).fetchall()
+    return Graph.build(edges, [n[0] for n in nodes])
+
+def main():
+    ap = argparse.ArgumentParser(description="Sync the DuckDB projection to one or more manifests")
+    ap.add_argument("--dataset", default="core")
+    ap.add_argument("--manifest", action="append", default=None,
+                    help="manifest id to project (repeatable); default: every manifest a channel points at")
+    ap.add_argument("--drop", action="append", default=[], help="manifest id to remove from the projection (repeatable)")
+    ap.add_argument("--db", default=str(DBPATH), help="DuckDB file to project into")
+    ap.add_argument("--full", action="store_true", help="drop and rebuild instead of syncing incrementally")
+    ap.add_argument("--threads", type=int, default=int(os.getenv("BNX_DUCKDB_THREADS", os.cpu_count() or 4)),
+                    help="DuckDB worker threads (default: BNX_DUCKDB_THREADS or CPU count)")
+    args = ap.parse_args()
+
+    pointers = channel_pointers(load_channels(), args.dataset)
+    ids = args.manifest or list(dict.fromkeys(pointers.values()))
+    if not ids:
+        raise SystemExit(f"No channels set for dataset '{args.dataset}'; pass --manifest.")
+    manifests = [load_manifest(args.dataset, mid) for mid in ids]
+    dbpath = pathlib.Path(args.db)
+    dbpath.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(dbpath))
+    con.execute(f"PRAGMA threads={args.threads}")
+
+    with tracing.span("duckdb.sync", dataset=args.dataset, manifests=",".join(ids)):
+        stats = sync(con, args.dataset, manifests, channels=pointers, drop=args.drop, full=args.full)
+    for ds, mid in [(args.dataset, mid) for mid in ids] + stats["reprojected"]:
+        with tracing.span("graph.build", dataset=ds, manifest_id=mid):
+            build_graph(con, ds, mid).save(graph_path(ds, mid))
+    mode = "rebuilt" if stats["rebuilt"] else "synced"
+    print(f"[OK] DuckDB {mode} at {dbpath} using manifests {', '.join(ids)} "
+          f"(+{stats['added']} -{stats['removed']}, {stats['objects']} objects stored).")
+    if stats["reprojected"]:
+        print(f"[OK] Schema changed; re-projected {', '.join(f'{ds}/{mid}' for ds, mid in stats['reprojected'])} from disk.")
+    if stats["lost"]:
+        print(f"[WARN] Schema changed; no manifest file left for {', '.join(f'{ds}/{mid}' for ds, mid in stats['lost'])}, "
+              "dropped from the projection.")
+    con.close()
+
+if __name__ == "__main__":
+    tracing.configure("rebuild_duckdb")
+    with tracing.span("rebuild_duckdb"):
+        main()
@@ -5,6 +5,9 @@ from jsonschema import Draft202012Validator
 from common import canonical_json, sha256_hex, read_json
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from bnx import tracing  # noqa: E402
+from bnx.paths import DATA  # noqa: E402
 
 
 def validate_object_hash(obj: dict) -> tuple[bool, str]:
@@ -44,8 +47,8 @@ def validate_body_against_schema(kind: str, body: dict) -> tuple[bool, str]:
 
 
 def main() -> int:
-    objects_dir = ROOT / 'data' / 'objects'
-    refs_dir = ROOT / 'data' / 'refs'
+    objects_dir = DATA / 'objects'
+    refs_dir = DATA / 'refs'
     ok = True
     obj_count = 0
     for shard in objects_dir.glob('*'):
@@ -83,7 +86,7 @@ def main() -> int:
                     ok = False
                 else:
                     h = objhash.split(':',1)[1]
-                    obj_path = ROOT / 'data' / 'objects' / h[:2] / f"{h}.json"
+                    obj_path = DATA / 'objects' / h[:2] / f"{h}.json"
                     if not obj_path.exists():
                         print(f"[REF] {f}: object not found at {obj_path}")
                         ok = False
@@ -96,4 +99,7 @@ def main() -> int:
         return 2
 
 if __name__ == '__main__':
-    sys.exit(main())
+    tracing.configure("validate_repo")
+    with tracing.span("validate_repo"):
+        code = main()
+    sys.exit(code)
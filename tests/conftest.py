@@ -0,0 +1,7 @@
+import pytest
+from api.ratelimit import limiter
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits():
+    # every test starts with full buckets; tests share the same JWT subject
+    limiter.reset()
@@ -0,0 +1,52 @@
+import asyncio, time
+import pytest
+from fastapi import HTTPException
+from api import main as m
+from api.executor import EndpointLimit, run_io
+
+DEPLOY = "sha256:2bb86b9eb3004e8bb0ff70ee3579f1a530e191e465f7d69646fb1b56f7ee304a"
+
+def test_read_endpoints_are_async():
+    for route in ("/objects/{hash_id}", "/manifests/{dataset}/{manifest_id}", "/graph/{dataset}/{manifest_id}/neighbors"):
+        endpoint = next(r.endpoint for r in m.app.routes if getattr(r, "path", None) == route)
+        assert asyncio.iscoroutinefunction(endpoint)
+
+def test_misses_load_on_io_executor(monkeypatch):
+    monkeypatch.setattr(m, "object_cache", m.LRUCache(10))
+    threads = []
+    real = m._load_object
+    monkeypatch.setattr(m, "_load_object", lambda h: (threads.append(__import__("threading").current_thread().name), real(h))[1])
+    async def main():
+        first = await m.aread_object_by_hash(DEPLOY)
+        second = await m.aread_object_by_hash(DEPLOY)  # cache hit: no executor hop
+        return first, second
+    first, second = asyncio.run(main())
+    assert first is second and len(threads) == 1 and threads[0].startswith("bnx-io")
+
+def test_endpoint_limit_caps_concurrency_and_sheds():
+    limit = EndpointLimit("objects", 2, timeout=0.05)
+    peak = []
+    async def work():
+        async with limit.slot():
+            peak.append(limit.active)
+            await run_io(time.sleep, 0.1)
+    async def main():
+        return await asyncio.gather(*(work() for _ in range(4)), return_exceptions=True)
+    results = asyncio.run(main())
+    shed = [r for r in results if isinstance(r, HTTPException)]
+    assert max(peak) == 2 and len(shed) == 2
+    assert shed[0].status_code == 503 and shed[0].headers["Retry-After"] == "1"
+    # a fresh event loop gets its own semaphore
+    assert asyncio.run(main()).count(None) == 2
+
+def test_endpoint_concurrency_override_is_merged(monkeypatch):
+    from pydantic import ValidationError
+    from api.executor import limits
+    from api.security import ENDPOINT_CONCURRENCY, Settings
+    monkeypatch.setenv("BNX_ENDPOINT_CONCURRENCY", '{"objects": 256}')
+    assert Settings().endpoint_concurrency == {**ENDPOINT_CONCURRENCY, "objects": 256}
+    assert set(limits) == set(ENDPOINT_CONCURRENCY)
+    for bad in ('{"objcts": 256}', '{"summary": 0}'):
+        monkeypatch.setenv("BNX_ENDPOINT_CONCURRENCY", bad)
+        with pytest.raises(ValidationError):
+            Settings()
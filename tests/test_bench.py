@@ -0,0 +1,55 @@
+import json, pathlib, sys
+from jsonschema import Draft202012Validator
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import bench_suite  # noqa: E402
+import gen_dataset  # noqa: E402
+from common import canonical_json, sha256_hex  # noqa: E402
+
+def schemas():
+    return {k: Draft202012Validator(json.loads((ROOT / f"schemas/{k}.v1.json").read_text()))
+            for k in ("EntityRecord", "ActivityRecord")}
+
+def test_generated_tree_is_valid_and_deterministic(tmp_path):
+    stats = gen_dataset.generate(tmp_path / "a", 400, workers=2)
+    gen_dataset.generate(tmp_path / "b", 400, workers=1)
+    assert stats["objects"] == 400 and stats["revisions"] == 40
+    files = sorted((tmp_path / "a/objects").glob("*/*.json"))
+    assert len(files) == 400
+    assert [f.name for f in files] == sorted(f.name for f in (tmp_path / "b/objects").glob("*/*.json"))
+    validators = schemas()
+    for f in files[:100]:
+        obj = json.loads(f.read_bytes())
+        validators[obj["envelope"]["kind"]].validate(obj["body"])
+        claimed = obj["envelope"]["integrity"]["sha256"]
+        obj["envelope"]["integrity"]["sha256"] = None
+        assert claimed == f"sha256:{sha256_hex(canonical_json(obj))}" == f"sha256:{f.stem}"
+    v1 = json.loads((tmp_path / "a/manifests/bench/v1.json").read_text())
+    v2 = json.loads((tmp_path / "a/manifests/bench/v2.json").read_text())
+    assert len(v1["entries"]) == len(v2["objects"]) == 360
+    changed = [(a, b) for a, b in zip(v1["entries"], v2["entries"]) if a != b]
+    assert len(changed) == 40 and all(b["date"] == gen_dataset.DATE_V2 for _, b in changed)
+    assert len((tmp_path / "a/ledger.ndjson").read_text().splitlines()) == 400
+    assert "prod: v1" in (tmp_path / "a/channels.yaml").read_text()
+
+def test_regression_gate():
+    base = {"results": {"validate_repo": {"value": 1.0, "unit": "s"}, "api.objects": {"value": 10.0, "unit": "ms"}}}
+    ok = {"results": {"validate_repo": {"value": 1.2, "unit": "s"}, "api.objects": {"value": 14.0, "unit": "ms"}}}
+    slow = {"results": {"validate_repo": {"value": 1.5, "unit": "s"}, "api.objects": {"value": 20.0, "unit": "ms"}}}
+    floors = {"ms": 5.0, "s": 0.005}
+    assert bench_suite.compare(ok, base, 0.25, floors) == []  # api.objects +40% but only 4 ms: noise
+    regressions = bench_suite.compare(slow, base, 0.25, floors)
+    assert [r.split(":")[0] for r in regressions] == ["validate_repo", "api.objects"]
+
+def test_crash_check_finds_torn_and_lost_writes(tmp_path):
+    root = tmp_path / "data"
+    store = bench_suite.ObjectStore(root, fsync="off")
+    results = store.put_many(bench_suite.sample_objects(30))
+    assert bench_suite.check_tree(root) == {"torn": 0, "lost": 0, "events": 30}
+    h = results[0]["hash"].split(":")[1]
+    path = root / "objects" / h[:2] / f"{h}.json"
+    path.write_bytes(path.read_bytes()[:40])  # what an in-place write cut short by a crash leaves
+    h2 = results[1]["hash"].split(":")[1]
+    (root / "objects" / h2[:2] / f"{h2}.json").unlink()
+    assert bench_suite.check_tree(root) == {"torn": 1, "lost": 1, "events": 30}
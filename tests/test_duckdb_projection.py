@@ -0,0 +1,126 @@
+import json, pathlib, sys
+import duckdb
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import rebuild_duckdb as rb  # noqa: E402
+
+def manifest(mid):
+    return json.loads((ROOT / f"data/manifests/core/{mid}.json").read_text())
+
+def hashes(con):
+    return {r[0] for r in con.execute("SELECT hash FROM object_store").fetchall()}
+
+def test_first_sync_builds_schema(tmp_path):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    stats = rb.sync(con, "core", [manifest("dev-seed")])
+    assert stats["rebuilt"] and stats["added"] == 4
+    assert con.execute("SELECT count(*) FROM v_activity_record").fetchone()[0] == 2
+    meta = dict(con.execute("SELECT key, value FROM projection_meta").fetchall())
+    assert meta["schema_version"] == rb.SCHEMA_VERSION
+    assert con.execute("SELECT DISTINCT manifest_id FROM manifest_member").fetchall() == [("dev-seed",)]
+
+def test_incremental_sync_only_touches_diff(tmp_path, monkeypatch):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [manifest("dev-seed")])
+    loaded = []
+    real = rb.insert_objects
+    monkeypatch.setattr(rb, "insert_objects", lambda c, hs: (loaded.extend(hs), real(c, hs)))
+    # test-manifest is a subset of dev-seed: new membership, no new objects
+    stats = rb.sync(con, "core", [manifest("test-manifest")])
+    assert not stats["rebuilt"] and stats["added"] == 0 and stats["removed"] == 0
+    assert loaded == []
+    # dropping dev-seed garbage-collects the objects only it referenced
+    stats = rb.sync(con, "core", [], drop=["dev-seed"])
+    assert stats["removed"] == 2
+    assert hashes(con) == set(rb.manifest_hashes(manifest("test-manifest")))
+    stats = rb.sync(con, "core", [manifest("dev-seed")])
+    assert stats["added"] == 2 and len(loaded) == 2
+
+def test_manifests_share_objects(tmp_path):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [manifest("dev-seed"), manifest("test-manifest")],
+            channels={"prod": "dev-seed", "staging": "test-manifest"})
+    assert con.execute("SELECT count(*) FROM object_store").fetchone()[0] == 4
+    assert con.execute("SELECT count(*) FROM manifest_member").fetchone()[0] == 6
+    prod = con.execute("SELECT count(*) FROM v_core_prod_entity_record").fetchone()[0]
+    staging = con.execute("SELECT count(*) FROM v_core_staging_entity_record").fetchone()[0]
+    assert (prod, staging) == (2, 1)
+    per_manifest = dict(con.execute("SELECT manifest_id, count(*) FROM v_manifest_activity_record GROUP BY ALL").fetchall())
+    assert per_manifest == {"dev-seed": 2, "test-manifest": 1}
+    # repointing a channel only touches channel_pointer
+    rb.sync(con, "core", [], channels={"prod": "test-manifest", "staging": "test-manifest"})
+    assert con.execute("SELECT count(*) FROM v_core_prod_entity_record").fetchone()[0] == 1
+
+def test_objects_only_manifest_members_are_filled(tmp_path):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    flat = {"manifest_id": "flat", "objects": [{"hash": h} for h in rb.manifest_hashes(manifest("dev-seed"))]}
+    rb.sync(con, "core", [flat])
+    row = con.execute("SELECT kind, logical_id, date FROM manifest_member WHERE logical_id = 'deploy_apollo'").fetchone()
+    assert row[0] == "ActivityRecord" and str(row[2]) == "2025-08-10"
+
+def test_failed_sync_rolls_back(tmp_path, monkeypatch):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [manifest("test-manifest")])
+    before = hashes(con)
+    def boom(c, hs):
+        raise RuntimeError("disk gone")
+    monkeypatch.setattr(rb, "insert_objects", boom)
+    try:
+        rb.sync(con, "core", [manifest("dev-seed")])
+        assert False, "sync should have failed"
+    except RuntimeError:
+        pass
+    assert hashes(con) == before
+
+def test_schema_change_reprojects_what_was_projected(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    (data / "manifests/core").mkdir(parents=True)
+    (data / "objects").symlink_to(ROOT / "data/objects")
+    for mid in ("dev-seed", "test-manifest", "test-promotion"):  # test-promotion is on disk but never projected
+        (data / f"manifests/core/{mid}.json").write_text((ROOT / f"data/manifests/core/{mid}.json").read_text())
+    gone = {**manifest("test-manifest"), "manifest_id": "gone"}
+    monkeypatch.setattr(rb, "DATA", data)
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [manifest("dev-seed"), manifest("test-manifest"), gone], channels={"prod": "dev-seed"})
+    meta = dict(con.execute("SELECT key, value FROM projection_meta").fetchall())
+    assert json.loads(meta["projected"]) == [["core", "dev-seed"], ["core", "gone"], ["core", "test-manifest"]]
+    con.execute("UPDATE projection_meta SET value = '0' WHERE key = 'schema_version'")
+    stats = rb.sync(con, "core", [manifest("test-manifest")])
+    assert stats["rebuilt"] and stats["reprojected"] == [("core", "dev-seed")] and stats["lost"] == [("core", "gone")]
+    assert con.execute("SELECT DISTINCT manifest_id FROM manifest_member ORDER BY 1").fetchall() == [("dev-seed",), ("test-manifest",)]
+    assert con.execute("SELECT count(*) FROM v_core_prod_entity_record").fetchone()[0] == 2  # pointer carried over
+    assert "team_systems" in rb.build_graph(con, "core", "dev-seed")
+    # a requested full rebuild still projects only what it is given
+    stats = rb.sync(con, "core", [manifest("test-manifest")], full=True)
+    assert stats["reprojected"] == []
+    assert con.execute("SELECT DISTINCT manifest_id FROM manifest_member").fetchall() == [("test-manifest",)]
+
+def test_channel_manifest_id_accepts_both_formats():
+    assert rb.channel_manifest_id({"core": {"prod": "dev-seed"}}, "core") == "dev-seed"
+    assert rb.channel_manifest_id({"core": {"prod": {"current": {"id": "x"}}}}, "core") == "x"
+    assert rb.channel_manifest_id({}, "core") is None
+
+def test_typed_tables_are_materialized(tmp_path):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [manifest("dev-seed")])
+    types = dict(con.execute("SELECT column_name, data_type FROM information_schema.columns "
+                             "WHERE table_name='activity_record'").fetchall())
+    assert types["due_date"] == "TIMESTAMP" and types["subject_refs"] == "VARCHAR[]"
+    labels = con.execute("SELECT labels['team'] FROM entity_record WHERE entity_id='project_apollo'").fetchone()[0]
+    assert labels == "systems"
+    rels = con.execute("SELECT entity_id, rel, target_id FROM entity_relationship ORDER BY entity_id").fetchall()
+    assert ("project_apollo", "owned_by", "team_systems") in rels
+    # garbage-collected objects lose their typed rows too
+    rb.sync(con, "core", [manifest("test-manifest")], drop=["dev-seed"])
+    assert con.execute("SELECT count(*) FROM entity_record").fetchone()[0] == 1
+
+def test_parquet_export_is_partitioned(tmp_path):
+    import export_parquet
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [manifest("dev-seed")])
+    counts = export_parquet.export(con, tmp_path / "pq")
+    assert counts["activity_record"] == 2
+    assert (tmp_path / "pq/entity_record/kind=EntityRecord/snapshot_date=2025-08-10").is_dir()
+    rows = duckdb.sql(f"SELECT count(*) FROM read_parquet('{tmp_path}/pq/activity_record/**/*.parquet')").fetchone()
+    assert rows[0] == 2
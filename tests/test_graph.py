@@ -0,0 +1,67 @@
+import json, pathlib, sys, time
+import duckdb
+from fastapi.testclient import TestClient
+from jose import jwt
+import api.main
+from api.main import app
+from bnx.graph import Graph
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import rebuild_duckdb as rb  # noqa: E402
+
+EDGES = [
+    ("project_apollo", "owned_by", "team_systems"),
+    ("team_systems", "manages", "project_apollo"),
+    ("deploy_apollo", "subject", "project_apollo"),
+    ("task_generate_readme", "subject", "project_apollo"),
+]
+
+def generate_test_jwt(scopes="manifests:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def ids(result):
+    return {n["id"]: n["depth"] for n in result["nodes"]}
+
+def test_traversal_directions_and_filters():
+    g = Graph.build(EDGES + [("team_systems", "member_of", "org_root")])
+    assert ids(g.neighbors("deploy_apollo", 1)) == {"project_apollo": 1}
+    assert ids(g.neighbors("deploy_apollo", 2)) == {"project_apollo": 1, "team_systems": 2, "task_generate_readme": 2}
+    assert ids(g.neighbors("project_apollo", 1, "in")) == {"team_systems": 1, "deploy_apollo": 1, "task_generate_readme": 1}
+    assert ids(g.neighbors("project_apollo", 3, "out", ["owned_by", "member_of"])) == {"team_systems": 1, "org_root": 2}
+    assert g.neighbors("org_root", 1, "out") == {"nodes": [], "edges": []}
+
+def test_save_load_roundtrip(tmp_path):
+    g = Graph.build(EDGES, ["isolated"])
+    g.save(tmp_path / "g.bnxg")
+    h = Graph.load(tmp_path / "g.bnxg")
+    assert h.nodes == g.nodes and h.rels == g.rels
+    assert h.neighbors("project_apollo", 2) == g.neighbors("project_apollo", 2)
+    assert "isolated" in h and h.neighbors("isolated") == {"nodes": [], "edges": []}
+
+def test_built_from_projection(tmp_path):
+    con = duckdb.connect(str(tmp_path / "p.duckdb"))
+    rb.sync(con, "core", [json.loads((ROOT / "data/manifests/core/dev-seed.json").read_text())])
+    g = rb.build_graph(con, "core", "dev-seed")
+    assert sorted((e["source"], e["rel"], e["target"]) for e in g.neighbors("project_apollo")["edges"]) == sorted(EDGES)
+
+def test_neighbors_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(api.main, "graph_path", lambda ds, mid: tmp_path / ds / mid / "graph.bnxg")
+    api.main.graph_cache.clear()
+    c = TestClient(app)
+    headers = {"Authorization": f"Bearer {generate_test_jwt('manifests:read objects:read')}"}
+    url = "/graph/core/dev-seed/neighbors"
+    assert c.get(url, params={"id": "project_apollo"}, headers=headers).status_code == 404
+    Graph.build(EDGES).save(tmp_path / "core/dev-seed/graph.bnxg")
+    r = c.get(url, params={"id": "team_systems", "depth": 2, "direction": "in", "rel": "owned_by"}, headers=headers)
+    assert r.status_code == 200
+    assert ids(r.json()) == {"project_apollo": 1}
+    assert c.get(url, params={"id": "nobody"}, headers=headers).status_code == 404
+    assert c.get(url, params={"id": "team_systems", "depth": 9}, headers=headers).status_code == 422
+    r = c.get(url, params={"id": "team_systems"}, headers={"Authorization": f"Bearer {generate_test_jwt('objects:read')}"})
+    assert r.status_code == 403
+    r = c.get(url, params={"id": "team_systems"}, headers={"Authorization": f"Bearer {generate_test_jwt()}"})
+    assert r.status_code == 403  # nodes are objects: reading them needs a read scope
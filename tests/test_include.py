@@ -0,0 +1,56 @@
+import time
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api.main import app
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+TEAM = "sha256:e35c0eaecc84c2f55c764fa3dd5ac76e403c7bed6148b1e944055f71b184feee"
+DEPLOY = "sha256:2bb86b9eb3004e8bb0ff70ee3579f1a530e191e465f7d69646fb1b56f7ee304a"
+
+def generate_test_jwt(scopes="objects:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def get(params, scopes="objects:read", h=DEPLOY):
+    return TestClient(app).get(f"/objects/{h}", params=params, headers={"Authorization": f"Bearer {generate_test_jwt(scopes)}"})
+
+def hashes(objs):
+    return [o["envelope"]["integrity"]["sha256"] for o in objs]
+
+def test_include_follows_links_by_depth():
+    r = get({"include": "subject_refs,relationships", "dataset": "core", "manifest": "dev-seed"})
+    assert r.status_code == 200
+    assert r.json()["object"]["envelope"]["integrity"]["sha256"] == DEPLOY
+    assert hashes(r.json()["included"]) == [APOLLO]
+    r = get({"include": "subject_refs,relationships", "depth": 3, "dataset": "core", "manifest": "dev-seed"})
+    # team_systems -> project_apollo is already included, so each object appears once
+    assert hashes(r.json()["included"]) == [APOLLO, TEAM]
+
+def test_include_resolves_against_channel_and_manifest():
+    r = get({"include": "relationships", "dataset": "core", "channel": "prod"}, h=APOLLO)
+    assert hashes(r.json()["included"]) == [TEAM]
+    # test-manifest does not contain team_systems
+    r = get({"include": "relationships", "dataset": "core", "manifest": "test-manifest"}, h=APOLLO)
+    assert r.json()["included"] == [] and r.json()["unresolved"] == ["team_systems"]
+
+def test_include_applies_view_to_every_object():
+    r = get({"include": "subject_refs,relationships", "depth": 2, "dataset": "core", "manifest": "dev-seed"},
+            scopes="objects:read:redacted")
+    body = r.json()
+    assert all("owner" not in o["envelope"] and "links" not in o["body"] for o in [body["object"], *body["included"]])
+
+def test_include_validation():
+    assert get({"include": "owners", "dataset": "core", "manifest": "dev-seed"}).status_code == 400
+    assert get({"include": "subject_refs"}).status_code == 400
+    assert get({"include": "subject_refs", "dataset": "core", "manifest": "dev-seed", "channel": "prod"}).status_code == 400
+    assert get({"include": "subject_refs", "dataset": "core", "channel": "nope"}).status_code == 404
+
+def test_manifest_members_cache(monkeypatch):
+    m.member_cache.clear()
+    members = m.manifest_members("core", "dev-seed")
+    assert members["deploy_apollo"] == DEPLOY
+    monkeypatch.setattr(m, "load_manifest", lambda ds, mid: (_ for _ in ()).throw(AssertionError("reloaded")))
+    assert m.manifest_members("core", "dev-seed") is members
@@ -0,0 +1,62 @@
+import os
+import pytest
+from agent.index import ManifestIndex, manifest_digest, parse_terms
+from bnx import manifest as bm
+
+def entity(eid, etype, labels, rels=()):
+    return {"envelope": {"kind": "EntityRecord"},
+            "body": {"entity_id": eid, "entity_type": etype, "labels": labels,
+                     "relationships": [{"rel": r, "target_id": t} for r, t in rels]}}
+
+def activity(aid, atype, status, refs):
+    return {"envelope": {"kind": "ActivityRecord"},
+            "body": {"activity_id": aid, "activity_type": atype, "status": status, "subject_refs": refs}}
+
+OBJS = [
+    entity("project_apollo", "project", {"env": "dev"}, [("owned_by", "team_systems")]),
+    entity("team_systems", "team", {"env": "dev"}),
+    activity("deploy_apollo", "deployment", "planned", ["project_apollo"]),
+    activity("deploy_gemini", "deployment", "planned", ["project_gemini"]),
+    activity("deploy_apollo_old", "deployment", "completed", ["project_apollo"]),
+]
+
+def test_lookup_intersects_terms():
+    idx = ManifestIndex.build(OBJS)
+    q = parse_terms(["activity_type=deployment", "status=planned", "subject_refs=project_apollo"])
+    assert idx.lookup(q) == [2]
+    assert idx.lookup(["labels.env=dev"]) == [0, 1]
+    assert idx.lookup(["rel.owned_by=team_systems"]) == [0]
+    assert idx.lookup(["target=team_systems", "kind=ActivityRecord"]) == []
+    assert idx.lookup([]) == [0, 1, 2, 3, 4]
+
+def test_unknown_field_rejected():
+    with pytest.raises(ValueError):
+        parse_terms(["colour=red"])
+    with pytest.raises(ValueError):
+        parse_terms(["status"])
+
+def test_persisted_index_roundtrip(tmp_path):
+    path = tmp_path / "index.json"
+    ManifestIndex.build(OBJS, digest="abc").save(path)
+    loaded = ManifestIndex.load(path, "abc")
+    assert loaded is not None and loaded.lookup(["status=planned"]) == [2, 3]
+    # an index built for another manifest is not reused
+    assert ManifestIndex.load(path, "other") is None
+
+def test_large_manifest_lookup():
+    objs = [activity(f"a{i}", "deployment" if i % 2 else "task", "planned" if i % 3 else "completed",
+                     [f"project_{i % 1000}"]) for i in range(100_000)]
+    idx = ManifestIndex.build(objs)
+    hits = idx.lookup(["activity_type=deployment", "status=planned", "subject_refs=project_7"])
+    assert hits and all(i % 1000 == 7 and i % 2 and i % 3 for i in hits)
+
+def test_digest_stats_the_file_instead_of_reading_entries(tmp_path, monkeypatch):
+    path = tmp_path / "m.bnxm"
+    path.write_bytes(bm.encode("m", "core", "2025-08-10T00:00:00Z", [{"logical_id": "a", "object": "sha256:" + "0" * 64}]))
+    m = bm.load(path)
+    monkeypatch.setattr(bm.Manifest, "iter_v1_json", lambda self, *a, **k: pytest.fail("entries were read"))
+    digest = manifest_digest(m, "llm_min")
+    assert manifest_digest(bm.load(path), "llm_min") == digest
+    assert manifest_digest(m, "full") != digest  # an index over another view is not reused
+    os.utime(path, ns=(0, 0))
+    assert manifest_digest(m, "llm_min") != digest
@@ -0,0 +1,110 @@
+import json, pathlib, threading, time
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api.security import settings
+from bnx.store import Ledger, ObjectStore
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def token(scopes="objects:write"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def sample(name="entity_project_apollo"):
+    return json.loads((ROOT / f"data/samples/{name}.json").read_text())
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    root = tmp_path / "data"
+    root.mkdir()
+    monkeypatch.setattr(m, "store", ObjectStore(root))
+    return root
+
+@pytest.fixture
+def client():
+    return TestClient(m.app)
+
+def post(client, body, content_type="application/json", scopes="objects:write"):
+    data = body if isinstance(body, (bytes, str)) else json.dumps(body)
+    return client.post("/objects", content=data, headers={"Authorization": f"Bearer {token(scopes)}",
+                                                          "Content-Type": content_type})
+
+def test_single_object_matches_canonicalize_and_hash(client, data):
+    r = post(client, sample())
+    assert r.status_code == 201
+    assert r.json() == {"hash": APOLLO, "ref": "data/refs/entity/project_apollo/2025-08-10.json", "created": True}
+    h = APOLLO.split(":")[1]
+    assert (data / f"objects/{h[:2]}/{h}.json").read_bytes() == (ROOT / f"data/objects/{h[:2]}/{h}.json").read_bytes()
+    assert json.loads((data / "refs/entity/project_apollo/2025-08-10.json").read_text()) == {"object": APOLLO}
+    again = post(client, sample())
+    assert again.status_code == 200 and again.json()["created"] is False
+    events = [json.loads(line) for line in (data / "ledger.ndjson").read_text().splitlines()]
+    assert [(e["event"], e["hash"]) for e in events] == [("object.write", APOLLO)] * 2
+
+def test_rejected_objects(client, data):
+    bad = sample()
+    del bad["body"]["entity_id"]
+    r = post(client, bad)
+    assert r.status_code == 422 and r.json()["detail"]["error"]["code"] == "schema"
+    forged = sample()
+    forged["envelope"]["integrity"]["sha256"] = "sha256:" + "0" * 64
+    assert post(client, forged).json()["detail"]["error"]["code"] == "hash_mismatch"
+    unknown = {"envelope": {"kind": "Mystery"}, "body": {}}
+    assert post(client, unknown).json()["detail"]["error"]["code"] == "unknown_kind"
+    assert post(client, "{not json").status_code == 400
+    assert post(client, sample(), content_type="text/plain").status_code == 415
+    assert post(client, sample(), scopes="objects:read").status_code == 403
+    assert not (data / "objects").exists()
+
+def test_ndjson_bulk_streams_in_batches(client, data, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_batch_size", 2)
+    lines = [json.dumps(sample()), "", json.dumps(sample("activity_generate_readme")), "{oops",
+             json.dumps({"envelope": {"kind": "EntityRecord"}, "body": {}}), json.dumps(sample())]
+    r = post(client, "\n".join(lines) + "\n", content_type="application/x-ndjson")
+    body = r.json()
+    assert r.status_code == 200 and body["count"] == 5 and body["created"] == 2
+    assert [o["line"] for o in body["objects"]] == [1, 3, 6]
+    assert [(e["line"], e["error"]["code"]) for e in body["errors"]] == [(4, "bad_json"), (5, "schema")]
+    assert len((data / "ledger.ndjson").read_text().splitlines()) == 3
+    assert len(list((data / "objects").glob("*/*.json"))) == 2
+
+def test_oversized_line(client, data, monkeypatch):
+    monkeypatch.setattr(settings, "max_object_bytes", 100)
+    r = post(client, json.dumps(sample()), content_type="application/json")
+    assert r.status_code == 413 and r.json()["detail"]["error"]["code"] == "too_large"
+    r = post(client, json.dumps(sample()), content_type="application/x-ndjson")
+    assert r.status_code == 200 and [(e["line"], e["error"]["code"]) for e in r.json()["errors"]] == [(1, "too_large")]
+
+def test_oversized_line_mid_stream_reports_what_was_stored(client, data, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_batch_size", 1)
+    monkeypatch.setattr(settings, "max_object_bytes", 2000)
+    lines = [json.dumps(sample()), "x" * 5000, json.dumps(sample("activity_generate_readme"))]
+    body = post(client, "\n".join(lines) + "\n", content_type="application/x-ndjson").json()
+    assert [o["line"] for o in body["objects"]] == [1, 3] and body["created"] == 2
+    assert [(e["line"], e["error"]["code"]) for e in body["errors"]] == [(2, "too_large")]
+    assert len((data / "ledger.ndjson").read_text().splitlines()) == 2
+    # an oversized line spread over many chunks is skipped, not buffered
+    chunks = [json.dumps(sample()).encode() + b"\n"] + [b"y" * 1000] * 10 + [b"\n", json.dumps(sample()).encode()]
+    r = client.post("/objects", content=iter(chunks), headers={"Authorization": f"Bearer {token()}",
+                                                               "Content-Type": "application/x-ndjson"})
+    assert [o["line"] for o in r.json()["objects"]] == [1, 3] and r.json()["errors"][0]["line"] == 2
+
+def test_ledger_group_commit_keeps_lines_whole(tmp_path):
+    ledger = Ledger(tmp_path / "ledger.ndjson")
+    def writer(n):
+        for i in range(50):
+            ledger.append([{"event": "object.write", "writer": n, "i": i, "pad": "x" * 500}])
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    events = [json.loads(line) for line in (tmp_path / "ledger.ndjson").read_text().splitlines()]
+    assert len(events) == 400
+    for n in range(8):
+        assert [e["i"] for e in events if e["writer"] == n] == list(range(50))
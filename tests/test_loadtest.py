@@ -0,0 +1,58 @@
+import json, pathlib, random, sys, time
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api.accesslog import RequestLogMiddleware
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import loadtest  # noqa: E402
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def token(scopes="objects:read manifests:read channels:promote"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def test_endpoint_labels():
+    assert loadtest.endpoint("GET", f"/objects/{APOLLO}") == "GET /objects/{hash}"
+    assert loadtest.endpoint("GET", f"/objects/{APOLLO}?depth=1&view=llm_min") == "GET /objects/{hash}?view=llm_min"
+    assert loadtest.endpoint("GET", "/manifests/core/dev-seed/summary") == "GET /manifests/{dataset}/{manifest}/summary"
+    assert loadtest.endpoint("POST", "/channels/core/prod:promote") == "POST /channels/{dataset}/{channel}:promote"
+    assert loadtest.endpoint("POST", "/query") == "POST /query"
+
+def test_arrivals_are_open_loop_schedules():
+    rng = random.Random(3)
+    uniform = loadtest.arrivals(10, 2, "uniform", rng)
+    assert len(uniform) == 20 and uniform[1] - uniform[0] == 0.1
+    poisson = loadtest.arrivals(200, 10, "poisson", rng)
+    assert poisson == sorted(poisson) and abs(len(poisson) - 2000) < 200
+
+def test_request_log_replays(tmp_path):
+    log = tmp_path / "requests.ndjson"
+    client = TestClient(RequestLogMiddleware(m.app, path=str(log)))
+    headers = {"Authorization": f"Bearer {token()}"}
+    assert client.get(f"/objects/{APOLLO}?view=llm_min", headers=headers).status_code == 200
+    assert client.get("/health").status_code == 200
+    assert client.post("/channels/core/nope:promote", json={"manifest": "missing"}, headers=headers).status_code == 404
+    events = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [e["status"] for e in events] == [200, 404]
+    assert "authorization" not in log.read_text().lower()
+    replay = loadtest.read_replay(log)
+    assert [(r["method"], r["url"], r["body"]) for r in replay] == [
+        ("GET", f"/objects/{APOLLO}?view=llm_min", None),
+        ("POST", "/channels/core/nope:promote", {"manifest": "missing"})]
+    timed = loadtest.schedule_replay(replay, 2.0, 10, "uniform", random.Random(0))
+    assert timed[0]["at"] == 0 and timed[1]["at"] == (replay[1]["ts"] - replay[0]["ts"]) / 2
+
+def test_ledger_replay_and_report():
+    replay = loadtest.read_replay(ROOT / "data/ledger.ndjson")
+    assert ("POST", "/channels/core/prod:promote", {"manifest": "dev-seed"}) in [(r["method"], r["url"], r["body"]) for r in replay]
+    assert ("GET", f"/objects/{APOLLO}", None) in [(r["method"], r["url"], r["body"]) for r in replay]
+    run = {"seconds": 2.0, "results": [("GET /objects/{hash}", 200, 5.0), ("GET /objects/{hash}", 503, 50.0),
+                                        ("GET /objects/{hash}", 0, 30000.0), ("POST /query", 200, 9.0)]}
+    report = loadtest.summarize(run)
+    assert report["GET /objects/{hash}"]["errors"] == 2 and report["GET /objects/{hash}"]["throughput_rps"] == 1.5
+    assert report["all"]["requests"] == 4 and report["POST /query"]["p99_ms"] == 9.0
@@ -0,0 +1,87 @@
+import json, pathlib, time
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from bnx import manifest as bm
+from bnx.snapshot import members_of
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DEV_SEED = ROOT / "data/manifests/core/dev-seed.json"
+
+def token(scopes="manifests:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def entries(n):
+    return [{"kind": ("EntityRecord", "ActivityRecord")[i % 2], "logical_id": f"id_{(i * 7919) % n:05d}",
+             "date": f"2025-08-{i % 28 + 1:02d}", "object": f"sha256:{i:064x}"} for i in range(n)]
+
+def write_v2(path, rows, **extra):
+    path.write_bytes(bm.encode("big", "core", "2025-08-10T00:00:00Z", rows, extra))
+    return bm.load(path)
+
+def test_v2_round_trip_sorted_and_compact(tmp_path):
+    rows = entries(5000)
+    v2 = write_v2(tmp_path / "big.bnxm", rows, note="kept")
+    by_id = sorted(rows, key=lambda e: e["logical_id"])
+    assert v2.count == 5000 and v2.ordered and v2.kinds == ["", "EntityRecord", "ActivityRecord"]
+    assert [v2.entry(i) for i in range(v2.count)] == by_id
+    assert v2.hashes() == [e["object"] for e in by_id]
+    assert v2.find("id_00042") == next(e["object"] for e in rows if e["logical_id"] == "id_00042")
+    assert v2.find("missing") is None and v2.find("id_99999") is None
+    assert list(bm.iter_entries(tmp_path / "big.bnxm", batch=333)) == by_id
+    doc = json.loads(b"".join(v2.iter_v1_json(batch=1000)))
+    assert doc["note"] == "kept" and doc["entries"] == by_id and doc["objects"] == [{"hash": e["object"]} for e in by_id]
+    v1_size = len(json.dumps({"entries": rows, "objects": [{"hash": e["object"]} for e in rows]}, indent=2))
+    assert (tmp_path / "big.bnxm").stat().st_size * 4 < v1_size
+
+def test_v1_json_reads_into_columns():
+    doc = json.loads(DEV_SEED.read_text())
+    v1 = bm.load(DEV_SEED)
+    assert not v1.ordered and v1.hashes() == [e["object"] for e in doc["entries"]]
+    assert members_of(v1, None) == members_of(doc, None) == v1.members()
+    assert v1.find("project_apollo") == doc["entries"][0]["object"]
+    assert v1.get("manifest_id") == "dev-seed" and list(v1["entries"]) == doc["entries"]
+    flat = bm.from_v1({"manifest_id": "flat", "objects": [{"hash": e["object"]} for e in doc["entries"]]})
+    assert flat.unnamed() == [0, 1, 2, 3] and flat.members() == {}
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    root = tmp_path / "data"
+    (root / "manifests/core").mkdir(parents=True)
+    monkeypatch.setattr(m, "DATA", root)
+    m.member_cache.clear()
+    yield root
+    m.member_cache.clear()
+
+def test_v2_shadows_v1_and_api_serves_v1_json(data):
+    doc = json.loads(DEV_SEED.read_text())
+    path = data / "manifests/core/test-v2.bnxm"
+    path.write_bytes(bm.encode("test-v2", "core", doc["created_at"], doc["entries"]))
+    (data / "manifests/core/test-v2.json").write_text(json.dumps({"manifest_id": "test-v2", "entries": []}))
+    assert bm.manifest_file("core", "test-v2", data) == path
+    assert bm.manifest_files(data) == [("core", "test-v2", path)]
+    r = TestClient(m.app).get("/manifests/core/test-v2", headers={"Authorization": f"Bearer {token()}"})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/json"
+    body = r.json()
+    assert body["manifest_id"] == "test-v2" and len(body["entries"]) == 4
+    assert sorted(body["objects"], key=lambda o: o["hash"]) == sorted(doc["objects"], key=lambda o: o["hash"])
+    assert m.manifest_members("core", "test-v2") == members_of(doc, None)
+
+def test_duplicate_logical_ids_last_wins(tmp_path):
+    rows = [{"kind": "EntityRecord", "logical_id": lid, "date": "2025-08-10", "object": f"sha256:{n:064x}"}
+            for lid, n in (("b", 9), ("a", 5), ("b", 1), ("c", 3), ("b", 4))]
+    v1_members = {e["logical_id"]: e["object"] for e in rows}
+    for manifest in (write_v2(tmp_path / "dup.bnxm", rows), bm.from_v1({"entries": rows})):
+        assert manifest.members() == v1_members == members_of(manifest, None)
+        assert {lid: manifest.find(lid) for lid in "abc"} == v1_members
+
+def test_convert_replaces_v1(data):
+    v1 = data / "manifests/core/dev-seed.json"
+    v1.write_text(DEV_SEED.read_text())
+    out = bm.convert(v1)
+    assert not v1.exists() and bm.manifest_files(data) == [("core", "dev-seed", out)]
+    assert bm.load(out).members() == bm.load(DEV_SEED).members()
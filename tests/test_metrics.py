@@ -1,5 +1,18 @@
+import os, time
 from fastapi.testclient import TestClient
+from jose import jwt
+from prometheus_client import REGISTRY
+from api import main as m
 from api.main import app
+from api.metrics import StorageCollector
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def token(scopes="objects:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
 
 def test_metrics_ok():
     c = TestClient(app)
@@ -11,3 +24,45 @@ def test_metrics_content_type():
     c = TestClient(app)
     r = c.get("/metrics")
     assert r.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_stage_histograms_cover_object_path():
+    m.object_cache.clear()
+    m.view_cache.clear()
+    before = {s: sample("bnx_stage_seconds_count", path="object", stage=s)
+              for s in ("read", "parse", "project", "serialize", "compress")}
+    auth = sample("bnx_stage_seconds_count", path="any", stage="auth")
+    r = TestClient(app).get(f"/objects/{APOLLO}?view=llm_min",
+                            headers={"Authorization": f"Bearer {token()}", "Accept-Encoding": "gzip"})
+    assert r.status_code == 200 and r.headers["content-encoding"] == "gzip"
+    for s, n in before.items():
+        assert sample("bnx_stage_seconds_count", path="object", stage=s) == n + 1, s
+    assert sample("bnx_stage_seconds_count", path="any", stage="auth") == auth + 1
+
+def test_cache_events_exposed():
+    m.object_cache.get("sha256:absent")
+    text = TestClient(app).get("/metrics").text
+    assert 'bnx_cache_events_total{cache="object",event="miss"}' in text
+    assert 'bnx_cache_entries{cache="view"}' in text
+
+def test_storage_collector_is_incremental(tmp_path, monkeypatch):
+    (tmp_path / "objects/ab").mkdir(parents=True)
+    (tmp_path / "objects/ab/ab01.json").write_text("{}")
+    (tmp_path / "ledger.ndjson").write_text('{"e":1}\n{"e":2}\n')
+    c = StorageCollector(tmp_path)
+    stats = c.refresh()
+    assert (stats["objects"], stats["object_bytes"], stats["shards"], stats["ledger_events"]) == (1, 2, 1, 2)
+
+    listed = []
+    real = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda p: listed.append(str(p)) or real(p))
+    (tmp_path / "objects/cd").mkdir()
+    (tmp_path / "objects/cd/cd01.json").write_text("{ }")
+    with (tmp_path / "ledger.ndjson").open("a") as f:
+        f.write('{"e":3}\n{"e":')  # last event still being written
+    stats = c.refresh()
+    assert (stats["objects"], stats["object_bytes"], stats["shards"]) == (2, 5, 2)
+    assert stats["ledger_events"] == 3
+    assert str(tmp_path / "objects/ab") not in listed  # unchanged shard not re-listed
@@ -0,0 +1,121 @@
+import copy, time
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api.main import app
+from api.policy import PolicyEngine, allow_read_object
+from agent.pipes.summarizer import FragmentCache
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def obj(classification="internal", tags=("generic",), n=0):
+    return {"envelope": {"privacy": {"classification": classification, "policy_tags": list(tags)}}, "body": {"n": n}}
+
+def principal(scopes="objects:read", purpose="analysis"):
+    return {"scopes": set(scopes.split()), "purpose": purpose}
+
+def test_rules():
+    e = PolicyEngine(tag_scopes={"hr": "objects:read:hr"})
+    assert e.decide({"objects:read"}, "analysis", "full", ("internal", ())) is None
+    assert "restricted" in e.decide({"objects:read"}, None, "full", ("restricted", ()))
+    assert e.decide({"objects:read", "objects:read:restricted"}, None, "full", ("restricted", ())) is None
+    assert e.decide({"objects:read:redacted"}, None, "full", ("internal", ())) is not None
+    assert e.decide({"objects:read:redacted"}, None, "llm_min", ("internal", ())) is None
+    assert "purpose" in e.decide({"objects:read"}, "marketing", "full", ("internal", ()))
+    assert "hr" in e.decide({"objects:read"}, None, "full", ("internal", ("generic", "hr")))
+
+def test_filter_evaluates_each_distinct_key_once():
+    e = PolicyEngine()
+    objs = [obj(n=i) for i in range(1000)] + [obj("restricted", n=i) for i in range(1000)]
+    allowed, denied = e.filter(principal(), objs, "full")
+    assert len(allowed) == 1000 and len(denied) == 1000
+    assert all(o["envelope"]["privacy"]["classification"] == "internal" for o in allowed)
+    assert e.rule_evaluations == 2
+    # same principal attributes from another request hit the memo
+    e.filter(principal(), objs, "full")
+    assert e.rule_evaluations == 2
+
+def test_memo_is_bounded():
+    e = PolicyEngine(max_entries=2)
+    for purpose in ("a", "b", "c"):
+        e.decide({"objects:read"}, purpose, "full", ("internal", ()))
+    assert len(e._verdicts) <= 2
+
+def test_allow_read_object():
+    allow_read_object(principal(), "internal", False, "planning")
+    with pytest.raises(HTTPException) as exc:
+        allow_read_object(principal("objects:read:redacted"), "internal", False, None)
+    assert exc.value.status_code == 403 and exc.value.detail["error"]["code"] == "forbidden"
+
+def test_object_endpoint_enforces_purpose():
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": "objects:read", "purpose": "marketing"}
+    token = jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+    r = TestClient(app).get(f"/objects/{APOLLO}", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 403 and "purpose" in r.json()["detail"]["error"]["message"]
+
+def test_expansion_withholds_denied_objects(monkeypatch):
+    monkeypatch.setattr(m, "policy", PolicyEngine(classification_scopes={"restricted": "objects:read:restricted"},
+                                                  tag_scopes={"team": "objects:read:team"}))
+    real = m.read_object_by_hash
+    def read(h):
+        o = copy.deepcopy(real(h))  # cached objects are shared
+        if o["body"].get("entity_id") == "team_systems":
+            o["envelope"]["privacy"]["policy_tags"] = ["team"]
+        return o
+    monkeypatch.setattr(m, "read_object_by_hash", read)
+    r = m.expand_object(APOLLO, "full", ["relationships"], 2, m.manifest_members("core", "dev-seed"), principal())
+    assert r["included"] == [] and r["withheld"] == 1
+
+def test_summary_withholds_denied_objects(monkeypatch, tmp_path):
+    monkeypatch.setattr(m, "policy", PolicyEngine(tag_scopes={"team": "objects:read:team"}))
+    monkeypatch.setattr(m, "summary_cache", FragmentCache(tmp_path))
+    real = m.read_object_by_hash
+    def read(h):
+        o = copy.deepcopy(real(h))
+        if o["body"].get("entity_id") == "team_systems":
+            o["envelope"]["privacy"]["policy_tags"] = ["team"]
+        return o
+    monkeypatch.setattr(m, "read_object_by_hash", read)
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": "manifests:read objects:read", "purpose": "analysis"}
+    token = jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+    r = TestClient(app).get("/manifests/core/dev-seed/summary", headers={"Authorization": f"Bearer {token}"})
+    body = r.json()
+    assert r.status_code == 200 and body["withheld"] == 1 and body["stats"]["objects"] == 3
+    assert not any("team_systems" in line for line in body["lines"])
+
+def test_tag_scopes_come_from_settings(monkeypatch, tmp_path):
+    from api import policy as policy_module
+    from api.security import Settings, settings
+    from bnx.graph import Graph
+    assert policy_module.engine.tag_scopes == settings.policy_tag_scopes
+    monkeypatch.setenv("BNX_POLICY_TAG_SCOPES", '{"team": "objects:read:team"}')
+    monkeypatch.setattr(m, "policy", PolicyEngine(tag_scopes=Settings().policy_tag_scopes))
+    real = m.read_object_by_hash
+    def read(h):
+        o = copy.deepcopy(real(h))
+        if o["body"].get("entity_id") == "team_systems":
+            o["envelope"]["privacy"]["policy_tags"] = ["team"]
+        return o
+    monkeypatch.setattr(m, "read_object_by_hash", read)
+    monkeypatch.setattr(m, "graph_path", lambda ds, mid: tmp_path / "graph.bnxg")
+    m.graph_cache.clear()
+    Graph.build([("project_apollo", "owned_by", "team_systems"), ("deploy_apollo", "subject", "project_apollo")]).save(tmp_path / "graph.bnxg")
+    def neighbors(node, scopes):
+        now = int(time.time())
+        claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+                  "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+        token = jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+        return TestClient(app).get("/graph/core/dev-seed/neighbors", params={"id": node},
+                                   headers={"Authorization": f"Bearer {token}"})
+    body = neighbors("project_apollo", "manifests:read objects:read").json()
+    assert [n["id"] for n in body["nodes"]] == ["deploy_apollo"] and body["withheld"] == 1
+    assert all("team_systems" not in (e["source"], e["target"]) for e in body["edges"])
+    assert neighbors("team_systems", "manifests:read objects:read").status_code == 404
+    body = neighbors("project_apollo", "manifests:read objects:read objects:read:team").json()
+    assert {n["id"] for n in body["nodes"]} == {"deploy_apollo", "team_systems"} and body["withheld"] == 0
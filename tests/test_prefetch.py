@@ -0,0 +1,68 @@
+import threading, time
+from fastapi.testclient import TestClient
+from jose import jwt
+from prometheus_client import REGISTRY
+from api import main as m
+from api.main import app
+from api.prefetch import Prefetcher
+
+DEPLOY = "sha256:2bb86b9eb3004e8bb0ff70ee3579f1a530e191e465f7d69646fb1b56f7ee304a"
+
+def generate_test_jwt(scopes="manifests:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def test_concurrency_is_bounded_and_progress_exported():
+    lock, running, peak = threading.Lock(), [0], [0]
+    def warm(h):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if h == "bad":
+            raise OSError("gone")
+    p = Prefetcher(warm, concurrency=2)
+    job = p.submit("core", "bounded", [f"h{i}" for i in range(10)] + ["bad", "h0"], "test")
+    assert p.submit("core", "bounded", ["other"], "test") is job  # already running: not queued twice
+    assert job.finished.wait(5)
+    assert (job.total, job.done, job.failed) == (11, 10, 1)
+    assert peak[0] <= 2
+    assert REGISTRY.get_sample_value("bnx_prefetch_remaining", {"dataset": "core"}) == 0
+    p.shutdown()
+
+def test_big_manifest_is_windowed_and_capped(monkeypatch):
+    warmed, submitted = [], []
+    p = Prefetcher(warmed.append, concurrency=3, limit=100)
+    executor = p._executor()
+    real = executor.submit
+    monkeypatch.setattr(executor, "submit", lambda *a: (submitted.append(a), real(*a))[1])
+    job = p.submit("core", "huge", (f"h{i}" for i in range(1_000_000)), "test")
+    assert job.finished.wait(5)
+    assert len(submitted) == 3  # one worker loop per slot, not one future per object
+    assert (job.total, job.done) == (100, 100) and sorted(warmed) == sorted(f"h{i}" for i in range(100))
+    p.shutdown()
+
+def test_prefetch_manifest_fills_object_and_view_caches(monkeypatch):
+    monkeypatch.setattr(m, "object_cache", m.LRUCache(100))
+    monkeypatch.setattr(m, "view_cache", m.LRUCache(100))
+    monkeypatch.setattr(m, "prefetcher", Prefetcher(m.warm_object, 2))
+    job = m.prefetch_manifest("core", "dev-seed", m.load_manifest("core", "dev-seed"), "test")
+    assert job.finished.wait(5) and job.done == 4
+    assert DEPLOY in m.object_cache
+    assert (DEPLOY, m.get_profile("llm_min").cache_key) in m.view_cache
+    m.prefetcher.shutdown()
+
+def test_first_manifest_fetch_triggers_prefetch_when_enabled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(m.settings, "prefetch_on_manifest_fetch", True)
+    monkeypatch.setattr(m, "prefetched", set())
+    monkeypatch.setattr(m, "prefetch_manifest", lambda ds, mid, man, trigger: (calls.append(trigger), m.prefetched.add((ds, mid))))
+    c = TestClient(app)
+    headers = {"Authorization": f"Bearer {generate_test_jwt()}"}
+    for _ in range(2):
+        assert c.get("/manifests/core/dev-seed", headers=headers).status_code == 200
+    assert calls == ["manifest_fetch"]
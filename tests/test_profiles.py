@@ -0,0 +1,70 @@
+import json, pathlib, time
+from fastapi.testclient import TestClient
+from jose import jwt
+from api.main import app
+from agent.pipes.redactor import apply_llm_min
+from bnx.redaction import MASK, Profile, get_profile, load_profiles
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def load(h=APOLLO):
+    hexf = h.split(":", 1)[1]
+    return json.loads((ROOT / f"data/objects/{hexf[:2]}/{hexf}.json").read_text())
+
+def test_llm_min_matches_previous_rules():
+    for path in (ROOT / "data/objects").glob("*/*.json"):
+        obj = json.loads(path.read_text())
+        expected = {
+            "envelope": {k: v for k, v in obj["envelope"].items() if k != "owner"},
+            "context": obj["context"],
+            "body": {k: v for k, v in obj["body"].items() if k != "links"},
+        }
+        assert apply_llm_min(obj) == expected
+    assert get_profile("full").project(load()) == load()
+
+def test_include_exclude_mask_by_kind_and_pii():
+    p = Profile("t", {
+        "include": ["envelope.kind", "envelope.privacy", "body"],
+        "exclude": ["body.links"],
+        "mask": ["body.relationships.target_id"],
+        "kinds": {"EntityRecord": {"exclude": ["body.labels"]}},
+        "pii": {"email": {"mask": ["body.attributes.email"]}},
+    })
+    obj = load()
+    out = p.project(obj)
+    assert list(out) == ["envelope", "body"] and list(out["envelope"]) == ["kind", "privacy"]
+    assert "links" not in out["body"] and "labels" not in out["body"]
+    assert out["body"]["relationships"] == [{"rel": "owned_by", "target_id": MASK}]
+    obj["body"]["attributes"]["email"] = "a@example.com"
+    assert p.project(obj)["body"]["attributes"]["email"] == "a@example.com"
+    obj["envelope"]["privacy"]["pii"] = ["email"]
+    assert p.project(obj)["body"]["attributes"]["email"] == MASK
+    # the input object is never modified
+    assert obj["body"]["relationships"][0]["target_id"] == "team_systems"
+
+def test_projectors_are_compiled_once():
+    p = Profile("t", {"exclude": ["body.links"], "pii": {"email": {"mask": ["body.attributes"]}}})
+    for _ in range(3):
+        p.project(load())
+    assert p.projector(None) is p.projector(None)
+    assert len(p._compiled) == 1
+
+def test_profiles_from_config(tmp_path):
+    path = tmp_path / "r.yaml"
+    path.write_text("profiles:\n  tiny:\n    version: 3\n    include: [body.entity_id]\n")
+    profiles = load_profiles(path)
+    assert profiles["tiny"].project(load()) == {"body": {"entity_id": "project_apollo"}}
+    assert profiles["tiny"].cache_key == "tiny@3" and "full" in profiles
+
+def test_view_etag_carries_profile_version():
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": "objects:read", "purpose": "analysis"}
+    headers = {"Authorization": f"Bearer {jwt.encode(claims, 'dev-only-not-for-prod', algorithm='HS256')}"}
+    c = TestClient(app)
+    full = c.get(f"/objects/{APOLLO}", headers=headers)
+    red = c.get(f"/objects/{APOLLO}", params={"view": "llm_min"}, headers=headers)
+    assert full.headers["etag"] == APOLLO
+    assert red.headers["etag"] == f"{APOLLO}:{get_profile('llm_min').cache_key}"
+    assert c.get(f"/objects/{APOLLO}", params={"view": "nope"}, headers=headers).status_code == 400
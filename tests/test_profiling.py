@@ -0,0 +1,75 @@
+import pstats, time
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api import profiling
+from api.profiling import ProfileMiddleware, RequestProfile
+from api.security import settings
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def token(scopes="objects:read debug:profile"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    m.object_cache.clear()
+    return TestClient(ProfileMiddleware(m.app))
+
+def get(client, scopes="objects:read debug:profile", **headers):
+    return client.get(f"/objects/{APOLLO}", headers={"Authorization": f"Bearer {token(scopes)}", **headers})
+
+def test_profile_written_by_request_id(client, tmp_path):
+    r = get(client, **{"X-BNX-Profile": "1", "X-Request-ID": "req-1"})
+    assert r.status_code == 200 and r.json()["envelope"]
+    assert r.headers["x-bnx-profile-id"] == "req-1"
+    stats = pstats.Stats(str(tmp_path / "req-1.prof"))
+    # the object load ran on an I/O thread and is still in the profile
+    assert any(name == "_load_object" for _, _, name in stats.stats)
+
+def test_inline_report(client, tmp_path):
+    r = get(client, **{"X-BNX-Profile": "inline"})
+    body = r.json()
+    assert r.status_code == 200 and body["status"] == 200
+    assert "cumulative" in body["profile"] and body["request_id"] == r.headers["x-bnx-profile-id"]
+    assert not list(tmp_path.iterdir())
+
+def test_profile_needs_scope(client):
+    r = get(client, scopes="objects:read", **{"X-BNX-Profile": "1"})
+    assert r.status_code == 403 and r.json()["error"]["code"] == "forbidden"
+
+def test_unprofiled_unless_sampled(client, tmp_path, monkeypatch):
+    r = get(client)
+    assert r.status_code == 200 and "x-bnx-profile-id" not in r.headers
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    r = get(client, scopes="objects:read")
+    assert (tmp_path / f"{r.headers['x-bnx-profile-id']}.prof").exists()
+
+def test_only_known_header_values_turn_profiling_on(client, tmp_path):
+    for off in ("0", "false", "off", "yes"):
+        r = get(client, **{"X-BNX-Profile": off})
+        assert r.status_code == 200 and r.json()["envelope"] and "x-bnx-profile-id" not in r.headers, off
+    assert not list(tmp_path.iterdir())
+    assert get(client, scopes="objects:read", **{"X-BNX-Profile": "0"}).status_code == 200
+
+def test_request_id_cannot_escape_profile_dir(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    c = TestClient(ProfileMiddleware(m.app))
+    for bad in ("../escaped", "..", "a/b", "x" * 65):
+        r = c.get("/health", headers={"X-Request-ID": bad})
+        assert r.status_code == 200 and r.headers["x-bnx-profile-id"] != bad
+    assert [p.parent for p in tmp_path.rglob("*.prof")] == [tmp_path / "profiles"] * 4
+
+def test_thread_profile_falls_back_when_another_profiler_is_active(monkeypatch):
+    class Busy:  # what cProfile does on Python >= 3.12 while the event-loop profiler runs
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+    monkeypatch.setattr(profiling.cProfile, "Profile", Busy)
+    prof = RequestProfile("req")
+    assert prof.run(lambda: 42) == 42 and prof._profiles == []
@@ -0,0 +1,138 @@
+import json, pathlib, sys, time
+import duckdb
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import query
+from api.main import app
+from api.security import settings
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import rebuild_duckdb as rb  # noqa: E402
+
+def generate_test_jwt(scopes="query:run objects:read manifests:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+@pytest.fixture
+def projection(tmp_path, monkeypatch):
+    path = tmp_path / "p.duckdb"
+    con = duckdb.connect(str(path))
+    manifests = [json.loads((ROOT / f"data/manifests/core/{m}.json").read_text()) for m in ("dev-seed", "test-manifest")]
+    rb.sync(con, "core", manifests, channels={"prod": "dev-seed"})
+    con.close()
+    monkeypatch.setattr(settings, "db_path", str(path))
+    query.reset_pool()
+    yield path
+    query.reset_pool()
+
+def post(client, body, scopes="query:run objects:read manifests:read", accept=None):
+    headers = {"Authorization": f"Bearer {generate_test_jwt(scopes)}"}
+    if accept:
+        headers["Accept"] = accept
+    return client.post("/query", json=body, headers=headers)
+
+def test_named_query_streams_ndjson(projection):
+    r = post(TestClient(app), {"query": "activities_for_subject",
+                               "params": {"dataset": "core", "manifest_id": "dev-seed", "subject": "project_apollo"}})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert {row["activity_id"] for row in rows} == {"deploy_apollo", "task_generate_readme"}
+    assert rows[0]["due_date"].startswith("2025-08-")
+
+def test_row_limit_applies(projection):
+    r = post(TestClient(app), {"query": "manifest_counts", "params": {"dataset": "core"}, "limit": 1})
+    assert len(r.text.splitlines()) == 1
+
+def test_parquet_output(projection, tmp_path):
+    r = post(TestClient(app), {"query": "manifest_diff",
+                               "params": {"dataset": "core", "base": "test-manifest", "target": "dev-seed"}},
+             accept=query.MEDIA_PARQUET)
+    assert r.status_code == 200
+    out = tmp_path / "out.parquet"
+    out.write_bytes(r.content)
+    changes = duckdb.sql(f"SELECT logical_id, change FROM '{out}' ORDER BY logical_id").fetchall()
+    assert changes == [("deploy_apollo", "added"), ("team_systems", "added")]
+
+def test_query_scope_allow_list(projection):
+    body = {"query": "manifest_counts", "params": {"dataset": "core"}}
+    assert post(TestClient(app), body, scopes="objects:read manifests:read").status_code == 403
+    r = post(TestClient(app), body, scopes="query:run objects:read")
+    assert r.status_code == 403 and "manifests:read" in r.json()["detail"]["error"]["message"]
+
+def test_unknown_query_and_bad_params(projection):
+    c = TestClient(app)
+    assert post(c, {"query": "drop_everything", "params": {}}).status_code == 404
+    assert post(c, {"query": "manifest_counts", "params": {"dataset": "core", "x": 1}}).status_code == 400
+
+def test_unsupported_accept_is_406(projection):
+    r = post(TestClient(app), {"query": "manifest_counts", "params": {"dataset": "core"}}, accept="text/csv")
+    assert r.status_code == 406
+
+def test_timeout_interrupts_query(projection, monkeypatch):
+    monkeypatch.setitem(query.QUERIES, "slow", {"sql": "SELECT count(*) AS n FROM range(100000000000)",
+                                                 "params": [], "scopes": ["manifests:read"]})
+    r = post(TestClient(app), {"query": "slow", "params": {}, "timeout": 0.2})
+    assert r.status_code == 504
+    assert r.json()["detail"]["error"]["code"] == "timeout"
+
+def test_limit_and_timeout_must_be_positive_numbers(projection):
+    base = {"query": "manifest_counts", "params": {"dataset": "core"}}
+    for bad in ({"limit": -1}, {"limit": "10"}, {"limit": [1]}, {"limit": 1.5}, {"timeout": 0}, {"timeout": "1"}, {"timeout": True}):
+        r = post(TestClient(app), {**base, **bad})
+        assert r.status_code == 400 and r.json()["detail"]["error"]["code"] == "invalid", bad
+    assert post(TestClient(app), {**base, "limit": 1, "timeout": 2.5}).status_code == 200
+
+def test_streaming_shares_the_query_deadline():
+    con = duckdb.connect()
+    started = time.monotonic()
+    with pytest.raises(query.HTTPException) as exc:
+        # the budget is already spent (as by a slow execute phase), so streaming gets no fresh timeout
+        with query.deadline(con, started - 1, 5):
+            con.execute("SELECT count(*) FROM range(100000000000)").fetchall()
+    assert exc.value.status_code == 504 and time.monotonic() - started < 5
+
+def test_restricted_rows_need_scope(tmp_path, monkeypatch):
+    path = tmp_path / "r.duckdb"
+    con = duckdb.connect(str(path))
+    rb.sync(con, "core", [json.loads((ROOT / "data/manifests/core/dev-seed.json").read_text())])
+    con.execute("UPDATE object_store SET classification = 'restricted' WHERE doc->>'$.body.activity_id' = 'deploy_apollo'")
+    con.close()
+    monkeypatch.setattr(settings, "db_path", str(path))
+    query.reset_pool()
+    body = {"query": "activities_for_subject", "params": {"dataset": "core", "manifest_id": "dev-seed", "subject": "project_apollo"}}
+    try:
+        rows = [json.loads(line) for line in post(TestClient(app), body).text.splitlines()]
+        assert [row["activity_id"] for row in rows] == ["task_generate_readme"]
+        rows = [json.loads(line) for line in post(TestClient(app), body, scopes="query:run objects:read objects:read:restricted").text.splitlines()]
+        assert {row["activity_id"] for row in rows} == {"deploy_apollo", "task_generate_readme"}
+    finally:
+        query.reset_pool()
+
+def test_tagged_rows_need_scope(projection, monkeypatch):
+    from api.policy import PolicyEngine
+    monkeypatch.setattr(query, "policy", PolicyEngine(tag_scopes={"generic": "objects:read:generic"}))  # every seed object is tagged generic
+    body = {"query": "activities_for_subject", "params": {"dataset": "core", "manifest_id": "dev-seed", "subject": "project_apollo"}}
+    assert post(TestClient(app), body).text == ""
+    rows = post(TestClient(app), body, scopes="query:run objects:read objects:read:generic").text.splitlines()
+    assert len(rows) == 2
+
+def test_rebuild_while_pool_is_open(projection, monkeypatch):
+    monkeypatch.setattr(settings, "query_idle_seconds", 0.05)
+    query.reset_pool()
+    c = TestClient(app)
+    def projected():
+        r = post(c, {"query": "manifest_counts", "params": {"dataset": "core"}})
+        return {json.loads(line)["manifest_id"] for line in r.text.splitlines()}
+    assert projected() == {"dev-seed", "test-manifest"}
+    pool = query.get_pool()
+    deadline = time.monotonic() + 5
+    while pool._idle and time.monotonic() < deadline:  # the idle connection lets go of the file lock
+        time.sleep(0.02)
+    con = duckdb.connect(str(projection))
+    rb.sync(con, "core", [], drop=["test-manifest"])
+    con.close()
+    assert query.get_pool() is pool and projected() == {"dev-seed"}
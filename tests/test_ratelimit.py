@@ -0,0 +1,69 @@
+import asyncio, time
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from prometheus_client import REGISTRY
+from api import ratelimit
+from api.executor import EndpointLimit
+from api.main import app
+from api.ratelimit import RateLimiter
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def token(sub):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": sub, "iat": now,
+              "exp": now + 3600, "scope": "objects:read", "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def test_token_bucket_refills():
+    now = [0.0]
+    rl = RateLimiter({"objects:read": [2, 3]}, clock=lambda: now[0])
+    assert [rl.check("a", "objects:read") for _ in range(3)] == [0, 0, 0]
+    assert rl.check("a", "objects:read") == 0.5
+    assert rl.check("b", "objects:read") == 0  # buckets are per subject
+    assert rl.check("a", "manifests:read") == 0  # unlisted scopes are not limited
+    now[0] = 0.5
+    assert rl.check("a", "objects:read") == 0
+
+def test_bucket_count_is_capped():
+    rl = RateLimiter({"s": [1, 1]}, max_buckets=2)
+    for sub in "abc":
+        rl.check(sub, "s")
+    assert len(rl._buckets) == 2 and ("a", "s") not in rl._buckets
+
+def test_endpoint_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(ratelimit, "limiter", RateLimiter({"objects:read": [0.5, 2]}))
+    c = TestClient(app)
+    hog = {"Authorization": f"Bearer {token('hog')}"}
+    before = REGISTRY.get_sample_value("bnx_rate_limit_decisions_total", {"scope": "objects:read", "decision": "limited"}) or 0
+    codes = [c.get(f"/objects/{APOLLO}", headers=hog).status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    r = c.get(f"/objects/{APOLLO}", headers=hog)
+    assert r.headers["retry-after"] == "2" and r.json()["detail"]["error"]["code"] == "rate_limited"
+    # other subjects are unaffected
+    assert c.get(f"/objects/{APOLLO}", headers={"Authorization": f"Bearer {token('polite')}"}).status_code == 200
+    after = REGISTRY.get_sample_value("bnx_rate_limit_decisions_total", {"scope": "objects:read", "decision": "limited"})
+    assert after == before + 2
+
+def test_sheds_when_queue_latency_exceeds_target():
+    limit = EndpointLimit("promote", 1, timeout=5, target=0.01)
+    async def hold(seconds):
+        async with limit.slot():
+            await asyncio.sleep(seconds)
+    async def main():
+        first = asyncio.ensure_future(hold(0.1))
+        await asyncio.sleep(0.01)
+        await hold(0)  # queues ~0.1s behind the first, pushing the smoothed wait past the target
+        assert limit.queue_latency > 0.01
+        blocker = asyncio.ensure_future(hold(0.1))
+        await asyncio.sleep(0.01)
+        try:
+            await hold(0)
+            raise AssertionError("should have been shed")
+        except HTTPException as e:
+            assert e.status_code == 503 and "Retry-After" in e.headers
+        await asyncio.gather(first, blocker)
+        await hold(0)  # free slot: admitted again
+    asyncio.run(main())
+    assert REGISTRY.get_sample_value("bnx_endpoint_shed_total", {"endpoint": "promote", "reason": "latency"}) >= 1
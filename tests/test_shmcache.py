@@ -0,0 +1,64 @@
+import hashlib, multiprocessing, struct
+from api import main as m
+from bnx.shmcache import SLOT, SharedCache
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _writer(path, items):
+    cache = SharedCache(path, 1 << 16)
+    for data in items:
+        cache.put(key(data), data)
+    cache.close()
+
+def test_roundtrip_and_miss(tmp_path):
+    c = SharedCache(tmp_path / "c", 1 << 16)
+    assert c.get(key(b"a")) is None
+    assert c.put(key(b"a"), b"a") and c.get(key(b"a")) == b"a"
+    assert c.put(key(b"a"), b"a")  # already present
+    assert c.stats()["bytes_used"] == 1
+    assert c.get("not-hex") is None and not c.put("abc", b"x")
+    assert (c.stats()["hits"], c.stats()["misses"]) == (1, 1)
+
+def test_visible_across_processes(tmp_path):
+    items = [f"object-{i}".encode() for i in range(50)]
+    p = multiprocessing.get_context("spawn").Process(target=_writer, args=(str(tmp_path / "c"), items))
+    p.start()
+    p.join(30)
+    assert p.exitcode == 0
+    c = SharedCache(tmp_path / "c", 1 << 10)  # size of an existing cache comes from its header
+    assert c.arena_size == 1 << 16
+    assert all(c.get(key(d)) == d for d in items)
+
+def test_full_arena_resets(tmp_path):
+    c = SharedCache(tmp_path / "c", 100)
+    a, b = b"x" * 60, b"y" * 60
+    c.put(key(a), a)
+    gen = c.stats()["generation"]
+    c.put(key(b), b)
+    assert c.stats()["generation"] == gen + 2
+    assert c.get(key(a)) is None and c.get(key(b)) == b
+    assert not c.put(key(b"z" * 200), b"z" * 200)
+
+def test_inconsistent_slot_is_a_miss(tmp_path):
+    c = SharedCache(tmp_path / "c", 1 << 16)
+    c.put(key(b"hello"), b"hello")
+    c._mm[c._arena:c._arena + 5] = b"jello"  # bytes no longer match the slot's crc
+    assert c.get(key(b"hello")) is None
+    # a reset in progress (odd generation) also reads as a miss
+    c2 = SharedCache(tmp_path / "d", 1 << 16)
+    c2.put(key(b"hi"), b"hi")
+    struct.pack_into("<Q", c2._mm, 24, 1)
+    assert c2.get(key(b"hi")) is None
+    assert SLOT.size == 48
+
+def test_api_reads_through_shared_cache(tmp_path, monkeypatch):
+    cache = SharedCache(tmp_path / "c", 1 << 20)
+    monkeypatch.setattr(m, "shared_cache", cache)
+    monkeypatch.setattr(m, "object_cache", m.LRUCache(0))
+    first = m.read_object_by_hash(APOLLO)
+    assert cache.stats()["misses"] == 1
+    assert m.read_object_by_hash(APOLLO) == first
+    assert cache.stats()["hits"] == 1
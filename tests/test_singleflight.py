@@ -0,0 +1,59 @@
+import asyncio, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from prometheus_client import REGISTRY
+from api import main as m
+from bnx.singleflight import SingleFlight
+
+DEPLOY = "sha256:2bb86b9eb3004e8bb0ff70ee3579f1a530e191e465f7d69646fb1b56f7ee304a"
+
+def slow_loader(calls, value="v", delay=0.1):
+    def load():
+        calls.append(threading.current_thread().name)
+        time.sleep(delay)
+        return value
+    return load
+
+def test_threads_share_one_load():
+    sf, calls = SingleFlight(), []
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: sf.do("k", slow_loader(calls)), range(8)))
+    assert results == ["v"] * 8 and len(calls) == 1 and sf.coalesced == 7
+    # once finished, the next call loads again
+    assert sf.do("k", slow_loader(calls, delay=0)) == "v" and len(calls) == 2
+
+def test_errors_reach_every_waiter():
+    sf = SingleFlight()
+    def boom():
+        time.sleep(0.05)
+        raise KeyError("missing")
+    def call(_):
+        with pytest.raises(KeyError):
+            sf.do("k", boom)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(call, range(4)))
+
+def test_async_and_thread_callers_join_the_same_call():
+    sf, calls = SingleFlight(), []
+    async def main():
+        t = threading.Thread(target=lambda: sf.do("k", slow_loader(calls, delay=0.2)))
+        t.start()
+        await asyncio.sleep(0.05)
+        results = await asyncio.gather(*(sf.do_async("k", slow_loader(calls)) for _ in range(5)))
+        t.join()
+        return results
+    assert asyncio.run(main()) == ["v"] * 5 and len(calls) == 1
+
+def test_object_reads_are_coalesced(monkeypatch):
+    monkeypatch.setattr(m, "object_cache", m.LRUCache(0))
+    real, loads = m._load_object, []
+    def slow(h):
+        loads.append(h)
+        time.sleep(0.1)
+        return real(h)
+    monkeypatch.setattr(m, "_load_object", slow)
+    before = REGISTRY.get_sample_value("bnx_singleflight_coalesced_total", {"resource": "object"}) or 0
+    with ThreadPoolExecutor(6) as pool:
+        objs = list(pool.map(lambda _: m.read_object_by_hash(DEPLOY), range(6)))
+    assert len(loads) == 1 and all(o is objs[0] for o in objs)
+    assert REGISTRY.get_sample_value("bnx_singleflight_coalesced_total", {"resource": "object"}) == before + 5
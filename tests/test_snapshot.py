@@ -0,0 +1,59 @@
+import os
+from api import main as m
+from bnx import snapshot
+from bnx.cli import main as bnx_main
+
+DEPLOY = "sha256:2bb86b9eb3004e8bb0ff70ee3579f1a530e191e465f7d69646fb1b56f7ee304a"
+
+def test_snapshot_roundtrip(tmp_path):
+    snap = snapshot.build()
+    snapshot.write(snap, tmp_path / "s.bnxs")
+    loaded = snapshot.load(tmp_path / "s.bnxs")
+    assert loaded.channels["core"]["prod"] == "dev-seed"
+    assert loaded.members("core/dev-seed") == snap["manifests"]["core/dev-seed"]["members"]
+    assert loaded.members("core/dev-seed")["deploy_apollo"] == DEPLOY
+    assert list(loaded.hot()) == snap["hot"] and DEPLOY in snap["hot"]
+    loaded.close()
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    assert snapshot.load(tmp_path / "missing") is None
+    (tmp_path / "bad").write_bytes(b"BNXS\x63\x00\x00\x00\x00\x00\x00\x00")
+    assert snapshot.load(tmp_path / "bad") is None
+
+def test_memberships_are_packed_not_in_header(tmp_path):
+    snap = snapshot.build()
+    members = {f"id_{i:06d}": f"sha256:{i:064x}" for i in range(20_000)}
+    snap["manifests"]["core/big"] = {"mtime": 1.0, "members": members}
+    snapshot.write(snap, tmp_path / "s.bnxs")
+    loaded = snapshot.load(tmp_path / "s.bnxs")
+    (hlen,) = snapshot.struct.unpack_from("<I", (tmp_path / "s.bnxs").read_bytes(), 8)
+    assert hlen < 2000 and loaded.manifests["core/big"]["mtime"] == 1.0  # header is per manifest, not per member
+    assert loaded.members("core/big") == members
+    assert list(loaded.hot()) == snap["hot"]
+    loaded.close()
+
+def test_cli_writes_snapshot(tmp_path, capsys):
+    bnx_main(["snapshot", "--out", str(tmp_path / "s.bnxs")])
+    assert "[OK] snapshot" in capsys.readouterr().out
+    assert snapshot.load(tmp_path / "s.bnxs").hot_count == 4
+
+def test_warm_start_seeds_indexes_and_hot_set(tmp_path, monkeypatch):
+    snap = snapshot.build()
+    snap["manifests"]["core/dev-seed"]["members"] = {"from_snapshot": DEPLOY}
+    snap["manifests"]["core/test-manifest"]["mtime"] -= 1  # stale: must not be trusted
+    snapshot.write(snap, tmp_path / "s.bnxs")
+    monkeypatch.setattr(m, "member_cache", {})
+    monkeypatch.setattr(m, "channel_cache", {})
+    monkeypatch.setattr(m, "object_cache", m.LRUCache(100))
+    loads = []
+    real = m.load_manifest
+    monkeypatch.setattr(m, "load_manifest", lambda ds, mid: (loads.append(mid), real(ds, mid))[1])
+    m.warm_start(tmp_path / "s.bnxs", background=False)
+    assert m.manifest_members("core", "dev-seed") == {"from_snapshot": DEPLOY}
+    assert "dev-seed" not in loads and "test-manifest" in loads
+    assert DEPLOY in m.object_cache
+    assert m.channel_manifest_id("core", "prod") == "dev-seed"
+
+def test_warm_start_without_snapshot(tmp_path):
+    assert m.warm_start(tmp_path / "none") is None
+    assert os.path.basename(m.settings.snapshot_path) == "snapshot.bnxs"
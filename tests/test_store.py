@@ -0,0 +1,90 @@
+import json, os, pathlib, subprocess, sys
+import pytest
+from bnx import store as bs
+from bnx.store import Ledger, ObjectStore, WriteBatch, write_file
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+
+def test_batch_is_invisible_until_commit(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a/old.json").write_text("old")
+    batch = WriteBatch("batch")
+    batch.add(tmp_path / "a/old.json", b"new")
+    batch.add(tmp_path / "a/1.json", b"one")
+    batch.add(tmp_path / "b/2.json", b"two")
+    # a crash here leaves the previous contents and some temp files, never a partial target
+    assert (tmp_path / "a/old.json").read_text() == "old" and not (tmp_path / "a/1.json").exists()
+    batch.commit()
+    assert (tmp_path / "a/old.json").read_text() == "new" and (tmp_path / "b/2.json").read_text() == "two"
+    assert batch.fsyncs == 3 + 2  # every file, then each directory once
+    assert not [p for p in tmp_path.rglob("*.tmp")]
+
+def test_failed_batch_leaves_nothing(tmp_path):
+    with pytest.raises(RuntimeError):
+        with WriteBatch() as batch:
+            batch.add(tmp_path / "x.json", b"x")
+            raise RuntimeError("boom")
+    assert list(tmp_path.iterdir()) == []
+
+def test_fsync_modes(tmp_path):
+    for mode, expected in (("always", 2 * 2), ("off", 0)):
+        with WriteBatch(mode) as batch:
+            batch.add(tmp_path / f"{mode}-1", b"1")
+            batch.add(tmp_path / f"{mode}-2", b"2")
+        assert batch.fsyncs == expected
+    with pytest.raises(ValueError):
+        WriteBatch("sometimes")
+    write_file(tmp_path / "deep/er/file.txt", b"data")
+    assert (tmp_path / "deep/er/file.txt").read_bytes() == b"data"
+
+def test_new_directories_are_made_durable(tmp_path, monkeypatch):
+    synced = []
+    real = bs._fsync_path
+    monkeypatch.setattr(bs, "_fsync_path", lambda p: (synced.append(p), real(p)))
+    for mode in ("batch", "always"):
+        synced.clear()
+        with WriteBatch(mode) as batch:
+            batch.mkdir(tmp_path / mode / "refs/entity/x")
+            batch.add(tmp_path / mode / "refs/entity/x/2025-08-10.json", b"{}")
+        dirs = {p for p in synced if p.is_dir()}
+        assert dirs == {tmp_path, tmp_path / mode, tmp_path / mode / "refs", tmp_path / mode / "refs/entity",
+                        tmp_path / mode / "refs/entity/x"}, mode
+    # a directory another batch created but has not committed yet is synced by whoever commits first
+    first, second = WriteBatch("batch"), WriteBatch("batch")
+    first.mkdir(tmp_path / "shared/ab")
+    synced.clear()
+    with second:
+        second.mkdir(tmp_path / "shared/ab")
+        second.add(tmp_path / "shared/ab/obj.json", b"{}")
+    assert tmp_path / "shared" in synced and tmp_path in synced
+    first.commit()
+    synced.clear()
+    with WriteBatch("batch") as third:
+        third.mkdir(tmp_path / "shared/ab")
+        third.add(tmp_path / "shared/ab/obj2.json", b"{}")
+    assert synced.count(tmp_path / "shared/ab") == 1 and tmp_path / "shared" not in synced
+
+def test_store_commits_before_ledger(tmp_path):
+    store = ObjectStore(tmp_path / "data", fsync="batch")
+    store.root.mkdir()
+    sample = json.loads((ROOT / "data/samples/entity_project_apollo.json").read_text())
+    results = store.put_many([sample, json.dumps(sample).encode(), b"{"])
+    assert [r.get("created") for r in results] == [True, False, None]
+    # one object, one ref (written twice in the group, renamed once), their directories, and the parents
+    # of the new directories: data (objects/, refs/), objects/, refs/, refs/entity/
+    assert store.fsyncs == 2 + 2 + 4 and store.ledger.fsyncs == 1
+    assert len((store.root / "ledger.ndjson").read_text().splitlines()) == 2
+    ledger = Ledger(tmp_path / "l.ndjson", fsync="off")
+    ledger.append([{"event": "x"}])
+    assert ledger.fsyncs == 0
+
+def test_canonicalize_and_hash_writes_durably(tmp_path):
+    env = dict(os.environ, BNX_DATA_DIR=str(tmp_path))
+    subprocess.run([sys.executable, "scripts/canonicalize_and_hash.py", "data/samples/entity_project_apollo.json"],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    h = APOLLO.split(":")[1]
+    assert (tmp_path / f"objects/{h[:2]}/{h}.json").read_bytes() == (ROOT / f"data/objects/{h[:2]}/{h}.json").read_bytes()
+    assert json.loads((tmp_path / "ledger.ndjson").read_text())["hash"] == APOLLO
+    assert not list(tmp_path.rglob("*.tmp"))
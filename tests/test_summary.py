@@ -0,0 +1,82 @@
+import time
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api.main import app
+from agent.pipes.summarizer import FragmentCache, summarize, summarize_manifest
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+README = "sha256:aa657141baa2fa60294414623cba73b7df3968ba51f1067547cb4ff63406f09f"
+
+def generate_test_jwt(scopes="manifests:read objects:read"):
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": scopes, "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def test_fragments_are_reused(tmp_path):
+    loads = []
+    def load(h):
+        loads.append(h)
+        return m.read_object_by_hash(h)
+    first = summarize_manifest([APOLLO, README], load, FragmentCache(tmp_path))
+    assert first["stats"] == {"objects": 2, "cached": 0, "computed": 2}
+    # a fresh cache instance only sees what was persisted to disk
+    second = summarize_manifest([APOLLO, README], load, FragmentCache(tmp_path))
+    assert second["stats"]["cached"] == 2
+    assert loads == [APOLLO, README]
+    assert second["lines"] == first["lines"]
+    assert second["counts"] == {"EntityRecord": 1, "ActivityRecord": 1}
+
+def test_merged_lines_match_plain_summarize(tmp_path):
+    objs = [m.read_object_by_hash(APOLLO), m.read_object_by_hash(README)]
+    merged = summarize_manifest([APOLLO, README], m.read_object_by_hash, FragmentCache(tmp_path))
+    assert merged["lines"] == summarize(objs)["lines"]
+
+def test_version_bump_invalidates(tmp_path):
+    summarize_manifest([APOLLO], m.read_object_by_hash, FragmentCache(tmp_path, version="1"))
+    assert FragmentCache(tmp_path, version="2").get(APOLLO) is None
+
+def test_shared_cache_survives_concurrent_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    cache = FragmentCache(tmp_path, max_mem=8)
+    hashes = [f"sha256:{i:064x}" for i in range(64)]
+    for h in hashes:
+        cache.put(h, {"kind": "Object", "line": h})
+    def churn(n):
+        return sum(cache.get(hashes[(n * 7 + i) % 64]) is not None for i in range(500))
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(churn, range(16))) == [500] * 16
+    assert len(cache._mem) <= 8
+
+def test_agent_loads_only_uncached_objects(tmp_path, monkeypatch):
+    import sys
+    from agent import cli
+    cache = FragmentCache(tmp_path)
+    monkeypatch.setattr(cli, "summarize_manifest", lambda hashes, load: summarize_manifest(hashes, load, cache))
+    loads = []
+    real = cli.load_object
+    monkeypatch.setattr(cli, "load_object", lambda h: (loads.append(h), real(h))[1])
+    monkeypatch.setattr(sys, "argv", ["agent", "--manifest", "dev-seed"])
+    cli.main()
+    assert len(loads) == 4
+    loads.clear()
+    cli.main()  # every fragment is cached: nothing is read or validated again
+    assert loads == []
+
+def test_summary_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(m, "summary_cache", FragmentCache(tmp_path))
+    c = TestClient(app)
+    headers = {"Authorization": f"Bearer {generate_test_jwt()}"}
+    r = c.get("/manifests/core/test-manifest/summary", headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["type"] == "bnx.summary" and body["manifest_id"] == "test-manifest"
+    assert len(body["lines"]) == 2
+    assert c.get("/manifests/core/test-manifest/summary", headers=headers).json()["stats"]["cached"] == 2
+
+def test_summary_endpoint_requires_read_scope():
+    c = TestClient(app)
+    headers = {"Authorization": f"Bearer {generate_test_jwt('manifests:read')}"}
+    r = c.get("/manifests/core/test-manifest/summary", headers=headers)
+    assert r.status_code == 403
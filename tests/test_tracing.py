@@ -0,0 +1,76 @@
+import json, time
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from api import main as m
+from api.tracing import TraceMiddleware
+from bnx import tracing
+
+APOLLO = "sha256:1dc3d0e4809ec1c49d3ad5c524dadabbb5f80f9d7eb1053e3b5a0c71687f11a6"
+PARENT = "00-" + "ab" * 16 + "-" + "cd" * 8 + "-01"
+
+class Collect:
+    def __init__(self):
+        self.spans = []
+    def export(self, span):
+        self.spans.append(span.record())
+    def flush(self):
+        pass
+
+@pytest.fixture
+def spans():
+    c = Collect()
+    tracing.configure(exporter=c)
+    yield c.spans
+    tracing.configure(export="")
+
+def token():
+    now = int(time.time())
+    claims = {"iss": "bnxlink", "aud": "bnx-data", "sub": "test-user", "iat": now,
+              "exp": now + 3600, "scope": "objects:read", "purpose": "analysis"}
+    return jwt.encode(claims, "dev-only-not-for-prod", algorithm="HS256")
+
+def test_disabled_is_a_noop():
+    assert not tracing.enabled()
+    with tracing.span("x") as s:
+        assert s is None
+    assert tracing.traceparent() is None
+
+def test_nesting_and_errors(spans):
+    with tracing.span("outer", a=1):
+        assert tracing.inject({})["traceparent"] == tracing.traceparent()
+        with pytest.raises(ValueError):
+            with tracing.span("inner"):
+                raise ValueError("boom")
+    inner, outer = spans
+    assert inner["parent_id"] == outer["span_id"] and inner["trace_id"] == outer["trace_id"]
+    assert inner["error"] == "ValueError: boom" and outer["attrs"] == {"a": 1}
+    assert outer["parent_id"] is None
+
+def test_api_continues_callers_trace(spans):
+    m.object_cache.clear()
+    m.view_cache.clear()
+    client = TestClient(TraceMiddleware(m.app))
+    r = client.get(f"/objects/{APOLLO}?view=llm_min", headers={"Authorization": f"Bearer {token()}", "traceparent": PARENT})
+    assert r.status_code == 200
+    by_name = {s["name"]: s for s in spans}
+    server = by_name["http GET"]
+    assert server["trace_id"] == "ab" * 16 and server["parent_id"] == "cd" * 8
+    assert server["attrs"]["http.status_code"] == 200
+    # the load ran on an I/O thread but stays in the request's trace
+    assert by_name["object.load"]["parent_id"] == server["span_id"]
+    assert by_name["redaction"]["trace_id"] == server["trace_id"]
+
+def test_file_export_and_tree(tmp_path):
+    path = tmp_path / "spans.ndjson"
+    tracing.configure(export=f"file:{path}")
+    try:
+        with tracing.span("manifest.build", parent=PARENT):
+            with tracing.span("manifest.write"):
+                pass
+    finally:
+        tracing.configure(export="")
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["name"] for r in records] == ["manifest.write", "manifest.build"]
+    lines = tracing.render_tree(tracing.read_spans(path))
+    assert lines[0] == f"trace {'ab' * 16}" and "manifest.build" in lines[1] and "  manifest.write" in lines[2]